@@ -1,6 +1,7 @@
 # 任务：启动 Connexion 应用并加载 OpenAPI 规范
 # 方案：指定根目录 openapi.yaml，初始化数据库与管理员账号
 
+from contextlib import asynccontextmanager
 from pathlib import Path
 import sys
 
@@ -19,9 +20,23 @@ from src.core.db import init_db, session_scope
 from src.core.errors import ApiError
 from src.core.config_loader import get_config
 from src.services.user_service import ensure_admin
+from src.services.tag_index_service import tag_index
+from src.services.ingest_worker import start_ingest_workers, stop_ingest_workers
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # 任务：后台处理线程只随服务进程（python app.py / uvicorn app:app）启动，import app 的测试与脚本不起线程
+    # 方案：挂在 ASGI lifespan 上，startup 时启动 worker 接手上传后入队的任务（含重启前未完成的任务），shutdown 时停止
+    start_ingest_workers()
+    try:
+        yield
+    finally:
+        stop_ingest_workers()
+
 
 swagger_opts = SwaggerUIOptions(swagger_ui=False)
-connexion_app = connexion.FlaskApp(__name__, specification_dir=str(ROOT_DIR))
+connexion_app = connexion.FlaskApp(__name__, specification_dir=str(ROOT_DIR), lifespan=lifespan)
 connexion_app.add_api(
     "openapi.yaml",
     strict_validation=True,
@@ -51,6 +66,8 @@ def bootstrap():
     init_db()
     with session_scope() as session:
         ensure_admin(session)
+        # 任务：启动时预热标签倒排索引，首个带标签过滤的列表请求无需等待构建
+        tag_index.load(session)
     # 任务：提前构建中间件栈，使蓝图注册到 flask_app，便于 test_client 与 uvicorn 访问
     app.middleware.app, app.middleware.middleware_stack = app.middleware._build_middleware_stack()
 
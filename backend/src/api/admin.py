@@ -1,4 +1,4 @@
-# 任务：管理员审批与角色管理接口
+# 任务：管理员审批与角色管理接口，以及存量图片批量补 AI 标签
 # 方案：限制 admin 角色访问，并进行分页查询
 
 from src.core.db import session_scope
@@ -6,6 +6,13 @@ from src.core.auth import get_current_user, require_role
 from src.core.config_loader import get_config
 from src.core.errors import ApiError, ERROR_NOT_FOUND, ERROR_VALIDATION
 from src.models.user import User
+from src.services.ai_retag_service import (
+    enqueue_untagged,
+    ensure_retag_available,
+    retag_cfg,
+    retag_runner,
+    retag_status,
+)
 from src.services.serializers import serialize_user
 
 
@@ -63,3 +70,49 @@ def set_role(user_id: int, body: dict):
             raise ApiError(404, ERROR_NOT_FOUND, "user not found")
         user.role = role
         return serialize_user(user)
+
+
+def start_ai_retag(body: dict = None):
+    # 任务：为未打 AI 标签的存量图片入队并在后台限速执行
+    # 方案：先校验管理员身份再校验参数；入队事务提交后再启动 RetagRunner；
+    #       已在运行时只追加任务，由运行中的线程继续领取，started=false 表示本次的并发/限速参数未生效
+    payload = body or {}
+    with session_scope() as session:
+        current = get_current_user(session)
+        require_role(current, ["admin"])
+
+        cfg = retag_cfg()
+        limit = payload.get("limit")
+        concurrency = payload.get("concurrency") or cfg["concurrency"]
+        requests_per_second = payload.get("requests_per_second") or cfg["requests_per_second"]
+        if limit is not None and (not isinstance(limit, int) or limit <= 0):
+            raise ApiError(400, ERROR_VALIDATION, "invalid limit")
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ApiError(400, ERROR_VALIDATION, "invalid concurrency")
+        if not isinstance(requests_per_second, (int, float)) or requests_per_second <= 0:
+            raise ApiError(400, ERROR_VALIDATION, "invalid requests_per_second")
+
+        ensure_retag_available()
+        enqueued = enqueue_untagged(session, limit, bool(payload.get("retry_failed")))
+
+    started = retag_runner.start(concurrency, float(requests_per_second))
+    with session_scope() as session:
+        return {**retag_status(session), "enqueued": enqueued, "started": started}
+
+
+def get_ai_retag_status():
+    with session_scope() as session:
+        current = get_current_user(session)
+        require_role(current, ["admin"])
+        return retag_status(session)
+
+
+def stop_ai_retag():
+    # 未完成的任务保持 pending，再次启动时继续
+    with session_scope() as session:
+        current = get_current_user(session)
+        require_role(current, ["admin"])
+
+    retag_runner.stop()
+    with session_scope() as session:
+        return retag_status(session)
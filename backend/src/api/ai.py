@@ -1,8 +1,9 @@
 # 任务：为图片生成 AI 标签并查询最新状态
-# 方案：接入 Qwen 接口生成标签，落库 source=ai，再返回结果
+# 方案：接入 Qwen 接口生成标签，落库 source=ai，再返回结果；状态取自 ingest_jobs 中的 AI 标签任务
 
 from src.core.auth import get_current_user, require_owner, require_role
 from src.core.db import session_scope
+from src.services.ai_retag_service import image_ai_status
 from src.services.ai_tag_service import generate_ai_tags
 from src.services.image_service import get_image_or_404
 
@@ -27,5 +28,4 @@ def analyze_status(image_id: int):
         image = get_image_or_404(session, image_id)
         require_owner(current, image)
 
-        tags = [tag.name for tag in image.tags if tag.source == "ai"]
-        return {"tags": tags, "source": "ai", "status": "ready"}
+        return image_ai_status(session, image)
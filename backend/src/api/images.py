@@ -1,19 +1,19 @@
 # 任务：提供图片上传、列表、详情、编辑、删除等接口
 # 方案：按权限校验后操作数据库与磁盘文件
 
+import io
 import logging
 from datetime import datetime
 
 from connexion import request
-from flask import send_file
-from sqlalchemy import func, distinct
+from flask import send_file, redirect
+from sqlalchemy import tuple_
 
 from src.core.db import session_scope
 from src.core.auth import get_current_user, require_role, require_owner
 from src.core.config_loader import get_config
 from src.core.errors import ApiError, ERROR_VALIDATION, ERROR_NOT_FOUND
 from src.models.image import Image as ImageModel
-from src.models.tag import Tag
 from src.services.ai_tag_service import generate_ai_tags
 from src.services.image_service import (
     save_upload,
@@ -21,15 +21,38 @@ from src.services.image_service import (
     get_image_or_404,
     find_or_create_tags,
 )
-from src.services.serializers import serialize_image_summary, serialize_image_detail
-from src.services.thumbnail_service import upsert_thumbnail
+from src.services.serializers import (
+    serialize_image_summary,
+    serialize_image_detail,
+    summary_query_options,
+)
+from src.services.tag_index_service import apply_tag_filter
+from src.services.facet_service import apply_facet_filters, facet_counts
+from src.services.geo_service import apply_geo_filters
+from src.services.geo_cluster_service import cluster_map
+from src.services.search_index_service import search_image_ids
+from src.services.timeline_service import timeline_buckets
+from src.services.ingest_queue import JOB_AI_TAGS, enqueue_job, ingest_in_background
+from src.services.thumbnail_service import (
+    upsert_thumbnail,
+    encode_thumbnail_base64,
+    thumbnail_etag,
+    thumbnail_mimetype,
+)
+from src.services.public_file_service import (
+    lookup_public_file,
+    invalidate_public_file,
+    content_version,
+)
 from src.services.edit_service import backup_original, after_edit
 from src.utils.path_utils import resolve_path
+from src.utils.file_response import build_file_etag, send_cached_file
+from src.utils.cursor import encode_cursor, decode_cursor
 from src.utils.image_ops import crop_image, adjust_hue, build_edit_preview
 
 
 # 任务：根据存储相对路径构造可对外复制的访问链接
-# 方案：优先使用配置的 links.public_base_url，否则回落到当前请求 host，固定拼接 /images/{storage_relpath}
+# 方案：优先使用配置的 links.public_base_url，否则回落到当前请求 host，固定拼接 /images/{storage_relpath}?v={内容版本}
 def _build_public_image_url(image) -> str:
     cfg = get_config()
     base_url = (cfg.get("links", {}) or {}).get("public_base_url", "") or ""
@@ -39,7 +62,7 @@ def _build_public_image_url(image) -> str:
         # 任务：迁移图片外链 404，因为 fallback 误用 request.base_url 携带 /api/images 路径
         # 方案：默认使用 host_url 仅保留域名与端口，避免带上当前请求路径，确保拼出的 /images/{relpath} 可访问
         prefix = str(request.base_url).rstrip("/")
-    return f"{prefix}/images/{image.storage_relpath}"
+    return f"{prefix}/images/{image.storage_relpath}?v={content_version(image)}"
 
 
 # 任务：从路径段还原存储相对路径
@@ -55,6 +78,11 @@ def _try_auto_ai_tags(session, image) -> None:
     auto_enabled = bool((cfg.get("qwen", {}) or {}).get("auto_tag_on_upload"))
     if not auto_enabled:
         return
+    # 任务：上传请求不再阻塞在 Qwen 调用上（最坏 timeout × max_retries 秒）
+    # 方案：后台处理模式下只入队，由 worker 调用并按退避重试
+    if ingest_in_background():
+        enqueue_job(session, image.id, JOB_AI_TAGS)
+        return
     try:
         tags = generate_ai_tags(session, image)
     except Exception as exc:
@@ -89,12 +117,72 @@ def _parse_hue_delta(payload: dict) -> float:
     return delta
 
 
+def _paginate(query, size: int, offset: int, cursor: str, include_total: bool):
+    # 任务：深分页不随页码线性变慢，无限滚动在大图库下保持平稳
+    # 方案：传入 cursor 时按 (created_at, id) 做 keyset 过滤，不再 offset；
+    #       total 需要全量 count，游标模式下默认省略，可用 include_total 显式开启
+    if include_total is None:
+        include_total = not cursor
+    total = query.order_by(None).count() if include_total else None
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(ImageModel.created_at, ImageModel.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    else:
+        query = query.offset(offset)
+    # 多取一行判断是否还有下一页
+    rows = query.limit(size + 1).all()
+    items = rows[:size]
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > size else None
+    return items, total, next_cursor
+
+
+def _ranked_page(session, query, q: str, size: int, offset: int, thumbnail_mode: str):
+    # 任务：关键词检索按相关度排序返回
+    # 方案：全文索引给出有序候选 id（数量有上限），与其余过滤条件求交后在内存中按相关度分页
+    ranked_ids = search_image_ids(session, q)
+    if not ranked_ids:
+        return [], 0
+    allowed = {
+        row[0]
+        for row in query.order_by(None).with_entities(ImageModel.id).filter(ImageModel.id.in_(ranked_ids)).all()
+    }
+    ranked_ids = [image_id for image_id in ranked_ids if image_id in allowed]
+    page_ids = ranked_ids[offset:offset + size]
+    if not page_ids:
+        return [], len(ranked_ids)
+    loaded = {
+        item.id: item
+        for item in session.query(ImageModel)
+        .options(*summary_query_options(thumbnail_mode))
+        .filter(ImageModel.id.in_(page_ids))
+        .all()
+    }
+    return [loaded[image_id] for image_id in page_ids if image_id in loaded], len(ranked_ids)
+
+
 def list_images(
     page: int = 1,
     page_size: int = None,
     tags: str = None,
     tag_mode: str = "all",
     include_deleted: bool = False,
+    thumbnail_mode: str = "inline",
+    cursor: str = None,
+    include_total: bool = None,
+    camera: str = None,
+    lens: str = None,
+    taken_from: str = None,
+    taken_to: str = None,
+    iso_min: int = None,
+    iso_max: int = None,
+    focal_min: float = None,
+    focal_max: float = None,
+    bbox: str = None,
+    near: str = None,
+    radius_km: float = None,
+    q: str = None,
 ):
     with session_scope() as session:
         current = get_current_user(session)
@@ -108,29 +196,48 @@ def list_images(
 
         # 任务：列表排序不依赖 ID 代表时间，避免迁移数据 ID/时间不一致导致分页抖动
         # 方案：主按 created_at 降序，辅以 id 降序做稳定性兜底
-        query = session.query(ImageModel).order_by(
-            ImageModel.created_at.desc(), ImageModel.id.desc()
+        query = (
+            session.query(ImageModel)
+            .options(*summary_query_options(thumbnail_mode))
+            .order_by(ImageModel.created_at.desc(), ImageModel.id.desc())
         )
 
         if not include_deleted or current.role != "admin":
             query = query.filter(ImageModel.is_deleted.is_(False))
 
+        # 任务：常见标签（如 EXIF 相机型号）下 GROUP BY/HAVING 过滤很慢
+        # 方案：经进程内倒排索引求交/并得到候选 id，再按主键过滤
         tag_list = parse_tag_string(tags)
-        if tag_list:
-            query = query.join(ImageModel.tags).filter(Tag.name.in_(tag_list))
-            if tag_mode == "all":
-                query = query.group_by(ImageModel.id).having(
-                    func.count(distinct(Tag.id)) == len(tag_list)
-                )
-            else:
-                query = query.distinct()
-
-        total = query.count()
-        items = query.offset(offset).limit(size).all()
+        query = apply_tag_filter(session, query, tag_list, tag_mode)
+        # 任务：按相机/镜头/拍摄时间/ISO/焦距等 EXIF 类型化字段过滤
+        # 方案：条件落在 image_exif_facets 与 image_capture_time 的索引列上
+        query = apply_facet_filters(
+            query,
+            camera=camera,
+            lens=lens,
+            taken_from=taken_from,
+            taken_to=taken_to,
+            iso_min=iso_min,
+            iso_max=iso_max,
+            focal_min=focal_min,
+            focal_max=focal_max,
+        )
+        # 任务：地图视图按矩形或圆形范围检索带坐标的图片
+        # 方案：geohash 前缀区间走索引，再按经纬度/距离精确裁剪
+        query = apply_geo_filters(session, query, bbox=bbox, near=near, radius_km=radius_km)
+
+        # 任务：q 关键词检索按相关度排序，相关度顺序无法用 (created_at, id) 游标表达，仅支持页码
+        if q and q.strip():
+            if cursor:
+                raise ApiError(400, ERROR_VALIDATION, "cursor is not supported with q")
+            items, total = _ranked_page(session, query, q, size, offset, thumbnail_mode)
+            next_cursor = None
+        else:
+            items, total, next_cursor = _paginate(query, size, offset, cursor, include_total)
 
         items_data = []
         for item in items:
-            summary = serialize_image_summary(session, item)
+            summary = serialize_image_summary(session, item, thumbnail_mode)
             if not summary:
                 continue
             items_data.append(
@@ -144,26 +251,49 @@ def list_images(
             "page": page,
             "page_size": size,
             "total": total,
+            "next_cursor": next_cursor,
             "items": items_data,
         }
 
 
+def list_image_facets():
+    with session_scope() as session:
+        current = get_current_user(session)
+        require_role(current, ["user", "admin"])
+        return facet_counts(session)
+
+
+def list_map_clusters(bbox: str, zoom: int = None, precision: int = None):
+    with session_scope() as session:
+        current = get_current_user(session)
+        require_role(current, ["user", "admin"])
+        return cluster_map(session, bbox, zoom, precision)
+
+
+def get_timeline(field: str = "created", granularity: str = "month", date_from: str = None, date_to: str = None):
+    with session_scope() as session:
+        current = get_current_user(session)
+        require_role(current, ["user", "admin"])
+        return timeline_buckets(session, field, granularity, date_from, date_to)
+
+
 # 任务：提供收藏图片列表给前端轮播组件使用
 # 方案：筛选 is_favorite 且未删除的图片，按创建时间倒序返回精简列表
-def list_favorites():
+def list_favorites(thumbnail_mode: str = "inline"):
     with session_scope() as session:
         current = get_current_user(session)
         require_role(current, ["user", "admin"])
 
         query = (
             session.query(ImageModel)
+            .options(*summary_query_options(thumbnail_mode))
             .filter(ImageModel.is_favorite.is_(True), ImageModel.is_deleted.is_(False))
             .order_by(ImageModel.created_at.desc(), ImageModel.id.desc())
         )
 
         items_data = []
         for item in query.all():
-            summary = serialize_image_summary(session, item)
+            summary = serialize_image_summary(session, item, thumbnail_mode)
             if not summary:
                 continue
             items_data.append(
@@ -176,7 +306,11 @@ def list_favorites():
         return {"items": items_data}
 
 
-def upload_image(file, tags: str = ""):
+def upload_image(file, body=None, tags: str = ""):
+    # 任务：multipart 表单中的 tags 字段由 Connexion 放在 body 里传入，原签名只收 tags 导致标签丢失
+    # 方案：优先读取 body["tags"]，保留 tags 参数兼容直接调用
+    if isinstance(body, dict) and body.get("tags"):
+        tags = body["tags"]
     with session_scope() as session:
         current = get_current_user(session)
         require_role(current, ["user", "admin"])
@@ -228,27 +362,47 @@ def get_file(image_id: int, token: str = None):
         file_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
         if not file_path.exists():
             raise ApiError(404, ERROR_NOT_FOUND, "file not found")
-        return send_file(file_path)
+        return send_cached_file(
+            file_path,
+            etag=build_file_etag(file_path, image.sha256),
+            last_modified=image.updated_at,
+        )
 
 
 # 任务：提供基于日期+hash 的公开图片访问接口，不依赖登录态
-# 方案：按路径拼出存储相对路径查询数据库，过滤软删除后直接 send_file
-def get_public_file(year: int, month: int, day: int, filename: str):
+# 方案：按路径拼出存储相对路径，经进程内缓存定位图片，过滤软删除后带缓存校验头返回文件
+def get_public_file(year: int, month: int, day: int, filename: str, v: str = None):
     storage_relpath = _compose_storage_relpath(year, month, day, filename)
-    with session_scope() as session:
-        image = (
-            session.query(ImageModel)
-            .filter(ImageModel.storage_relpath == storage_relpath)
-            .first()
-        )
-        if not image or image.is_deleted:
-            raise ApiError(404, ERROR_NOT_FOUND, "file not found")
+    entry = lookup_public_file(storage_relpath)
+    if not entry or entry.is_deleted:
+        raise ApiError(404, ERROR_NOT_FOUND, "file not found")
 
-    cfg = get_config()
-    file_path = resolve_path(cfg["storage"]["root_dir"]) / storage_relpath
-    if not file_path.exists():
+    # 任务：编辑后旧版本链接不能继续命中被长期缓存的内容
+    # 方案：v 与当前内容版本不一致时 302 到最新版本，跳转本身不缓存
+    current_version = content_version(entry)
+    if v and v != current_version:
+        response = redirect(f"/images/{storage_relpath}?v={current_version}", code=302)
+        response.cache_control.no_cache = True
+        return response
+
+    if not entry.abs_path.exists():
         raise ApiError(404, ERROR_NOT_FOUND, "file not found")
-    return send_file(file_path)
+    # 任务：带正确版本号的链接内容不会再变，可长期 immutable 缓存；无版本号的旧链接保持短缓存
+    # 方案：按是否命中当前版本选择 immutable_max_age 或 public_max_age
+    http_cfg = get_config().get("http_cache", {}) or {}
+    versioned = v == current_version
+    if versioned:
+        max_age = int(http_cfg.get("immutable_max_age", 31536000))
+    else:
+        max_age = int(http_cfg.get("public_max_age", 86400))
+    return send_cached_file(
+        entry.abs_path,
+        etag=build_file_etag(entry.abs_path, entry.sha256),
+        last_modified=entry.updated_at,
+        max_age=max_age,
+        public=True,
+        immutable=versioned,
+    )
 
 
 def get_thumbnail(image_id: int):
@@ -260,7 +414,35 @@ def get_thumbnail(image_id: int):
         if image.is_deleted and image.uploader_id != current.id:
             raise ApiError(404, ERROR_NOT_FOUND, "image not found")
         data = upsert_thumbnail(session, image)
-        return {"format": data["format"], "data_base64": data["data_base64"]}
+        return {"format": data["format"], "data_base64": encode_thumbnail_base64(data["data"])}
+
+
+# 任务：以二进制图片直接输出缩略图，省去 base64 与 JSON 编码并支持 HTTP 缓存
+# 方案：读取 BLOB 后带强 ETag 返回，<img> 无法携带 Authorization 头时允许 query token；
+#       v 与当前内容版本一致时按 immutable_max_age 私有长期缓存，否则每次回源校验
+def get_thumbnail_file(image_id: int, token: str = None, v: str = None):
+    with session_scope() as session:
+        current = get_current_user(session, allow_query_token=True)
+        require_role(current, ["user", "admin"])
+
+        image = get_image_or_404(session, image_id)
+        if image.is_deleted and image.uploader_id != current.id:
+            raise ApiError(404, ERROR_NOT_FOUND, "image not found")
+        data = upsert_thumbnail(session, image)
+        # 占位图会被后台任务生成的缩略图替换，不能按版本号长期缓存
+        versioned = not data.get("pending") and bool(v) and v == content_version(image)
+        max_age = 0
+        if versioned:
+            http_cfg = get_config().get("http_cache", {}) or {}
+            max_age = int(http_cfg.get("immutable_max_age", 31536000))
+        return send_cached_file(
+            io.BytesIO(data["data"]),
+            etag=thumbnail_etag(data["data"]),
+            last_modified=image.updated_at,
+            max_age=max_age,
+            immutable=versioned,
+            mimetype=thumbnail_mimetype(data["format"]),
+        )
 
 
 def update_tags(image_id: int, body: dict):
@@ -329,7 +511,9 @@ def edit_crop(image_id: int, body: dict):
         file_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
         crop_image(file_path, ratios)
         after_edit(session, image)
-        return {"status": "ok"}
+        storage_relpath = image.storage_relpath
+    invalidate_public_file(storage_relpath)
+    return {"status": "ok"}
 
 
 def edit_hue(image_id: int, body: dict):
@@ -348,7 +532,9 @@ def edit_hue(image_id: int, body: dict):
         file_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
         adjust_hue(file_path, delta)
         after_edit(session, image)
-        return {"status": "ok"}
+        storage_relpath = image.storage_relpath
+    invalidate_public_file(storage_relpath)
+    return {"status": "ok"}
 
 
 def delete_image(image_id: int):
@@ -361,7 +547,11 @@ def delete_image(image_id: int):
 
         image.is_deleted = True
         image.deleted_at = datetime.utcnow()
-        return {"status": "ok"}
+        storage_relpath = image.storage_relpath
+    # 任务：软删除提交后立即让公开外链失效
+    # 方案：事务提交后再剔除缓存，避免并发请求在提交前回填旧状态
+    invalidate_public_file(storage_relpath)
+    return {"status": "ok"}
 
 
 # 任务：支持图片收藏状态切换
@@ -400,4 +590,6 @@ def restore_image(image_id: int):
 
         image.is_deleted = False
         image.deleted_at = None
-        return {"status": "ok"}
+        storage_relpath = image.storage_relpath
+    invalidate_public_file(storage_relpath)
+    return {"status": "ok"}
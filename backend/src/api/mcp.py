@@ -1,46 +1,76 @@
 # 任务：提供“帮我找图”检索接口
-# 方案：读取标签库 -> 调用 AI 选择标签 -> 按重合度排序查询图片 -> 返回前 5 张与 AI 输出
+# 方案：读取缓存的标签库 -> 本地预筛候选标签 -> 调用 AI 选择标签（按查询与标签库版本缓存） -> 按重合度排序查询图片 -> 返回前 5 张与 AI 输出；
+#       stream=true 时以 SSE 逐段转发模型输出，最后一个事件给出标签与图片；
+#       mode=local 只用本地检索，mode=auto（默认 search.mode）在 AI 不可用时自动退回本地检索
+
+import json
 
 from connexion import request
-from sqlalchemy import func, distinct
+from flask import Response
+from sqlalchemy import case, func, distinct, select
 
 from src.core.auth import get_current_user, require_role
 from src.core.db import session_scope
 from src.core.config_loader import get_config
 from src.core.errors import ApiError, ERROR_VALIDATION
 from src.models.image import Image as ImageModel
-from src.models.tag import Tag
-from src.services.ai_search_service import generate_search_tags
-from src.services.serializers import serialize_image_summary
-from src.services.tag_service import list_all_tag_names
+from src.models.tag import ImageTag, Tag
+from src.services.ai_search_service import search_tags_cached, stream_search_tags
+from src.services.local_search_service import local_search_tags
+from src.services.public_file_service import content_version
+from src.services.serializers import serialize_image_summary, summary_query_options
 
 
-def _build_public_image_url(image) -> str:
-    # 任务：为检索结果拼出可访问的图片外链
-    # 方案：优先使用配置的 public_base_url，否则使用当前请求 host 作为前缀
+def _public_url_prefix() -> str:
+    # 任务：为检索结果的图片外链确定前缀
+    # 方案：优先使用配置的 public_base_url，否则使用当前请求 host；流式响应需在请求上下文内提前取好
     cfg = get_config()
     base_url = (cfg.get("links", {}) or {}).get("public_base_url", "") or ""
     if base_url:
-        prefix = base_url.rstrip("/")
-    else:
-        prefix = str(request.base_url).rstrip("/")
-    return f"{prefix}/images/{image.storage_relpath}"
+        return base_url.rstrip("/")
+    return str(request.base_url).rstrip("/")
+
 
+def _build_public_image_url(image, prefix: str = None) -> str:
+    if prefix is None:
+        prefix = _public_url_prefix()
+    return f"{prefix}/images/{image.storage_relpath}?v={content_version(image)}"
 
-def _query_images_by_tags(session, tags: list, limit: int = 5):
+
+def _query_images_by_tags(session, tags: list, limit: int = 5, prefix: str = None, weights: dict = None):
     # 任务：按标签重合度检索图片并排序
-    # 方案：统计匹配标签数量，主按重合数降序、次按 id 降序并限制数量
+    # 方案：统计匹配标签数量，主按重合数降序、次按 id 降序并限制数量；
+    #       给出 weights（标签名 -> 权重）时改按命中标签的权重之和排序，同名不同来源的标签只计一次
     if not tags:
         return []
 
-    match_count = func.count(distinct(Tag.id)).label("match_count")
-    query = (
-        session.query(ImageModel, match_count)
-        .join(ImageModel.tags)
-        .filter(ImageModel.is_deleted.is_(False), Tag.name.in_(tags))
-        .group_by(ImageModel.id)
-        .order_by(match_count.desc(), ImageModel.id.desc())
-    )
+    if weights:
+        matched = (
+            select(ImageTag.image_id, Tag.name)
+            .join(Tag, Tag.id == ImageTag.tag_id)
+            .where(Tag.name.in_(tags))
+            .distinct()
+            .subquery()
+        )
+        score = func.sum(case(weights, value=matched.c.name, else_=0.0)).label("score")
+        query = (
+            session.query(ImageModel, score)
+            .options(*summary_query_options())
+            .join(matched, matched.c.image_id == ImageModel.id)
+            .filter(ImageModel.is_deleted.is_(False))
+            .group_by(ImageModel.id)
+            .order_by(score.desc(), ImageModel.id.desc())
+        )
+    else:
+        match_count = func.count(distinct(Tag.id)).label("match_count")
+        query = (
+            session.query(ImageModel, match_count)
+            .options(*summary_query_options())
+            .join(ImageModel.tags)
+            .filter(ImageModel.is_deleted.is_(False), Tag.name.in_(tags))
+            .group_by(ImageModel.id)
+            .order_by(match_count.desc(), ImageModel.id.desc())
+        )
     rows = query.limit(limit).all()
 
     items = []
@@ -48,27 +78,102 @@ def _query_images_by_tags(session, tags: list, limit: int = 5):
         summary = serialize_image_summary(session, image)
         if not summary:
             continue
-        items.append({**summary, "public_url": _build_public_image_url(image)})
+        items.append({**summary, "public_url": _build_public_image_url(image, prefix)})
     return items
 
 
+def _search_mode(payload: dict) -> str:
+    mode = payload.get("mode") or (get_config().get("search", {}) or {}).get("mode") or "auto"
+    return mode if mode in ("ai", "local", "auto") else "auto"
+
+
+def _result(query: str, mode: str, ai_output: str, tags: list, items: list) -> dict:
+    return {"query": query, "mode": mode, "tags": tags, "ai_output": ai_output, "items": items}
+
+
+def _local_result(session, query: str, prefix: str = None) -> dict:
+    ai_output, weights = local_search_tags(session, query)
+    tags = list(weights)
+    items = _query_images_by_tags(session, tags, limit=5, prefix=prefix, weights=weights)
+    return _result(query, "local", ai_output, tags, items)
+
+
 def search(body: dict):
     payload = body or {}
     query = str(payload.get("query") or "").strip()
     if not query:
         raise ApiError(400, ERROR_VALIDATION, "query is required")
+    mode = _search_mode(payload)
 
     with session_scope() as session:
         current = get_current_user(session)
         require_role(current, ["user", "admin"])
 
-        tag_pool = list_all_tag_names(session)
-        ai_output, selected_tags = generate_search_tags(tag_pool, query)
-        items = _query_images_by_tags(session, selected_tags, limit=5)
+        if payload.get("stream"):
+            prefix = _public_url_prefix()
+            if mode != "local":
+                try:
+                    events = stream_search_tags(session, query)
+                    return _sse_response(_stream_events(query, events, prefix, fallback=mode == "auto"))
+                except ApiError:
+                    if mode == "ai":
+                        raise
+            result = _local_result(session, query, prefix)
+            return _sse_response(iter([_sse("start", {"query": query}), *_result_events(result)]))
+
+        if mode != "local":
+            # 任务：标签库很大时只把本地预筛出的候选标签放进 prompt；相同查询在标签库不变时命中缓存
+            # 方案：auto 模式下未开启、无 key、限流、熔断等 AI 错误都退回本地检索
+            try:
+                ai_output, selected_tags = search_tags_cached(session, query)
+            except ApiError:
+                if mode == "ai":
+                    raise
+            else:
+                items = _query_images_by_tags(session, selected_tags, limit=5)
+                return _result(query, "ai", ai_output, selected_tags, items)
+        return _local_result(session, query)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 
-        return {
-            "query": query,
-            "tags": selected_tags,
-            "ai_output": ai_output,
-            "items": items,
-        }
+def _result_events(result: dict) -> list:
+    # 本地检索没有增量输出，说明文本作为一个 delta 发出，与 AI 模式的事件序列保持一致
+    return [_sse("delta", {"text": result["ai_output"]}), _sse("result", result)]
+
+
+def _stream_events(query: str, events, prefix: str, fallback: bool = False):
+    # 任务：把模型输出转成 SSE 事件：start -> delta* -> result；中途出错发送 error 事件后结束
+    # 方案：start 在调用模型前立即发出，首字节不受模型延迟影响；图片查询在新会话中进行（请求会话已关闭）；
+    #       fallback 时若模型在输出任何内容前失败，改发本地检索结果
+    yield _sse("start", {"query": query})
+    emitted = False
+    try:
+        ai_output, selected_tags = "", []
+        for kind, value in events:
+            if kind == "delta":
+                emitted = True
+                yield _sse("delta", {"text": value})
+            else:
+                ai_output, selected_tags = value
+        with session_scope() as session:
+            items = _query_images_by_tags(session, selected_tags, limit=5, prefix=prefix)
+        yield _sse("result", _result(query, "ai", ai_output, selected_tags, items))
+    except ApiError as exc:
+        if not fallback or emitted:
+            yield _sse("error", {"error": {"code": exc.code, "message": exc.message, "details": exc.details}})
+            return
+        with session_scope() as session:
+            result = _local_result(session, query, prefix)
+        yield from _result_events(result)
+
+
+def _sse_response(body) -> Response:
+    # 关闭代理缓冲与缓存，事件产生后立即送达客户端
+    return Response(
+        body,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -14,7 +14,9 @@ def _extract_token(allow_query: bool) -> str:
     if auth_header.startswith("Bearer "):
         return auth_header.split(" ", 1)[1].strip()
     if allow_query:
-        return request.args.get("token", "")
+        # 任务：Connexion 3 的 request 基于 Starlette，没有 Flask 的 args 属性
+        # 方案：改用 query_params 读取 token 查询参数
+        return request.query_params.get("token", "")
     return ""
 
 
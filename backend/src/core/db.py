@@ -79,17 +79,69 @@ def init_db():
 
     Base.metadata.create_all(bind=_engine)
 
+    _ensure_columns()
+    _ensure_indexes()
+
+    # 任务：聚合表（地图网格、时间轴）由数据库触发器增量维护，需随建表一起安装；全文检索虚拟表同理
+    from src.services.geo_cluster_service import ensure_geo_cell_triggers
+    from src.services.search_index_service import ensure_search_index
+    from src.services.timeline_service import ensure_timeline_triggers
+
+    ensure_geo_cell_triggers(_engine)
+    ensure_timeline_triggers(_engine)
+    ensure_search_index(_engine)
+
+
+# 任务：为已有数据库补齐后续新增的列，create_all 不会修改已存在的表
+# 方案：检测表字段，缺失时执行一次 ALTER TABLE 添加带默认值的列
+_LEGACY_COLUMNS = [
     # 任务：为收藏功能补齐 images.is_favorite 列，兼容已有数据库
-    # 方案：检测 images 表字段，缺失时执行一次 ALTER TABLE 添加默认值列
+    ("images", "is_favorite", "BOOLEAN NOT NULL DEFAULT 0"),
+    # 任务：缩略图改为二进制存储，旧库补 data 列，历史 base64 由 migration/backfill.py 迁移
+    ("image_thumbnail", "data", "BLOB"),
+    # 任务：坐标空间检索，历史数据由 migration/backfill.py geohash 回填
+    ("image_location", "geohash", "VARCHAR(12)"),
+]
+
+
+def _ensure_columns():
     from sqlalchemy import inspect, text
 
     inspector = inspect(_engine)
-    if "images" in inspector.get_table_names():
-        columns = {col["name"] for col in inspector.get_columns("images")}
-        if "is_favorite" not in columns:
+    table_names = set(inspector.get_table_names())
+    for table, column, ddl in _LEGACY_COLUMNS:
+        if table not in table_names:
+            continue
+        columns = {col["name"] for col in inspector.get_columns(table)}
+        if column not in columns:
+            with _engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+# 任务：为已有数据库补齐后续新增的索引，create_all 不会给已存在的表加索引
+# 方案：逐条执行 CREATE INDEX IF NOT EXISTS，索引名与模型声明保持一致
+_LEGACY_INDEXES = [
+    ("ix_images_storage_relpath", "images", "storage_relpath", True),
+    ("ix_images_created_at_id", "images", "created_at, id", False),
+    ("ix_image_location_geohash", "image_location", "geohash", False),
+]
+
+
+def _ensure_indexes():
+    import logging
+    from sqlalchemy import text
+    from sqlalchemy.exc import IntegrityError
+
+    for name, table, columns, unique in _LEGACY_INDEXES:
+        unique_sql = "UNIQUE " if unique else ""
+        try:
             with _engine.begin() as conn:
                 conn.execute(
-                    text(
-                        "ALTER TABLE images ADD COLUMN is_favorite BOOLEAN NOT NULL DEFAULT 0"
-                    )
+                    text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})")
                 )
+        except IntegrityError:
+            # 任务：历史数据存在重复值时唯一索引建不起来，不能阻塞启动
+            # 方案：记录告警并退化为普通索引，至少保证查询走索引
+            logging.warning("duplicate values block unique index %s, fallback to plain index", name)
+            with _engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -6,6 +6,11 @@ from src.models.image import Image  # noqa: F401
 from src.models.image_dimensions import ImageDimensions  # noqa: F401
 from src.models.image_capture_time import ImageCaptureTime  # noqa: F401
 from src.models.image_location import ImageLocation  # noqa: F401
-from src.models.image_exif import ImageExifEntry  # noqa: F401
+from src.models.image_exif import ImageExifEntry, ImageExifData  # noqa: F401
+from src.models.image_exif_facets import ImageExifFacets  # noqa: F401
 from src.models.tag import Tag, ImageTag  # noqa: F401
 from src.models.thumbnail import ImageThumbnail  # noqa: F401
+from src.models.ingest_job import IngestJob  # noqa: F401
+from src.models.geo_cell import GeoCell  # noqa: F401
+from src.models.timeline_count import TimelineCount  # noqa: F401
+from src.models.ai_tag_cache import AiTagCache  # noqa: F401
@@ -0,0 +1,19 @@
+# 任务：同一内容的图片（重复上传、反复点击 AI 分析）不重复调用模型
+# 方案：按 (sha256, 模型名, prompt 版本) 持久化模型返回的标签，换模型或改 prompt 后自然不再命中旧结果
+
+from datetime import datetime
+from typing import List
+from sqlalchemy import String, DateTime, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.db import Base
+
+
+class AiTagCache(Base):
+    __tablename__ = "ai_tag_cache"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(128), primary_key=True)
+    prompt_version: Mapped[str] = mapped_column(String(32), primary_key=True)
+    tags: Mapped[List[str]] = mapped_column(JSON, nullable=False, default=list)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
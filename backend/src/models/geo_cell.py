@@ -0,0 +1,21 @@
+# 任务：地图聚合需要按缩放级别统计每个网格内的图片数，逐次 GROUP BY 全表代价随图片量线性增长
+# 方案：按 geohash 前缀长度（precision）预聚合，(precision, cell) 为主键，平移地图只做主键区间读；
+#       由 geo_cluster_service 安装的 SQLite 触发器在坐标写入、删除/恢复时增量维护
+
+from typing import Optional
+from sqlalchemy import Integer, String, Float
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.db import Base
+
+
+class GeoCell(Base):
+    __tablename__ = "geo_cells"
+
+    precision: Mapped[int] = mapped_column(Integer, primary_key=True)
+    cell: Mapped[str] = mapped_column(String(12), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # 经纬度之和，除以 count 得到网格内图片的质心，作为聚合点的显示位置
+    lat_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    lon_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    sample_image_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
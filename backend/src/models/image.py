@@ -3,7 +3,7 @@
 
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, DateTime, Boolean, Integer, BigInteger, ForeignKey
+from sqlalchemy import String, DateTime, Boolean, Integer, BigInteger, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.db import Base
@@ -11,13 +11,18 @@ from src.core.db import Base
 
 class Image(Base):
     __tablename__ = "images"
+    # 任务：列表按 (created_at, id) 倒序做 keyset 分页，需要复合索引支撑范围扫描
+    # 方案：声明复合索引，旧库由 init_db 补建
+    __table_args__ = (Index("ix_images_created_at_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     uploader_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     original_filename: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     ext: Mapped[str] = mapped_column(String(16), nullable=False)
     hash: Mapped[str] = mapped_column(String(16), nullable=False, index=True)
-    storage_relpath: Mapped[str] = mapped_column(String(512), nullable=False)
+    # 任务：公开外链按 storage_relpath 定位图片，需要唯一索引避免全表扫描
+    # 方案：声明 unique 索引，旧库由 init_db 补建同名索引
+    storage_relpath: Mapped[str] = mapped_column(String(512), nullable=False, unique=True, index=True)
     size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
     mime_type: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
@@ -34,5 +39,8 @@ class Image(Base):
     capture_time = relationship("ImageCaptureTime", uselist=False, back_populates="image")
     location = relationship("ImageLocation", uselist=False, back_populates="image")
     exif_entries = relationship("ImageExifEntry", back_populates="image")
+    exif_data = relationship("ImageExifData", uselist=False, back_populates="image")
+    exif_facets = relationship("ImageExifFacets", uselist=False, back_populates="image")
     tags = relationship("Tag", secondary="image_tags", back_populates="images")
     thumbnail = relationship("ImageThumbnail", uselist=False, back_populates="image")
+    ingest_jobs = relationship("IngestJob", back_populates="image")
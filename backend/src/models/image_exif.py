@@ -1,8 +1,8 @@
 # 任务：保存 EXIF KV 信息，满足“EXIF 单独条目”要求
-# 方案：使用 image_id + key/value 的 KV 结构
+# 方案：新数据每张图片一行 JSON（image_exif_data）；image_exif_entries 仅保留给未迁移的历史数据
 
-from typing import Optional
-from sqlalchemy import Integer, String, Text, ForeignKey
+from typing import List, Optional
+from sqlalchemy import Integer, String, Text, ForeignKey, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.db import Base
@@ -17,3 +17,14 @@ class ImageExifEntry(Base):
     exif_value: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     image = relationship("Image", back_populates="exif_entries")
+
+
+class ImageExifData(Base):
+    # 任务：每个 EXIF 键一行会让 image_exif_entries 成为增长最快的表，详情页也要读几十行
+    # 方案：按原顺序保存 [[key, value], ...] 列表，二进制值已过滤、超长值已截断
+    __tablename__ = "image_exif_data"
+
+    image_id: Mapped[int] = mapped_column(Integer, ForeignKey("images.id"), primary_key=True)
+    data: Mapped[List[List[Optional[str]]]] = mapped_column(JSON, nullable=False, default=list)
+
+    image = relationship("Image", back_populates="exif_data")
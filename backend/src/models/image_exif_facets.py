@@ -0,0 +1,24 @@
+# 任务：把常用 EXIF 字段存成带类型、带索引的列，支撑按相机/镜头/ISO 等条件检索与分面统计
+# 方案：与 images 一对一，入库时由 exif_utils.parse_facets 提取；拍摄时间沿用 image_capture_time
+
+from typing import Optional
+from sqlalchemy import Integer, String, Float, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from src.core.db import Base
+
+
+class ImageExifFacets(Base):
+    __tablename__ = "image_exif_facets"
+
+    image_id: Mapped[int] = mapped_column(Integer, ForeignKey("images.id"), primary_key=True)
+    camera: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, index=True)
+    camera_make: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    camera_model: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    lens: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, index=True)
+    focal_length: Mapped[Optional[float]] = mapped_column(Float, nullable=True, index=True)
+    f_number: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    exposure_time: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    iso: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+
+    image = relationship("Image", back_populates="exif_facets")
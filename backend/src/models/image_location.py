@@ -2,7 +2,7 @@
 # 方案：经纬度/海拔单独表存储，允许为空
 
 from typing import Optional
-from sqlalchemy import Integer, Numeric, Text, ForeignKey
+from sqlalchemy import Integer, Numeric, String, Text, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.db import Base
@@ -16,5 +16,8 @@ class ImageLocation(Base):
     longitude: Mapped[Optional[float]] = mapped_column(Numeric(10, 7), nullable=True, index=True)
     altitude: Mapped[Optional[float]] = mapped_column(Numeric(10, 2), nullable=True)
     gps_raw: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # 任务：地图与范围检索需要空间索引，单独的经度/纬度索引只能各自扫一维
+    # 方案：保存 9 位 geohash（约 5 米精度）并建索引，区域查询转成前缀区间扫描；旧库由 init_db 补列补索引
+    geohash: Mapped[Optional[str]] = mapped_column(String(12), nullable=True, index=True)
 
     image = relationship("Image", back_populates="location")
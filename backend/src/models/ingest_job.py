@@ -0,0 +1,33 @@
+# 任务：持久化上传后的后台处理任务（EXIF/缩略图、AI 标签），进程重启后可继续执行
+# 方案：每张图片每种任务一行，记录状态、尝试次数、下次执行时间与最近错误
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Text, DateTime, Integer, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from src.core.db import Base
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    # 任务：worker 按 (status, next_run_at) 取到期任务，同一图片同类任务只保留一行
+    # 方案：复合索引支撑领取查询，唯一约束让重复入队变成重置
+    __table_args__ = (
+        UniqueConstraint("image_id", "kind", name="uq_ingest_jobs_image_kind"),
+        Index("ix_ingest_jobs_status_next_run_at", "status", "next_run_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    image_id: Mapped[int] = mapped_column(Integer, ForeignKey("images.id"), nullable=False, index=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    # pending / running / done / failed
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+    image = relationship("Image", back_populates="ingest_jobs")
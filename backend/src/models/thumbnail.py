@@ -1,8 +1,9 @@
-# 任务：保存缩略图 base64 数据，满足“缩略图入库”要求
-# 方案：以 1:1 关系存储格式、尺寸与 base64 字符串
+# 任务：保存缩略图二进制数据，满足“缩略图入库”要求
+# 方案：以 1:1 关系存储格式、尺寸与 BLOB；data_base64 仅保留给未迁移的历史记录
 
 from datetime import datetime
-from sqlalchemy import Integer, String, Text, DateTime, ForeignKey, BigInteger
+from typing import Optional
+from sqlalchemy import Integer, String, Text, DateTime, ForeignKey, BigInteger, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.core.db import Base
@@ -16,7 +17,10 @@ class ImageThumbnail(Base):
     height: Mapped[int] = mapped_column(Integer, nullable=False)
     width: Mapped[int] = mapped_column(Integer, nullable=False)
     size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=True)
-    data_base64: Mapped[str] = mapped_column(Text, nullable=False)
+    # 任务：去掉 base64 带来的约 33% 体积膨胀，并让缩略图可直接作为图片响应输出
+    # 方案：新数据写入 data（BLOB），data_base64 在旧库中为 NOT NULL，新记录写空串兼容
+    data: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    data_base64: Mapped[str] = mapped_column(Text, nullable=False, default="")
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
 
     image = relationship("Image", back_populates="thumbnail")
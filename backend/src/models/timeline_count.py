@@ -0,0 +1,16 @@
+# 任务：时间轴滚动条需要“每天/每月多少张”，每次对 images 全表 GROUP BY 随数据量线性变慢
+# 方案：按 (kind, day) 保存未删除图片的计数，kind 为 created（上传时间）或 taken（拍摄时间）；
+#       由 timeline_service 安装的 SQLite 触发器在上传、删除/恢复与迁移写入时增量维护
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.db import Base
+
+
+class TimelineCount(Base):
+    __tablename__ = "timeline_counts"
+
+    kind: Mapped[str] = mapped_column(String(16), primary_key=True)
+    day: Mapped[str] = mapped_column(String(10), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
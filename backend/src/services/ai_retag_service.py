@@ -0,0 +1,211 @@
+# 任务：存量图片只能逐张调用 ai-analyze 补 AI 标签，回填 5 万张需要数周，且中断后无从继续
+# 方案：未打 AI 标签的图片以 kind=ai_retag 批量写入 ingest_jobs，这张表即断点：done 不再入队，
+#       pending/running 在下次启动时继续执行；RetagRunner 用 N 个线程并发领取该类任务，
+#       令牌桶限制每秒请求数，失败沿用队列的指数退避重试与 failed 状态
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import exists, func, insert, literal, select
+
+from src.core.config_loader import get_config
+from src.core.db import session_scope
+from src.core.errors import ApiError, ERROR_VALIDATION
+from src.models.image import Image as ImageModel
+from src.models.ingest_job import IngestJob
+from src.models.tag import ImageTag, Tag
+from src.services.ingest_queue import JOB_AI_RETAG, JOB_AI_TAGS, claim_next_job
+from src.services.ingest_worker import run_job
+from src.utils.rate_limiter import RateLimiter
+
+JOB_STATUSES = ("pending", "running", "done", "failed")
+# 限速与空队列时的轮询间隔，同时决定停止信号的响应速度
+_POLL_SECONDS = 1.0
+
+
+def retag_cfg() -> Dict:
+    cfg = get_config().get("ai_retag", {}) or {}
+    return {
+        "concurrency": int(cfg.get("concurrency", 4)),
+        "requests_per_second": float(cfg.get("requests_per_second", 5)),
+    }
+
+
+def ensure_retag_available() -> None:
+    # 未开启或未配置 key 时每个任务都会以不可重试错误失败，提前拒绝而不是批量写入 failed
+    cfg = get_config().get("qwen", {}) or {}
+    if not cfg.get("enabled"):
+        raise ApiError(400, ERROR_VALIDATION, "未开启 AI 自动标签功能")
+    if not cfg.get("api_key"):
+        raise ApiError(400, ERROR_VALIDATION, "Qwen API key 未配置")
+
+
+def enqueue_untagged(session, limit: Optional[int] = None, retry_failed: bool = False) -> int:
+    # 任务：为未删除、没有 AI 标签、且还没有 ai_retag 任务的图片入队
+    # 方案：INSERT ... SELECT 一条语句完成，5 万行也不经过 ORM；retry_failed 时把 failed 任务重置为 pending
+    now = datetime.utcnow()
+    requeued = 0
+    if retry_failed:
+        requeued = (
+            session.query(IngestJob)
+            .filter(IngestJob.kind == JOB_AI_RETAG, IngestJob.status == "failed")
+            .update(
+                {
+                    IngestJob.status: "pending",
+                    IngestJob.attempts: 0,
+                    IngestJob.next_run_at: now,
+                    IngestJob.locked_at: None,
+                    IngestJob.last_error: None,
+                    IngestJob.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+
+    has_ai_tag = exists().where(ImageTag.image_id == ImageModel.id, ImageTag.tag_id == Tag.id, Tag.source == "ai")
+    has_job = exists().where(IngestJob.image_id == ImageModel.id, IngestJob.kind == JOB_AI_RETAG)
+    candidates = (
+        select(
+            ImageModel.id,
+            literal(JOB_AI_RETAG),
+            literal("pending"),
+            literal(0),
+            literal(now),
+            literal(now),
+            literal(now),
+        )
+        .where(ImageModel.is_deleted.is_(False), ~has_ai_tag, ~has_job)
+        .order_by(ImageModel.id)
+    )
+    if limit:
+        candidates = candidates.limit(limit)
+    result = session.execute(
+        insert(IngestJob).from_select(
+            ["image_id", "kind", "status", "attempts", "next_run_at", "created_at", "updated_at"], candidates
+        )
+    )
+    return requeued + max(result.rowcount or 0, 0)
+
+
+def _has_pending_jobs(session) -> bool:
+    return (
+        session.query(IngestJob.id)
+        .filter(IngestJob.kind == JOB_AI_RETAG, IngestJob.status == "pending")
+        .first()
+        is not None
+    )
+
+
+class RetagRunner:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._limiter: Optional[RateLimiter] = None
+        self._processed = 0
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def processed(self) -> int:
+        with self._lock:
+            return self._processed
+
+    def start(self, concurrency: int, requests_per_second: float) -> bool:
+        # 已在运行时返回 False，不重复启动；突发容量与并发数一致，启动瞬间每个线程各发一个请求
+        with self._lock:
+            if self.running:
+                return False
+            concurrency = max(1, concurrency)
+            self._stop.clear()
+            self._processed = 0
+            self._limiter = RateLimiter(requests_per_second, burst=concurrency)
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"ai-retag-{index}", daemon=True)
+                for index in range(concurrency)
+            ]
+            for thread in self._threads:
+                thread.start()
+            return True
+
+    def stop(self, timeout: float = 30.0) -> None:
+        # 已领取的任务执行完再退出，不留下 running 状态
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        # timeout 是所有线程共用的总等待时长，返回是否已全部结束
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not self.running
+
+    def _loop(self) -> None:
+        # 队列里只剩退避中的 pending 任务时继续等待，没有 pending 任务才结束
+        while not self._stop.is_set():
+            if not self._limiter.acquire(timeout=_POLL_SECONDS):
+                continue
+            try:
+                job = claim_next_job((JOB_AI_RETAG,))
+                if job is None:
+                    with session_scope() as session:
+                        if not _has_pending_jobs(session):
+                            return
+                    self._stop.wait(_POLL_SECONDS)
+                    continue
+            except Exception:
+                logging.exception("ai retag runner failed to claim job")
+                self._stop.wait(_POLL_SECONDS)
+                continue
+            run_job(job)
+            with self._lock:
+                self._processed += 1
+
+
+retag_runner = RetagRunner()
+
+
+def retag_status(session) -> Dict:
+    rows = (
+        session.query(IngestJob.status, func.count(IngestJob.id))
+        .filter(IngestJob.kind == JOB_AI_RETAG)
+        .group_by(IngestJob.status)
+        .all()
+    )
+    counts = {status: 0 for status in JOB_STATUSES}
+    counts.update({status: count for status, count in rows})
+    return {"active": retag_runner.running, "processed": retag_runner.processed, "jobs": counts}
+
+
+def image_ai_status(session, image) -> Dict:
+    # 任务：ai-status 返回单张图片真实的 AI 标签任务状态
+    # 方案：取该图片最近更新的 ai_tags/ai_retag 任务；排队或执行中直接返回任务状态，
+    #       已有 AI 标签视为 done（包括同步 ai-analyze 生成的），否则返回失败任务或 none
+    tags = [tag.name for tag in image.tags if tag.source == "ai"]
+    job = (
+        session.query(IngestJob)
+        .filter(IngestJob.image_id == image.id, IngestJob.kind.in_((JOB_AI_TAGS, JOB_AI_RETAG)))
+        .order_by(IngestJob.updated_at.desc(), IngestJob.id.desc())
+        .first()
+    )
+    result = {"tags": tags, "source": "ai"}
+    if job is not None and job.status in ("pending", "running"):
+        status = job.status
+    elif tags:
+        status = "done"
+    elif job is not None:
+        status = job.status
+    else:
+        status = "none"
+    result["status"] = status
+    if job is not None:
+        result["attempts"] = job.attempts
+        if status == "failed" and job.last_error:
+            result["error"] = job.last_error
+    return result
@@ -1,13 +1,18 @@
 # 任务：根据用户描述从标签库挑选相关标签并返回完整 AI 输出
-# 方案：拼接标签库 prompt -> 调用 Qwen 文本接口 -> 解析 ###### answer 行为标签列表
+# 方案：拼接标签库 prompt -> 调用 Qwen 文本接口（可选流式） -> 解析 ###### answer 行为标签列表
 
-from typing import Dict, List, Tuple
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
 import re
 
-import requests
-
+from src.core.config_loader import get_config
 from src.core.errors import ApiError, ERROR_UNSUPPORTED, ERROR_VALIDATION
 from src.services.ai_tag_service import _extract_text, _load_qwen_config
+from src.services.qwen_client import get_qwen_client
+from src.services.tag_pool import get_tag_pool
+from src.services.tag_prefilter import select_candidate_tags
+from src.utils.ngram import normalize_text
+from src.utils.ttl_cache import TTLCache
 
 _ANSWER_PATTERN = re.compile(r"^######\s*answer\s*:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
 
@@ -32,7 +37,8 @@ def _build_prompt(tag_pool: List[str], query: str, max_tags: int) -> str:
     )
 
 
-def _build_text_payload(prompt: str, cfg: Dict) -> Dict:
+def _build_text_payload(prompt: str, cfg: Dict, stream: bool = False) -> Dict:
+    # stream=True 时兼容模式加 stream 参数，标准模式开启 SSE 并要求增量输出，两者每条事件都只含新增文本
     compatible_mode = "compatible-mode" in cfg["base_url"].lower()
 
     if compatible_mode:
@@ -43,6 +49,8 @@ def _build_text_payload(prompt: str, cfg: Dict) -> Dict:
             "max_tokens": 800,
             "temperature": 0.2,
         }
+        if stream:
+            data["stream"] = True
     else:
         messages = [{"role": "user", "content": [{"text": prompt}]}]
         data = {
@@ -50,10 +58,12 @@ def _build_text_payload(prompt: str, cfg: Dict) -> Dict:
             "input": {"messages": messages},
             "parameters": {"max_tokens": 800, "temperature": 0.2},
         }
+        if stream:
+            data["parameters"]["incremental_output"] = True
 
     headers = {"Authorization": f"Bearer {cfg['api_key']}", "Content-Type": "application/json"}
     if not compatible_mode:
-        headers["X-DashScope-SSE"] = "disable"
+        headers["X-DashScope-SSE"] = "enable" if stream else "disable"
 
     if compatible_mode:
         api_url = f"{cfg['base_url']}/chat/completions"
@@ -67,29 +77,41 @@ def _build_text_payload(prompt: str, cfg: Dict) -> Dict:
 
 def _request_ai_text(prompt: str, cfg: Dict) -> str:
     payload = _build_text_payload(prompt, cfg)
+    content = get_qwen_client().post_json(
+        payload["url"], payload["data"], payload["headers"], cfg["timeout"], cfg["max_retries"]
+    )
+    text = _extract_text(content)
+    if text:
+        return text
+    raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 返回内容为空")
 
-    for attempt in range(cfg["max_retries"]):
-        response = requests.post(
-            payload["url"], json=payload["data"], headers=payload["headers"], timeout=cfg["timeout"]
-        )
-        if response.status_code == 200:
-            try:
-                content = response.json()
-            except ValueError as exc:
-                raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 响应解析失败") from exc
-            text = _extract_text(content)
-            if text:
-                return text
-            raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 返回内容为空")
-        if response.status_code in (401, 403):
-            raise ApiError(502, ERROR_UNSUPPORTED, "Qwen API key 无效或无权限")
-        if response.status_code == 429 and attempt < cfg["max_retries"] - 1:
-            continue
-        if response.status_code >= 500 and attempt < cfg["max_retries"] - 1:
+
+def _extract_delta(chunk: Dict) -> str:
+    # 兼容模式的流式事件把新增文本放在 choices[].delta，标准模式与非流式响应结构相同
+    choices = chunk.get("choices")
+    if choices and "output" not in chunk:
+        return (choices[0].get("delta") or {}).get("content") or ""
+    return _extract_text(chunk)
+
+
+def _stream_ai_text(prompt: str, cfg: Dict) -> Iterator[str]:
+    payload = _build_text_payload(prompt, cfg, stream=True)
+    lines = get_qwen_client().stream_lines(
+        payload["url"], payload["data"], payload["headers"], cfg["timeout"], cfg["max_retries"]
+    )
+    for line in lines:
+        if not line.startswith("data:"):
             continue
-        message = response.text or "Qwen API 调用失败"
-        raise ApiError(502, ERROR_UNSUPPORTED, message)
-    raise ApiError(502, ERROR_UNSUPPORTED, "Qwen API 多次调用失败")
+        raw = line[len("data:"):].strip()
+        if raw == "[DONE]":
+            break
+        try:
+            chunk = json.loads(raw)
+        except ValueError as exc:
+            raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 流式响应解析失败") from exc
+        delta = _extract_delta(chunk)
+        if delta:
+            yield delta
 
 
 def _split_tags(raw_text: str) -> List[str]:
@@ -120,9 +142,8 @@ def _parse_answer_tags(ai_text: str, tag_pool: List[str], max_tags: int) -> List
     return final_tags[:max_tags]
 
 
-def generate_search_tags(tag_pool: List[str], query: str) -> Tuple[str, List[str]]:
-    # 任务：根据用户查询从标签库中生成匹配标签并返回 AI 输出
-    # 方案：校验配置与输入，调用 Qwen 文本接口，解析标签行并限制数量
+def _prepare_search(tag_pool: List[str], query: str) -> Tuple[Dict, str, int]:
+    # 任务：校验配置与输入并生成 prompt，流式与非流式共用
     cfg = _load_qwen_config()
     if not cfg["enabled"]:
         raise ApiError(400, ERROR_VALIDATION, "未开启 AI 自动标签功能")
@@ -132,12 +153,75 @@ def generate_search_tags(tag_pool: List[str], query: str) -> Tuple[str, List[str
         raise ApiError(400, ERROR_VALIDATION, "标签库为空，无法进行检索")
 
     max_tags = min(5, len(tag_pool))
-    prompt = _build_prompt(tag_pool, query, max_tags)
+    return cfg, _build_prompt(tag_pool, query, max_tags), max_tags
 
-    try:
-        ai_text = _request_ai_text(prompt, cfg)
-    except requests.RequestException as exc:
-        raise ApiError(502, ERROR_UNSUPPORTED, f"Qwen API 请求失败: {exc}") from exc
+
+def generate_search_tags(tag_pool: List[str], query: str) -> Tuple[str, List[str]]:
+    # 任务：根据用户查询从标签库中生成匹配标签并返回 AI 输出
+    # 方案：校验配置与输入，调用 Qwen 文本接口，解析标签行并限制数量
+    cfg, prompt, max_tags = _prepare_search(tag_pool, query)
+
+    ai_text = _request_ai_text(prompt, cfg)
 
     tags = _parse_answer_tags(ai_text, tag_pool, max_tags)
     return ai_text, tags
+
+
+_result_cache: Optional[TTLCache] = None
+
+
+def _get_result_cache() -> TTLCache:
+    global _result_cache
+    if _result_cache is None:
+        cfg = (get_config().get("cache", {}) or {}).get("ai_search", {}) or {}
+        _result_cache = TTLCache(
+            max_entries=int(cfg.get("max_entries", 1000)),
+            ttl_seconds=float(cfg.get("ttl_seconds", 600)),
+        )
+    return _result_cache
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(normalize_text(query).split())
+
+
+def search_tags_cached(session, query: str) -> Tuple[str, List[str]]:
+    # 任务：相同或热门的检索在标签库未变化时不再请求模型
+    # 方案：以 (规范化查询, 标签库版本) 为键缓存 AI 输出与选中标签；标签库变化后版本号变化，旧结果自然失效
+    version, names = get_tag_pool(session)
+    key = (normalize_query(query), version)
+    cache = _get_result_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = generate_search_tags(select_candidate_tags(session, names, query), query)
+    cache.set(key, result)
+    return result
+
+
+def stream_search_tags(session, query: str) -> Iterator[Tuple[str, object]]:
+    # 任务：流式返回模型输出，首字节不必等待完整回答
+    # 方案：会话内完成缓存查找、候选预筛与配置校验（出错直接抛出，仍走普通错误响应）；
+    #       返回的生成器不再访问数据库，依次产出 ("delta", 文本片段)，最后产出 ("done", (AI 输出, 标签))；
+    #       缓存命中时整段输出作为一个片段，完整结果同样写入缓存
+    version, names = get_tag_pool(session)
+    key = (normalize_query(query), version)
+    cached = _get_result_cache().get(key)
+    if cached is not None:
+        return iter([("delta", cached[0]), ("done", cached)])
+    tag_pool = select_candidate_tags(session, names, query)
+    cfg, prompt, max_tags = _prepare_search(tag_pool, query)
+    return _stream_search(key, tag_pool, prompt, max_tags, cfg)
+
+
+def _stream_search(key, tag_pool: List[str], prompt: str, max_tags: int, cfg: Dict) -> Iterator[Tuple[str, object]]:
+    parts: List[str] = []
+    for delta in _stream_ai_text(prompt, cfg):
+        parts.append(delta)
+        yield "delta", delta
+    ai_text = "".join(parts)
+    if not ai_text:
+        raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 返回内容为空")
+    result = (ai_text, _parse_answer_tags(ai_text, tag_pool, max_tags))
+    _get_result_cache().set(key, result)
+    yield "done", result
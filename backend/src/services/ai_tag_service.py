@@ -1,12 +1,12 @@
 # 任务：调用 Qwen 接口为图片生成标签并入库
-# 方案：读取本地图片转 base64，走兼容模式或标准模式请求，解析结果落库 source=ai
+# 方案：先按内容摘要查 ai_tag_cache，未命中再读取分析用衍生图转 base64 请求模型（兼容模式或标准模式），解析结果落库 source=ai
 
 import base64
-import io
-from typing import Dict, List
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
 
-import requests
-from PIL import Image
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from src.core.config_loader import get_config
 from src.core.errors import (
@@ -15,11 +15,20 @@ from src.core.errors import (
     ERROR_UNSUPPORTED,
     ERROR_VALIDATION,
 )
+from src.models.ai_tag_cache import AiTagCache
 from src.models.image import Image as ImageModel
+from src.services.analysis_image_service import ensure_analysis_image
 from src.services.image_service import find_or_create_tags
+from src.services.qwen_client import get_qwen_client
+from src.utils.file_paths import file_sha256
 from src.utils.path_utils import resolve_path
 
 
+_TAG_PROMPT = "请分析这张图片的内容，用中文生成不超过5个相关标签，标签需要简洁、有意义，用中文逗号分隔。只返回标签文本。"
+# 修改 _TAG_PROMPT 或标签解析规则时同步递增，ai_tag_cache 中旧版本结果随之失效
+PROMPT_VERSION = "tags-v1"
+
+
 def _load_qwen_config() -> Dict:
     cfg = get_config().get("qwen", {}) or {}
     return {
@@ -36,15 +45,8 @@ def _load_qwen_config() -> Dict:
 
 
 def _image_to_base64(image_path) -> str:
-    with Image.open(image_path) as img:
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
-
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=85)
-        buffer.seek(0)
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+    # image_path 为分析用衍生图，已是缩放好的 JPEG，直接编码即可
+    return base64.b64encode(Path(image_path).read_bytes()).decode("utf-8")
 
 
 def _build_request_payload(image_base64: str, cfg: Dict) -> Dict:
@@ -58,7 +60,7 @@ def _build_request_payload(image_base64: str, cfg: Dict) -> Dict:
                     {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}},
                     {
                         "type": "text",
-                        "text": "请分析这张图片的内容，用中文生成不超过5个相关标签，标签需要简洁、有意义，用中文逗号分隔。只返回标签文本。",
+                        "text": _TAG_PROMPT,
                     },
                 ],
             }
@@ -71,7 +73,7 @@ def _build_request_payload(image_base64: str, cfg: Dict) -> Dict:
                 "content": [
                     {"image": f"data:image/jpeg;base64,{image_base64}"},
                     {
-                        "text": "请分析这张图片的内容，用中文生成不超过5个相关标签，标签需要简洁、有意义，用中文逗号分隔。只返回标签文本。",
+                        "text": _TAG_PROMPT,
                     },
                 ],
             }
@@ -141,50 +143,57 @@ def _parse_tags(text: str, max_tags: int) -> List[str]:
 def _request_tags(image_path, cfg: Dict) -> List[str]:
     image_base64 = _image_to_base64(image_path)
     payload = _build_request_payload(image_base64, cfg)
-
-    for attempt in range(cfg["max_retries"]):
-        response = requests.post(
-            payload["url"], json=payload["data"], headers=payload["headers"], timeout=cfg["timeout"]
+    content = get_qwen_client().post_json(
+        payload["url"], payload["data"], payload["headers"], cfg["timeout"], cfg["max_retries"]
+    )
+    tags = _parse_tags(_extract_text(content), cfg["max_tags"])
+    if tags:
+        return tags
+    raise ApiError(502, ERROR_UNSUPPORTED, "qwen 返回为空或无法解析标签")
+
+
+def lookup_cached_tags(session, sha256: str, model: str) -> Optional[List[str]]:
+    row = session.get(AiTagCache, (sha256, model, PROMPT_VERSION))
+    return list(row.tags) if row is not None else None
+
+
+def store_cached_tags(session, sha256: str, model: str, tags: List[str]) -> None:
+    # 并发分析同一内容时以后写入者为准；SQLite 用 upsert，其他方言用 merge
+    values = {"sha256": sha256, "model": model, "prompt_version": PROMPT_VERSION, "tags": tags}
+    if session.get_bind().dialect.name == "sqlite":
+        statement = sqlite_insert(AiTagCache).values(**values, created_at=datetime.utcnow())
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["sha256", "model", "prompt_version"],
+                set_={"tags": statement.excluded.tags, "created_at": statement.excluded.created_at},
+            )
         )
-        if response.status_code == 200:
-            try:
-                content = response.json()
-            except ValueError as exc:
-                raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 响应解析失败") from exc
-            text = _extract_text(content)
-            tags = _parse_tags(text, cfg["max_tags"])
-            if tags:
-                return tags
-            raise ApiError(502, ERROR_UNSUPPORTED, "qwen 返回为空或无法解析标签")
-        if response.status_code in (401, 403):
-            raise ApiError(502, ERROR_UNSUPPORTED, "Qwen API key 无效或无权限")
-        if response.status_code == 429 and attempt < cfg["max_retries"] - 1:
-            continue
-        if response.status_code >= 500 and attempt < cfg["max_retries"] - 1:
-            continue
-        message = response.text or "Qwen API 调用失败"
-        raise ApiError(502, ERROR_UNSUPPORTED, message)
-    raise ApiError(502, ERROR_UNSUPPORTED, "Qwen API 多次调用失败")
+        return
+    session.merge(AiTagCache(**values))
 
 
 def generate_ai_tags(session, image: ImageModel) -> List[str]:
+    # 任务：AI 标签的成本与耗时只随不同内容的数量增长，而不是上传次数
+    # 方案：先按 (sha256, 模型, prompt 版本) 查持久化缓存，命中则不读图、不联网；未命中才调用模型并写回缓存；
+    #       两种情况都经 find_or_create_tags 以 source=ai 落库
     cfg = _load_qwen_config()
     if not cfg["enabled"]:
         raise ApiError(400, ERROR_VALIDATION, "未开启 AI 自动标签功能")
-    if not cfg["api_key"]:
-        raise ApiError(400, ERROR_VALIDATION, "Qwen API key 未配置")
 
     root_dir = resolve_path(get_config()["storage"]["root_dir"])
     image_path = root_dir / image.storage_relpath
     if not image_path.exists():
         raise ApiError(404, ERROR_NOT_FOUND, "image file not found")
 
-    try:
-        ai_tags = _request_tags(image_path, cfg)
-    except requests.RequestException as exc:
-        raise ApiError(502, ERROR_UNSUPPORTED, f"Qwen API 请求失败: {exc}") from exc
+    sha256 = image.sha256 or file_sha256(image_path)
+    ai_tags = lookup_cached_tags(session, sha256, cfg["model"])
+    if ai_tags is None:
+        if not cfg["api_key"]:
+            raise ApiError(400, ERROR_VALIDATION, "Qwen API key 未配置")
+        ai_tags = _request_tags(ensure_analysis_image(image, image_path), cfg)
+        store_cached_tags(session, sha256, cfg["model"], ai_tags)
 
     keep_tags = [tag for tag in image.tags if tag.source != "ai"]
-    new_tags = find_or_create_tags(session, ai_tags, "ai")
+    new_tags = find_or_create_tags(session, ai_tags[: cfg["max_tags"]], "ai")
     image.tags = keep_tags + new_tags
     return [tag.name for tag in new_tags]
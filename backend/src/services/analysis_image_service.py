@@ -0,0 +1,85 @@
+# 任务：每次 AI 调用都完整解码原图、缩放到 1024px 再编码 JPEG，20MB 照片单次耗费数百毫秒 CPU
+# 方案：按内容 sha256 在磁盘保存一份分析用衍生图（最大边 analysis.max_edge 的 JPEG），
+#       入库解码时与缩略图共用一次解码顺带生成，缺失时首次使用再生成；相同内容的图片共用同一文件，
+#       编辑后 sha256 变化自然换用新文件；AI 标签及后续视觉类功能统一从这里取输入图
+
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Optional
+
+from PIL import Image, UnidentifiedImageError
+
+from src.core.config_loader import get_config
+from src.core.errors import ApiError, ERROR_NOT_FOUND, ERROR_UNSUPPORTED
+from src.utils.file_paths import ensure_parent, file_sha256
+from src.utils.image_ops import encode_jpeg, render_analysis_image
+from src.utils.path_utils import resolve_path
+
+
+def _analysis_cfg() -> dict:
+    cfg = get_config().get("analysis", {}) or {}
+    return {
+        "root_dir": cfg.get("root_dir") or "./data/analysis",
+        "max_edge": int(cfg.get("max_edge", 1024)),
+        "quality": int(cfg.get("quality", 85)),
+        "generate_on_ingest": bool(cfg.get("generate_on_ingest", True)),
+    }
+
+
+def generate_on_ingest() -> bool:
+    return _analysis_cfg()["generate_on_ingest"]
+
+
+def analysis_path(sha256: str) -> Path:
+    # 文件名带上 max_edge，修改配置后旧尺寸的文件不会被误用
+    cfg = _analysis_cfg()
+    return resolve_path(cfg["root_dir"]) / sha256[:2] / f"{sha256}_{cfg['max_edge']}.jpg"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # 多个 worker 可能同时为同一内容生成，各写各的临时文件后 os.replace，读者不会看到半个文件
+    ensure_parent(path)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    try:
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def save_analysis_image(img, sha256: str):
+    # 任务：入库流程复用已打开（尚未解码）的原图生成衍生图
+    # 方案：返回缩放后的 RGB 图，调用方可继续从它生成缩略图，不必再次解码原图
+    #       写入失败不影响入库，首次使用时会重新生成
+    cfg = _analysis_cfg()
+    resized = render_analysis_image(img, cfg["max_edge"])
+    path = analysis_path(sha256)
+    if not path.exists():
+        try:
+            _write_atomic(path, encode_jpeg(resized, cfg["quality"]))
+        except OSError as exc:
+            logging.warning("failed to write analysis image: sha256=%s error=%s", sha256, exc)
+    return resized
+
+
+def ensure_analysis_image(image, image_path: Optional[Path] = None) -> Path:
+    # 任务：返回图片的分析用衍生图路径，不存在时从原图生成
+    # 方案：sha256 缺失的历史记录按文件内容现算；原图缺失或无法解码时报错
+    if image_path is None:
+        image_path = resolve_path(get_config()["storage"]["root_dir"]) / image.storage_relpath
+    if not image_path.exists():
+        raise ApiError(404, ERROR_NOT_FOUND, "image file not found")
+    sha256 = image.sha256 or file_sha256(image_path)
+    path = analysis_path(sha256)
+    if path.exists():
+        return path
+    cfg = _analysis_cfg()
+    try:
+        with Image.open(image_path) as img:
+            resized = render_analysis_image(img, cfg["max_edge"])
+    except (UnidentifiedImageError, OSError, SyntaxError) as exc:
+        raise ApiError(415, ERROR_UNSUPPORTED, "invalid image") from exc
+    _write_atomic(path, encode_jpeg(resized, cfg["quality"]))
+    return path
@@ -9,7 +9,7 @@ from PIL import Image
 from src.core.config_loader import get_config
 from src.core.errors import ApiError, ERROR_NOT_FOUND
 from src.models.image_dimensions import ImageDimensions
-from src.utils.file_paths import build_backup_relpath, ensure_parent
+from src.utils.file_paths import build_backup_relpath, ensure_parent, file_sha256
 from src.utils.path_utils import resolve_path
 from src.services.thumbnail_service import invalidate_thumbnail
 
@@ -41,6 +41,9 @@ def after_edit(session, image):
     file_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
     if file_path.exists():
         image.size_bytes = file_path.stat().st_size
+        # 任务：编辑后内容变化，sha256 作为 ETag 来源必须同步刷新，避免客户端拿 304 读到旧图
+        # 方案：重新计算落盘文件摘要写回 images.sha256
+        image.sha256 = file_sha256(file_path)
         with Image.open(file_path) as img:
             width, height = img.size
         if image.dimensions:
@@ -0,0 +1,183 @@
+# 任务：按 EXIF 类型化字段过滤图片列表，并为侧边栏提供分面计数
+# 方案：过滤条件落到 image_exif_facets / image_capture_time 的索引列上；计数用 GROUP BY 聚合，限制返回条数
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, extract, func
+
+from src.core.config_loader import get_config
+from src.core.errors import ApiError, ERROR_VALIDATION
+from src.models.image import Image as ImageModel
+from src.models.image_capture_time import ImageCaptureTime
+from src.models.image_exif_facets import ImageExifFacets
+from src.utils.exif_utils import parse_facets
+
+# ISO 分段：(标签, 下限, 上限)，上限为 None 表示不设上限；与 iso_min/iso_max 参数对应
+ISO_BUCKETS = [
+    ("≤200", None, 200),
+    ("201-800", 201, 800),
+    ("801-3200", 801, 3200),
+    (">3200", 3201, None),
+]
+
+
+def write_exif_facets(session, image_id: int, exif_dict: dict, replace: bool = False) -> None:
+    if replace:
+        session.query(ImageExifFacets).filter(ImageExifFacets.image_id == image_id).delete(
+            synchronize_session=False
+        )
+    session.add(ImageExifFacets(image_id=image_id, **parse_facets(exif_dict)))
+
+
+def clone_exif_facets(session, source, image_id: int) -> None:
+    facets = source.exif_facets
+    if facets is None:
+        return
+    session.add(
+        ImageExifFacets(
+            image_id=image_id,
+            camera=facets.camera,
+            camera_make=facets.camera_make,
+            camera_model=facets.camera_model,
+            lens=facets.lens,
+            focal_length=facets.focal_length,
+            f_number=facets.f_number,
+            exposure_time=facets.exposure_time,
+            iso=facets.iso,
+        )
+    )
+
+
+def _split_values(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_taken(value: Optional[str], name: str, end: bool = False) -> Tuple[Optional[datetime], bool]:
+    # 任务：拍摄时间参数既可传日期也可传完整时间，返回 (时间, 是否只给了日期)
+    # 方案：只给日期时，结束边界取次日零点（不含），保证 taken_to 包含当天；
+    #       taken_at 按 UTC 存储，带时区偏移的时间先换算到 UTC 再去掉时区
+    if not value:
+        return None, False
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        if end:
+            day += timedelta(days=1)
+        return datetime(day.year, day.month, day.day), True
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as exc:
+        raise ApiError(400, ERROR_VALIDATION, f"invalid {name}") from exc
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed, False
+
+
+def apply_facet_filters(
+    query,
+    camera: str = None,
+    lens: str = None,
+    taken_from: str = None,
+    taken_to: str = None,
+    iso_min: int = None,
+    iso_max: int = None,
+    focal_min: float = None,
+    focal_max: float = None,
+):
+    # 任务：列表支持 camera/lens（逗号分隔多选）、拍摄时间范围、ISO 与焦距范围
+    # 方案：仅在有对应条件时 JOIN，条件全部落在带索引的列上
+    conditions = []
+    cameras = _split_values(camera)
+    lenses = _split_values(lens)
+    if cameras:
+        conditions.append(ImageExifFacets.camera.in_(cameras))
+    if lenses:
+        conditions.append(ImageExifFacets.lens.in_(lenses))
+    if iso_min is not None:
+        conditions.append(ImageExifFacets.iso >= iso_min)
+    if iso_max is not None:
+        conditions.append(ImageExifFacets.iso <= iso_max)
+    if focal_min is not None:
+        conditions.append(ImageExifFacets.focal_length >= focal_min)
+    if focal_max is not None:
+        conditions.append(ImageExifFacets.focal_length <= focal_max)
+    if conditions:
+        query = query.join(ImageExifFacets, ImageExifFacets.image_id == ImageModel.id).filter(*conditions)
+
+    start, _ = _parse_taken(taken_from, "taken_from")
+    end, end_date_only = _parse_taken(taken_to, "taken_to", end=True)
+    if start is not None or end is not None:
+        query = query.join(ImageCaptureTime, ImageCaptureTime.image_id == ImageModel.id)
+        if start is not None:
+            query = query.filter(ImageCaptureTime.taken_at >= start)
+        if end is not None:
+            # 只给日期时 end 已是次日零点，用严格小于；完整时间按闭区间
+            query = query.filter(ImageCaptureTime.taken_at < end if end_date_only else ImageCaptureTime.taken_at <= end)
+    return query
+
+
+def _value_counts(session, column, limit: int) -> List[Dict]:
+    rows = (
+        session.query(column, func.count())
+        .select_from(ImageExifFacets)
+        .join(ImageModel, ImageModel.id == ImageExifFacets.image_id)
+        .filter(ImageModel.is_deleted.is_(False), column.isnot(None))
+        .group_by(column)
+        .order_by(func.count().desc(), column)
+        .limit(limit)
+        .all()
+    )
+    return [{"value": value, "count": count} for value, count in rows]
+
+
+def facet_counts(session) -> Dict:
+    # 任务：侧边栏展示各相机/镜头/年份/ISO 段的图片数量
+    # 方案：每个维度一条 GROUP BY，只统计未删除图片，相机与镜头按数量取前 facets.limit 个
+    limit = int((get_config().get("facets", {}) or {}).get("limit", 50))
+
+    year = extract("year", ImageCaptureTime.taken_at)
+    year_rows = (
+        session.query(year, func.count())
+        .select_from(ImageCaptureTime)
+        .join(ImageModel, ImageModel.id == ImageCaptureTime.image_id)
+        .filter(ImageModel.is_deleted.is_(False), ImageCaptureTime.taken_at.isnot(None))
+        .group_by(year)
+        .order_by(year.desc())
+        .all()
+    )
+
+    bucket = case(
+        *[
+            (
+                (ImageExifFacets.iso <= upper) if lower is None
+                else (ImageExifFacets.iso >= lower) if upper is None
+                else ImageExifFacets.iso.between(lower, upper),
+                label,
+            )
+            for label, lower, upper in ISO_BUCKETS
+        ]
+    )
+    iso_rows = dict(
+        session.query(bucket, func.count())
+        .select_from(ImageExifFacets)
+        .join(ImageModel, ImageModel.id == ImageExifFacets.image_id)
+        .filter(ImageModel.is_deleted.is_(False), ImageExifFacets.iso.isnot(None))
+        .group_by(bucket)
+        .all()
+    )
+
+    return {
+        "cameras": _value_counts(session, ImageExifFacets.camera, limit),
+        "lenses": _value_counts(session, ImageExifFacets.lens, limit),
+        "years": [{"value": int(value), "count": count} for value, count in year_rows],
+        "iso": [
+            {"label": label, "min": lower, "max": upper, "count": iso_rows.get(label, 0)}
+            for label, lower, upper in ISO_BUCKETS
+            if iso_rows.get(label)
+        ],
+    }
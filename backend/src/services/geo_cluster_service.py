@@ -0,0 +1,246 @@
+# 任务：地图按缩放级别与可视范围返回聚合点（数量、质心、代表缩略图），平移缩放不能每次全表 GROUP BY
+# 方案：geo_cells 按 geohash 前缀长度预聚合；SQLite 触发器挂在 image_location 的增删改与 images.is_deleted 上，
+#       同步上传、后台入库、去重克隆、删除/恢复与迁移脚本都无需各自维护计数；查询时把视口换成前缀区间走主键
+
+import logging
+from typing import List, Optional
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import load_only
+
+from src.core.config_loader import get_config
+from src.core.errors import ApiError, ERROR_VALIDATION
+from src.models.geo_cell import GeoCell
+from src.models.image import Image as ImageModel
+from src.services.geo_service import _check_point, _parse_floats, _split_segments
+from src.services.serializers import build_thumbnail_url
+from src.utils.geohash import cover_bbox, decode_bbox
+
+_TRIGGER_PREFIX = "trg_geo_cells_"
+
+
+def _cluster_cfg() -> dict:
+    return (get_config().get("geo", {}) or {}).get("cluster", {}) or {}
+
+
+def cluster_precisions() -> List[int]:
+    max_precision = min(max(int(_cluster_cfg().get("max_precision", 8)), 1), 9)
+    return list(range(1, max_precision + 1))
+
+
+def precision_for_zoom(zoom: int) -> int:
+    # 任务：把 Web 墨卡托缩放级别映射到 geohash 精度
+    # 方案：zoom 级别下世界宽 256·2^zoom 像素，取经度位数不超过 zoom + 2 的最大精度，网格约 64 像素以上
+    best = 1
+    for precision in cluster_precisions():
+        lon_bits = (precision * 5 + 1) // 2
+        if lon_bits <= zoom + 2:
+            best = precision
+    return best
+
+
+def _add_sql(precision: int, image_id: str, lat: str, lon: str, geohash: str) -> str:
+    # 新坐标计入该精度下的网格；最新加入的图片作为代表缩略图
+    return (
+        "INSERT INTO geo_cells (precision, cell, count, lat_sum, lon_sum, sample_image_id) "
+        f"SELECT {precision}, substr({geohash}, 1, {precision}), 1, "
+        f"CAST({lat} AS REAL), CAST({lon} AS REAL), {image_id} WHERE {geohash} IS NOT NULL "
+        "ON CONFLICT (precision, cell) DO UPDATE SET count = count + 1, "
+        "lat_sum = lat_sum + excluded.lat_sum, lon_sum = lon_sum + excluded.lon_sum, "
+        "sample_image_id = excluded.sample_image_id;"
+    )
+
+
+def _remove_sql(precision: int, image_id: str, lat: str, lon: str, geohash: str) -> str:
+    # 移出坐标；代表图被移出时从同一网格里另取一张未删除的图片，计数归零的网格直接删除
+    cell = f"substr({geohash}, 1, {precision})"
+    return (
+        "UPDATE geo_cells SET count = count - 1, "
+        f"lat_sum = lat_sum - CAST({lat} AS REAL), lon_sum = lon_sum - CAST({lon} AS REAL), "
+        f"sample_image_id = CASE WHEN sample_image_id = {image_id} THEN ("
+        "SELECT l.image_id FROM image_location l JOIN images i ON i.id = l.image_id "
+        "WHERE l.geohash >= geo_cells.cell AND l.geohash < geo_cells.cell || '~' "
+        f"AND i.is_deleted = 0 AND l.image_id != {image_id} LIMIT 1"
+        ") ELSE sample_image_id END "
+        f"WHERE precision = {precision} AND cell = {cell};"
+        f"DELETE FROM geo_cells WHERE precision = {precision} AND cell = {cell} AND count <= 0;"
+    )
+
+
+def _body(builder, row: str, precisions: List[int]) -> str:
+    columns = (f"{row}.image_id", f"{row}.latitude", f"{row}.longitude", f"{row}.geohash")
+    return " ".join(builder(precision, *columns) for precision in precisions)
+
+
+def _image_body(builder, precisions: List[int]) -> str:
+    # images 触发器里坐标来自 image_location，用标量子查询取出；无坐标时 geohash 为 NULL，语句不产生效果
+    def column(name: str) -> str:
+        return f"(SELECT {name} FROM image_location WHERE image_id = NEW.id)"
+
+    return " ".join(
+        builder(precision, "NEW.id", column("latitude"), column("longitude"), column("geohash"))
+        for precision in precisions
+    )
+
+
+def _trigger_ddl(precisions: List[int]) -> dict:
+    alive = "(SELECT is_deleted FROM images WHERE id = {}.image_id) = 0"
+    return {
+        "location_insert": (
+            "AFTER INSERT ON image_location "
+            f"WHEN NEW.geohash IS NOT NULL AND {alive.format('NEW')} "
+            f"BEGIN {_body(_add_sql, 'NEW', precisions)} END"
+        ),
+        "location_delete": (
+            "AFTER DELETE ON image_location "
+            f"WHEN OLD.geohash IS NOT NULL AND {alive.format('OLD')} "
+            f"BEGIN {_body(_remove_sql, 'OLD', precisions)} END"
+        ),
+        "location_update": (
+            "AFTER UPDATE OF geohash, latitude, longitude ON image_location "
+            f"WHEN {alive.format('NEW')} "
+            f"BEGIN {_body(_remove_sql, 'OLD', precisions)} {_body(_add_sql, 'NEW', precisions)} END"
+        ),
+        "image_deleted": (
+            "AFTER UPDATE OF is_deleted ON images "
+            "WHEN NEW.is_deleted = 1 AND OLD.is_deleted = 0 "
+            f"BEGIN {_image_body(_remove_sql, precisions)} END"
+        ),
+        "image_restored": (
+            "AFTER UPDATE OF is_deleted ON images "
+            "WHEN NEW.is_deleted = 0 AND OLD.is_deleted = 1 "
+            f"BEGIN {_image_body(_add_sql, precisions)} END"
+        ),
+    }
+
+
+def rebuild_geo_cells(conn, precisions: Optional[List[int]] = None) -> int:
+    # 任务：首次启用、调整精度配置或数据被脚本绕过触发器修改后，从 image_location 重新汇总
+    # 方案：清空后每个精度一条 INSERT ... SELECT GROUP BY，代表图取网格内最新的图片
+    precisions = precisions or cluster_precisions()
+    conn.execute(text("DELETE FROM geo_cells"))
+    for precision in precisions:
+        conn.execute(
+            text(
+                "INSERT INTO geo_cells (precision, cell, count, lat_sum, lon_sum, sample_image_id) "
+                "SELECT :precision, substr(l.geohash, 1, :precision), count(*), "
+                "sum(CAST(l.latitude AS REAL)), sum(CAST(l.longitude AS REAL)), max(l.image_id) "
+                "FROM image_location l JOIN images i ON i.id = l.image_id "
+                "WHERE l.geohash IS NOT NULL AND i.is_deleted = 0 "
+                "GROUP BY substr(l.geohash, 1, :precision)"
+            ),
+            {"precision": precision},
+        )
+    return conn.execute(text("SELECT count(*) FROM geo_cells")).scalar_one()
+
+
+def ensure_geo_cell_triggers(engine) -> None:
+    # 任务：启动时安装与当前精度配置一致的触发器，精度变化或聚合表尚未初始化时重建一次
+    # 方案：触发器每次启动重建（DDL 很轻）；比较聚合表中的精度集合与配置决定是否需要全量汇总
+    if engine.dialect.name != "sqlite":
+        logging.warning("geo cell triggers require sqlite, map clustering disabled")
+        return
+    precisions = cluster_precisions()
+    with engine.begin() as conn:
+        for name, ddl in _trigger_ddl(precisions).items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_TRIGGER_PREFIX}{name}"))
+            conn.execute(text(f"CREATE TRIGGER {_TRIGGER_PREFIX}{name} {ddl}"))
+        stored = {row[0] for row in conn.execute(text("SELECT DISTINCT precision FROM geo_cells"))}
+        if stored == set(precisions):
+            return
+        located = conn.execute(
+            text("SELECT 1 FROM image_location WHERE geohash IS NOT NULL LIMIT 1")
+        ).first()
+        if stored or located:
+            rebuild_geo_cells(conn, precisions)
+
+
+def _parse_viewport(bbox: str):
+    min_lon, min_lat, max_lon, max_lat = _parse_floats(bbox, 4, "bbox")
+    _check_point(min_lat, min_lon, "bbox")
+    _check_point(max_lat, max_lon, "bbox")
+    if min_lat > max_lat:
+        raise ApiError(400, ERROR_VALIDATION, "invalid bbox")
+    return _split_segments(min_lat, min_lon, max_lat, max_lon)
+
+
+def _intersects(bounds, segment) -> bool:
+    cell_min_lat, cell_min_lon, cell_max_lat, cell_max_lon = bounds
+    min_lat, min_lon, max_lat, max_lon = segment
+    return not (
+        cell_max_lat < min_lat or cell_min_lat > max_lat or cell_max_lon < min_lon or cell_min_lon > max_lon
+    )
+
+
+def cluster_map(session, bbox: str, zoom: int = None, precision: int = None) -> dict:
+    # 任务：返回视口内各网格的聚合结果
+    # 方案：视口覆盖前缀截到目标精度后作为主键区间读取，按网格范围精确裁剪，超出上限时保留图片最多的网格
+    cfg = _cluster_cfg()
+    precisions = cluster_precisions()
+    if precision is None:
+        if zoom is None:
+            raise ApiError(400, ERROR_VALIDATION, "zoom or precision required")
+        if zoom < 0 or zoom > 30:
+            raise ApiError(400, ERROR_VALIDATION, "zoom out of range")
+        precision = precision_for_zoom(zoom)
+    elif precision not in precisions:
+        raise ApiError(400, ERROR_VALIDATION, "precision out of range")
+
+    segments = _parse_viewport(bbox)
+    max_cells = int((get_config().get("geo", {}) or {}).get("max_cells", 32))
+    prefixes = set()
+    for segment in segments:
+        prefixes.update(prefix[:precision] for prefix in cover_bbox(*segment, max_cells))
+    if not prefixes:
+        return {"precision": precision, "cells": [], "truncated": False}
+
+    rows = (
+        session.query(GeoCell)
+        .filter(
+            GeoCell.precision == precision,
+            or_(*[and_(GeoCell.cell >= prefix, GeoCell.cell < prefix + "~") for prefix in sorted(prefixes)]),
+        )
+        .all()
+    )
+    matched = []
+    for row in rows:
+        bounds = decode_bbox(row.cell)
+        if any(_intersects(bounds, segment) for segment in segments):
+            matched.append((row, bounds))
+
+    limit = int(cfg.get("max_cells", 2000))
+    truncated = len(matched) > limit
+    if truncated:
+        matched.sort(key=lambda item: item[0].count, reverse=True)
+        matched = matched[:limit]
+
+    sample_ids = {row.sample_image_id for row, _ in matched if row.sample_image_id}
+    samples = {}
+    if sample_ids:
+        samples = {
+            image.id: image
+            for image in session.query(ImageModel)
+            .options(load_only(ImageModel.id, ImageModel.sha256, ImageModel.updated_at))
+            .filter(ImageModel.id.in_(sample_ids))
+            .all()
+        }
+
+    cells = []
+    for row, bounds in matched:
+        sample = samples.get(row.sample_image_id)
+        cells.append(
+            {
+                "cell": row.cell,
+                "count": row.count,
+                "latitude": round(row.lat_sum / row.count, 7),
+                "longitude": round(row.lon_sum / row.count, 7),
+                "bounds": [bounds[1], bounds[0], bounds[3], bounds[2]],
+                "sample_image_id": sample.id if sample else None,
+                "thumbnail_url": build_thumbnail_url(sample) if sample else None,
+            }
+        )
+    return {
+        "precision": precision,
+        "cells": cells,
+        "truncated": truncated,
+    }
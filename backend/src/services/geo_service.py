@@ -0,0 +1,134 @@
+# 任务：图片列表支持按矩形范围（bbox）与圆形范围（near + radius_km）检索带坐标的图片
+# 方案：image_location.geohash 建 B-Tree 索引，查询区域转成少量 geohash 前缀区间走索引，
+#       再用经纬度精确裁剪；圆形范围在同一子查询里再按 haversine 距离裁剪，整体交给主查询按主键过滤
+
+import sqlite3
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, event, func, or_, select
+from sqlalchemy.engine import Engine
+
+from src.core.config_loader import get_config
+from src.core.errors import ApiError, ERROR_VALIDATION
+from src.models.image import Image as ImageModel
+from src.models.image_location import ImageLocation
+from src.utils.geohash import EARTH_RADIUS_KM, cover_bbox, encode, haversine_km, radius_bbox
+
+GEOHASH_PRECISION = 9
+
+Segment = Tuple[float, float, float, float]
+
+
+def _geo_cfg() -> dict:
+    return get_config().get("geo", {}) or {}
+
+
+def geohash_for(latitude, longitude) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return encode(float(latitude), float(longitude), GEOHASH_PRECISION)
+
+
+def _parse_floats(value: str, count: int, name: str) -> List[float]:
+    try:
+        numbers = [float(item) for item in value.split(",")]
+    except ValueError as exc:
+        raise ApiError(400, ERROR_VALIDATION, f"invalid {name}") from exc
+    if len(numbers) != count:
+        raise ApiError(400, ERROR_VALIDATION, f"invalid {name}")
+    return numbers
+
+
+def _check_point(latitude: float, longitude: float, name: str) -> None:
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        raise ApiError(400, ERROR_VALIDATION, f"{name} out of range")
+
+
+def _split_segments(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Segment]:
+    # 任务：跨 180° 经线的区域拆成两段，每段都是普通矩形
+    if min_lon > max_lon:
+        return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    if min_lon < -180.0:
+        return [(min_lat, min_lon + 360.0, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    if max_lon > 180.0:
+        return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon - 360.0)]
+    return [(min_lat, min_lon, max_lat, max_lon)]
+
+
+def _segments_condition(segments: List[Segment]):
+    max_cells = int(_geo_cfg().get("max_cells", 32))
+    conditions = []
+    for min_lat, min_lon, max_lat, max_lon in segments:
+        prefixes = cover_bbox(min_lat, min_lon, max_lat, max_lon, max_cells)
+        ranges = or_(
+            *[and_(ImageLocation.geohash >= prefix, ImageLocation.geohash < prefix + "~") for prefix in prefixes]
+        )
+        # 经纬度上各有单列索引，SQLite 无统计信息时会优先选纬度索引做一维扫描；
+        # “+ 0”让这两个条件只做裁剪，保证走 geohash 的 MULTI-INDEX OR 区间扫描
+        conditions.append(
+            and_(
+                ranges,
+                (ImageLocation.latitude + 0).between(min_lat, max_lat),
+                (ImageLocation.longitude + 0).between(min_lon, max_lon),
+            )
+        )
+    return or_(*conditions)
+
+
+def _sqlite_haversine_km(lat1, lon1, lat2, lon2):
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    return haversine_km(float(lat1), float(lon1), float(lat2), float(lon2))
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    # 任务：SQLite 未必编译了 sin/cos 等数学函数，圆形范围的距离裁剪仍要在 SQL 内完成
+    # 方案：每个新连接注册确定性函数 haversine_km(lat1, lon1, lat2, lon2)，与 utils.geohash 同一实现
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("haversine_km", 4, _sqlite_haversine_km, deterministic=True)
+
+
+def _distance_km(session, latitude: float, longitude: float):
+    # 任务：给定点到 image_location 坐标的球面距离（km）的 SQL 表达式
+    # 方案：SQLite 调用注册函数；其他方言直接用内置三角函数展开 haversine
+    if session.get_bind().dialect.name == "sqlite":
+        return func.haversine_km(latitude, longitude, ImageLocation.latitude, ImageLocation.longitude)
+    lat2 = func.radians(ImageLocation.latitude)
+    d_phi = lat2 - func.radians(latitude)
+    d_lambda = func.radians(ImageLocation.longitude) - func.radians(longitude)
+    a = func.power(func.sin(d_phi / 2), 2) + func.cos(func.radians(latitude)) * func.cos(lat2) * func.power(
+        func.sin(d_lambda / 2), 2
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def apply_geo_filters(session, query, bbox: str = None, near: str = None, radius_km: float = None):
+    # 任务：bbox=min_lon,min_lat,max_lon,max_lat（GeoJSON 顺序，min_lon > max_lon 表示跨 180° 经线）；
+    #       near=lat,lon 配合 radius_km（缺省 geo.default_radius_km）
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = _parse_floats(bbox, 4, "bbox")
+        _check_point(min_lat, min_lon, "bbox")
+        _check_point(max_lat, max_lon, "bbox")
+        if min_lat > max_lat:
+            raise ApiError(400, ERROR_VALIDATION, "invalid bbox")
+        condition = _segments_condition(_split_segments(min_lat, min_lon, max_lat, max_lon))
+        query = query.join(ImageLocation, ImageLocation.image_id == ImageModel.id).filter(condition)
+
+    if near:
+        latitude, longitude = _parse_floats(near, 2, "near")
+        _check_point(latitude, longitude, "near")
+        cfg = _geo_cfg()
+        radius = float(radius_km if radius_km is not None else cfg.get("default_radius_km", 5))
+        if radius <= 0 or radius > float(cfg.get("max_radius_km", 1000)):
+            raise ApiError(400, ERROR_VALIDATION, "radius_km out of range")
+        # 任务：geohash 前缀区间 + 外接矩形先走索引收窄候选，再按真实距离裁剪，候选 id 不回到 Python
+        # 方案：两步条件放在同一个 image_location 子查询里，主查询以 id IN (子查询) 过滤
+        condition = _segments_condition(_split_segments(*radius_bbox(latitude, longitude, radius)))
+        within = (
+            select(ImageLocation.image_id)
+            .where(condition)
+            .where(_distance_km(session, latitude, longitude) <= radius)
+        )
+        query = query.filter(ImageModel.id.in_(within))
+    return query
@@ -1,7 +1,9 @@
 # 任务：实现图片上传、元数据入库、标签管理与查询
-# 方案：落盘后解析 EXIF/尺寸/缩略图并写入拆分表结构
+# 方案：流式落盘时计算摘要，一次解码解析 EXIF/尺寸/缩略图并写入拆分表结构
 
 from datetime import datetime
+import hashlib
+import os
 from pathlib import Path
 from typing import List, Optional
 from PIL import Image, UnidentifiedImageError
@@ -18,12 +20,23 @@ from src.models.image import Image as ImageModel
 from src.models.image_dimensions import ImageDimensions
 from src.models.image_capture_time import ImageCaptureTime
 from src.models.image_location import ImageLocation
-from src.models.image_exif import ImageExifEntry
+from src.models.image_exif import ImageExifEntry, ImageExifData
 from src.models.tag import Tag
-from src.utils.file_paths import build_storage_relpath, ensure_parent
+from src.utils.file_paths import build_date_dir, build_storage_relpath, ensure_parent, random_hash
 from src.utils.path_utils import resolve_path
-from src.utils.exif_utils import extract_exif_dict, parse_capture_time, parse_location, build_exif_tags
-from src.services.thumbnail_service import upsert_thumbnail
+from src.utils.exif_utils import (
+    extract_exif_dict,
+    parse_capture_time,
+    parse_location,
+    build_exif_tags,
+    compact_exif_items,
+)
+from src.services.thumbnail_service import upsert_thumbnail, build_thumbnail_from_image
+from src.services.analysis_image_service import generate_on_ingest, save_analysis_image
+from src.services.tag_resolver import resolve_tags
+from src.services.facet_service import write_exif_facets, clone_exif_facets
+from src.services.geo_service import geohash_for
+from src.services.ingest_queue import JOB_METADATA, enqueue_job, ingest_in_background
 
 
 def parse_tag_string(tags_value: str) -> List[str]:
@@ -63,39 +76,239 @@ def validate_upload(file_storage, content_length: Optional[int]):
 
 
 def find_or_create_tags(session, names: List[str], source: str) -> List[Tag]:
-    tags = []
-    for name in names:
-        tag = session.query(Tag).filter(Tag.name == name, Tag.source == source).first()
-        if not tag:
-            tag = Tag(name=name, source=source)
-            session.add(tag)
-        tags.append(tag)
-    return tags
+    # 任务：EXIF/自定义/AI 标签与迁移脚本都走批量解析，避免每个标签一次查询
+    # 方案：委托 tag_resolver，结果去重且保持输入顺序
+    return resolve_tags(session, names, source)
 
 
-def save_upload(session, file_storage, uploader, tags_value: str, content_length: Optional[int]):
-    ext, original_filename = validate_upload(file_storage, content_length)
-    root_dir = resolve_path(get_config()["storage"]["root_dir"])
-    storage_relpath, hash_value = build_storage_relpath(ext)
-    abs_path = root_dir / storage_relpath
-    while abs_path.exists():
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def _stream_to_temp(stream, target_dir: Path, max_bytes: int):
+    # 任务：上传内容边写边算摘要，超过大小上限立即中止，不再先整体落盘再检查
+    # 方案：在目标日期目录内用 O_EXCL 创建独占临时文件，按块写入并累计 sha256；
+    #       临时文件与最终文件同目录，保证后续改名是同一文件系统内的原子操作
+    ensure_parent(target_dir / "_")
+    while True:
+        temp_path = target_dir / f".upload-{random_hash(16)}.part"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            break
+        except FileExistsError:
+            continue
+
+    sha = hashlib.sha256()
+    size_bytes = 0
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in iter(lambda: stream.read(_UPLOAD_CHUNK_BYTES), b""):
+                size_bytes += len(chunk)
+                if size_bytes > max_bytes:
+                    raise ApiError(413, ERROR_TOO_LARGE, "file too large")
+                sha.update(chunk)
+                handle.write(chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path, size_bytes, sha.hexdigest()
+
+
+def _link_into_place(source_path: Path, root_dir: Path, ext: str):
+    # 任务：把内容文件放到最终的随机文件名下，且不覆盖已有文件
+    # 方案：os.link 在目标已存在时抛 FileExistsError，据此重新生成文件名；临时名由调用方统一删除
+    while True:
         storage_relpath, hash_value = build_storage_relpath(ext)
         abs_path = root_dir / storage_relpath
-    ensure_parent(abs_path)
+        ensure_parent(abs_path)
+        try:
+            os.link(source_path, abs_path)
+        except FileExistsError:
+            continue
+        return storage_relpath, hash_value
+
+
+def _find_duplicate(session, root_dir: Path, sha256: str, size_bytes: int):
+    # 任务：按内容摘要找到可共享文件的已有图片
+    # 方案：走 images.sha256 索引，要求磁盘文件仍在且大小一致；元数据是否可复用由调用方判断
+    if not get_config().get("upload", {}).get("dedup", True):
+        return None, None
+    candidates = (
+        session.query(ImageModel)
+        .filter(ImageModel.sha256 == sha256, ImageModel.size_bytes == size_bytes)
+        .order_by(ImageModel.id)
+        .limit(5)
+        .all()
+    )
+    for candidate in candidates:
+        path = root_dir / candidate.storage_relpath
+        try:
+            if path.stat().st_size == size_bytes:
+                return candidate, path
+        except OSError:
+            continue
+    return None, None
+
+
+def _exif_max_value_chars() -> int:
+    return int((get_config().get("exif", {}) or {}).get("max_value_chars", 256))
+
+
+def write_exif_data(session, image_id: int, exif_dict: dict, replace: bool = False) -> None:
+    # 任务：EXIF 以单行 JSON 写入，替代每个键一个 ImageExifEntry 对象
+    # 方案：过滤二进制、截断超长值后整体写入 image_exif_data；replace 时同时清掉新旧两种存储
+    if replace:
+        for model in (ImageExifData, ImageExifEntry):
+            session.query(model).filter(model.image_id == image_id).delete(synchronize_session=False)
+    items = compact_exif_items(exif_dict.items(), _exif_max_value_chars())
+    session.add(ImageExifData(image_id=image_id, data=items))
+
+
+def load_exif_items(image) -> List[List[Optional[str]]]:
+    # 任务：读取 EXIF 时兼容尚未回填的历史明细行
+    # 方案：优先 image_exif_data，没有时按旧表插入顺序返回 [key, value]
+    if image.exif_data is not None:
+        return image.exif_data.data or []
+    entries = sorted(image.exif_entries, key=lambda entry: entry.id)
+    return [[entry.exif_key, entry.exif_value] for entry in entries]
+
+
+def _clone_metadata(session, source, image):
+    # 任务：重复内容直接复用已有的尺寸、拍摄信息、EXIF 与缩略图，跳过解码
+    # 方案：一对一表逐行复制（EXIF 为单行 JSON，历史数据从旧明细表转换）；EXIF 来源标签直接复用 Tag 对象
+    session.add(
+        ImageDimensions(image_id=image.id, width=source.dimensions.width, height=source.dimensions.height)
+    )
+    if source.capture_time:
+        session.add(
+            ImageCaptureTime(
+                image_id=image.id,
+                taken_at=source.capture_time.taken_at,
+                taken_at_raw=source.capture_time.taken_at_raw,
+            )
+        )
+    if source.location:
+        session.add(
+            ImageLocation(
+                image_id=image.id,
+                latitude=source.location.latitude,
+                longitude=source.location.longitude,
+                altitude=source.location.altitude,
+                gps_raw=source.location.gps_raw,
+                geohash=source.location.geohash,
+            )
+        )
+    session.add(ImageExifData(image_id=image.id, data=list(load_exif_items(source))))
+    clone_exif_facets(session, source, image.id)
+    upsert_thumbnail(session, image, prebuilt=upsert_thumbnail(session, source))
+    return [tag for tag in source.tags if tag.source == "exif"]
+
+
+def _add_metadata(session, image, width: int, height: int, exif_dict: dict, thumbnail: dict, replace: bool = False):
+    taken_at, taken_at_raw = parse_capture_time(exif_dict)
+    latitude, longitude, altitude, gps_raw = parse_location(exif_dict)
+
+    if replace:
+        # 后台任务可能重试，先清掉本图片已有的元数据行，保证重复执行结果一致
+        for model in (ImageDimensions, ImageCaptureTime, ImageLocation):
+            session.query(model).filter(model.image_id == image.id).delete(synchronize_session=False)
+
+    session.add(ImageDimensions(image_id=image.id, width=width, height=height))
+    session.add(
+        ImageCaptureTime(image_id=image.id, taken_at=taken_at, taken_at_raw=taken_at_raw)
+    )
+    session.add(
+        ImageLocation(
+            image_id=image.id,
+            latitude=latitude,
+            longitude=longitude,
+            altitude=altitude,
+            gps_raw=str(gps_raw) if gps_raw else None,
+            geohash=geohash_for(latitude, longitude),
+        )
+    )
+
+    write_exif_data(session, image.id, exif_dict, replace=replace)
+    write_exif_facets(session, image.id, exif_dict, replace=replace)
+
+    upsert_thumbnail(session, image, prebuilt=thumbnail)
+    return find_or_create_tags(session, build_exif_tags(exif_dict), "exif")
+
+
+def _inspect_upload(temp_path: Path, sha256: Optional[str] = None):
+    # 任务：尺寸、EXIF、AI 分析衍生图与缩略图只解码一次，解码本身即完成图片有效性校验
+    # 方案：先读头部得到原始尺寸与 EXIF，再由衍生图（或缩略图）生成触发（JPEG 为缩放）解码；
+    #       生成衍生图时缩略图从缩小后的图继续缩放；损坏文件在解码时报错
+    try:
+        with Image.open(temp_path) as img:
+            width, height = img.size
+            exif_dict = extract_exif_dict(img)
+            source = img
+            if sha256 and generate_on_ingest():
+                source = save_analysis_image(img, sha256)
+            thumbnail = build_thumbnail_from_image(source)
+    except (UnidentifiedImageError, OSError, SyntaxError) as exc:
+        raise ApiError(415, ERROR_UNSUPPORTED, "invalid image") from exc
+    return width, height, exif_dict, thumbnail
 
-    file_storage.save(abs_path)
-    size_bytes = abs_path.stat().st_size
-    if size_bytes > _max_size_bytes():
-        abs_path.unlink(missing_ok=True)
-        raise ApiError(413, ERROR_TOO_LARGE, "file too large")
 
+def _read_header(temp_path: Path):
+    # 任务：后台处理模式下请求内只做廉价校验
+    # 方案：Image.open 只解析文件头，得到格式与尺寸；无法识别即拒绝，完整解码留给后台任务
     try:
-        with Image.open(abs_path) as img:
-            img.verify()
-    except (UnidentifiedImageError, OSError) as exc:
-        abs_path.unlink(missing_ok=True)
+        with Image.open(temp_path) as img:
+            return img.size
+    except (UnidentifiedImageError, OSError, SyntaxError) as exc:
         raise ApiError(415, ERROR_UNSUPPORTED, "invalid image") from exc
 
+
+def process_deferred_metadata(session, image) -> None:
+    # 任务：后台任务中完成上传时推迟的 EXIF 解析、元数据入库与缩略图生成
+    # 方案：与同步上传共用一次解码流程，按 replace 模式重写元数据行，EXIF 标签合并到已有标签
+    root_dir = resolve_path(get_config()["storage"]["root_dir"])
+    image_path = root_dir / image.storage_relpath
+    if not image_path.exists():
+        raise ApiError(404, ERROR_NOT_FOUND, "image file not found")
+    width, height, exif_dict, thumbnail = _inspect_upload(image_path, image.sha256)
+    exif_tags = _add_metadata(session, image, width, height, exif_dict, thumbnail, replace=True)
+    for tag in exif_tags:
+        if tag not in image.tags:
+            image.tags.append(tag)
+
+
+def save_upload(session, file_storage, uploader, tags_value: str, content_length: Optional[int]):
+    # 任务：流式、单遍完成上传落盘、摘要、大小限制与元数据解析，相同内容共享文件与元数据
+    # 方案：临时文件边写边哈希 -> 按 sha256 查重：命中则硬链接已有文件并复制元数据，
+    #       否则一次解码取尺寸/EXIF/缩略图并硬链接临时文件 -> 每次上传仍各自一条 images 记录；
+    #       开启 ingest.background 时请求内只读文件头，EXIF 与缩略图入队由后台 worker 完成
+    ext, original_filename = validate_upload(file_storage, content_length)
+    root_dir = resolve_path(get_config()["storage"]["root_dir"])
+    date_dir = root_dir / build_date_dir()
+
+    deferred = ingest_in_background()
+
+    temp_path, size_bytes, sha256 = _stream_to_temp(file_storage.stream, date_dir, _max_size_bytes())
+    try:
+        source, source_path = _find_duplicate(session, root_dir, sha256, size_bytes)
+        # 源图片的后台元数据任务可能尚未完成，此时只共享文件，元数据照常解析
+        clone = source is not None and source.dimensions is not None and source.thumbnail is not None
+        if not clone:
+            if deferred:
+                width, height = _read_header(temp_path)
+            else:
+                width, height, exif_dict, thumbnail = _inspect_upload(temp_path, sha256)
+
+        storage_relpath = None
+        if source_path is not None:
+            try:
+                storage_relpath, hash_value = _link_into_place(source_path, root_dir, ext)
+            except OSError:
+                # 跨文件系统或硬链接数达到上限时退回独立文件
+                storage_relpath = None
+        if storage_relpath is None:
+            storage_relpath, hash_value = _link_into_place(temp_path, root_dir, ext)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
     image = ImageModel(
         uploader_id=uploader.id,
         # 任务：记录上传时的原始文件名，缺失时置空以便后续展示/兼容
@@ -105,6 +318,7 @@ def save_upload(session, file_storage, uploader, tags_value: str, content_length
         hash=hash_value,
         storage_relpath=str(storage_relpath),
         size_bytes=size_bytes,
+        sha256=sha256,
         mime_type=file_storage.mimetype,
         created_at=datetime.utcnow(),
         updated_at=datetime.utcnow(),
@@ -113,41 +327,17 @@ def save_upload(session, file_storage, uploader, tags_value: str, content_length
     session.add(image)
     session.flush()
 
-    with Image.open(abs_path) as img:
-        width, height = img.size
-        exif_dict = extract_exif_dict(img)
-        taken_at, taken_at_raw = parse_capture_time(exif_dict)
-        latitude, longitude, altitude, gps_raw = parse_location(exif_dict)
-
-    session.add(ImageDimensions(image_id=image.id, width=width, height=height))
-    session.add(
-        ImageCaptureTime(image_id=image.id, taken_at=taken_at, taken_at_raw=taken_at_raw)
-    )
-    session.add(
-        ImageLocation(
-            image_id=image.id,
-            latitude=latitude,
-            longitude=longitude,
-            altitude=altitude,
-            gps_raw=str(gps_raw) if gps_raw else None,
-        )
-    )
-
-    for key, value in exif_dict.items():
-        session.add(
-            ImageExifEntry(
-                image_id=image.id,
-                exif_key=str(key),
-                exif_value=str(value) if value is not None else None,
-            )
-        )
-
-    exif_tags = find_or_create_tags(session, build_exif_tags(exif_dict), "exif")
+    if clone:
+        exif_tags = _clone_metadata(session, source, image)
+    elif deferred:
+        session.add(ImageDimensions(image_id=image.id, width=width, height=height))
+        enqueue_job(session, image.id, JOB_METADATA)
+        exif_tags = []
+    else:
+        exif_tags = _add_metadata(session, image, width, height, exif_dict, thumbnail)
     custom_tags = find_or_create_tags(session, parse_tag_string(tags_value), "custom")
     image.tags.extend(exif_tags + custom_tags)
 
-    upsert_thumbnail(session, image)
-
     return image
 
 
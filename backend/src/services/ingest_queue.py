@@ -0,0 +1,157 @@
+# 任务：上传后的耗时处理（EXIF/缩略图、AI 标签）改为持久化队列，由后台 worker 执行
+# 方案：任务存 ingest_jobs 表；入队随业务事务一起提交，提交后唤醒 worker；
+#       领取用“按 id + status 条件 UPDATE”抢占，失败按指数退避重新排期，超过次数标记 failed
+
+import threading
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.core.config_loader import get_config
+from src.core.db import session_scope
+from src.models.ingest_job import IngestJob
+
+JOB_METADATA = "metadata"
+JOB_AI_TAGS = "ai_tags"
+# 存量图片批量补 AI 标签，只由限速的 RetagRunner 执行，后台 worker 不领取
+JOB_AI_RETAG = "ai_retag"
+
+_ENQUEUED_KEY = "ingest_enqueued"
+
+# worker 空闲时等待该事件，入队事务提交后置位
+job_available = threading.Event()
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    image_id: int
+    kind: str
+    attempts: int
+
+
+def ingest_cfg() -> dict:
+    return get_config().get("ingest", {}) or {}
+
+
+def ingest_in_background() -> bool:
+    return bool(ingest_cfg().get("background", True))
+
+
+def enqueue_job(session, image_id: int, kind: str) -> None:
+    # 任务：同一图片同类任务重复入队时复用原行
+    # 方案：已有记录则重置为 pending 并清零尝试次数，否则新建
+    now = datetime.utcnow()
+    job = session.query(IngestJob).filter(IngestJob.image_id == image_id, IngestJob.kind == kind).first()
+    if job is None:
+        job = IngestJob(image_id=image_id, kind=kind, created_at=now)
+        session.add(job)
+    job.status = "pending"
+    job.attempts = 0
+    job.next_run_at = now
+    job.locked_at = None
+    job.last_error = None
+    job.updated_at = now
+    session.info[_ENQUEUED_KEY] = True
+
+
+def metadata_pending(session, image_id: int) -> bool:
+    # 上传时推迟的 EXIF/缩略图任务仍在排队或执行中
+    return (
+        session.query(IngestJob.id)
+        .filter(
+            IngestJob.image_id == image_id,
+            IngestJob.kind == JOB_METADATA,
+            IngestJob.status.in_(("pending", "running")),
+        )
+        .first()
+        is not None
+    )
+
+
+def _requeue_stale(session, now: datetime) -> None:
+    # 任务：进程崩溃时 running 状态的任务不会再被完成
+    # 方案：锁定超过 stale_seconds 的任务退回 pending
+    stale_before = now - timedelta(seconds=float(ingest_cfg().get("stale_seconds", 600)))
+    session.query(IngestJob).filter(
+        IngestJob.status == "running", IngestJob.locked_at < stale_before
+    ).update({IngestJob.status: "pending", IngestJob.locked_at: None}, synchronize_session=False)
+
+
+def claim_next_job(kinds: Optional[Sequence[str]] = None) -> Optional[ClaimedJob]:
+    # 任务：多线程/多进程领取任务时同一任务只被一个 worker 执行
+    # 方案：先选出最早到期的候选，再以 status='pending' 为条件更新，影响行数为 0 说明被抢走则重试；
+    #       kinds 非空时只领取这些类型的任务
+    while True:
+        now = datetime.utcnow()
+        with session_scope() as session:
+            query = session.query(IngestJob.id, IngestJob.image_id, IngestJob.kind, IngestJob.attempts).filter(
+                IngestJob.status == "pending", IngestJob.next_run_at <= now
+            )
+            if kinds:
+                query = query.filter(IngestJob.kind.in_(kinds))
+            row = query.order_by(IngestJob.next_run_at, IngestJob.id).first()
+            if row is None:
+                _requeue_stale(session, now)
+                return None
+            claimed = (
+                session.query(IngestJob)
+                .filter(IngestJob.id == row.id, IngestJob.status == "pending")
+                .update(
+                    {
+                        IngestJob.status: "running",
+                        IngestJob.attempts: IngestJob.attempts + 1,
+                        IngestJob.locked_at: now,
+                        IngestJob.updated_at: now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+        if claimed:
+            return ClaimedJob(row.id, row.image_id, row.kind, row.attempts + 1)
+
+
+def complete_job(job_id: int) -> None:
+    now = datetime.utcnow()
+    with session_scope() as session:
+        session.query(IngestJob).filter(IngestJob.id == job_id).update(
+            {
+                IngestJob.status: "done",
+                IngestJob.locked_at: None,
+                IngestJob.last_error: None,
+                IngestJob.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+
+
+def fail_job(job: ClaimedJob, error: str, retryable: bool = True) -> None:
+    # 任务：失败任务按指数退避重试，不可重试或超过次数时标记 failed
+    # 方案：退避时长 backoff_base_seconds * 2^(attempts-1)，上限 backoff_max_seconds
+    cfg = ingest_cfg()
+    now = datetime.utcnow()
+    max_attempts = int(cfg.get("max_attempts", 5))
+    values = {IngestJob.locked_at: None, IngestJob.last_error: error[:2000], IngestJob.updated_at: now}
+    if retryable and job.attempts < max_attempts:
+        delay = min(
+            float(cfg.get("backoff_base_seconds", 5)) * (2 ** (job.attempts - 1)),
+            float(cfg.get("backoff_max_seconds", 600)),
+        )
+        values[IngestJob.status] = "pending"
+        values[IngestJob.next_run_at] = now + timedelta(seconds=delay)
+    else:
+        values[IngestJob.status] = "failed"
+    with session_scope() as session:
+        session.query(IngestJob).filter(IngestJob.id == job.id).update(values, synchronize_session=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers(session):
+    if session.info.pop(_ENQUEUED_KEY, False):
+        job_available.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_wakeup(session):
+    session.info.pop(_ENQUEUED_KEY, None)
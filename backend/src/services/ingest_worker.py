@@ -0,0 +1,131 @@
+# 任务：在后台线程池中执行 ingest_jobs 队列里的任务，上传请求不再等待解码与 AI 调用
+# 方案：固定数量的守护线程循环领取任务，每个任务在独立会话中执行；
+#       ApiError 4xx 视为不可重试（如未配置 AI key、文件损坏），其余异常按退避重试
+
+import logging
+import threading
+from typing import Callable, Dict, List
+
+from src.core.db import session_scope
+from src.core.errors import ApiError
+from src.models.image import Image as ImageModel
+from src.services.ai_tag_service import generate_ai_tags
+from src.services.image_service import process_deferred_metadata
+from src.services.ingest_queue import (
+    JOB_AI_RETAG,
+    JOB_AI_TAGS,
+    JOB_METADATA,
+    ClaimedJob,
+    claim_next_job,
+    complete_job,
+    fail_job,
+    ingest_cfg,
+    job_available,
+)
+
+
+def _run_ai_tags(session, image) -> None:
+    tags = generate_ai_tags(session, image)
+    logging.info("ai tags generated: id=%s tags=%s", image.id, tags)
+
+
+_HANDLERS: Dict[str, Callable] = {
+    JOB_METADATA: process_deferred_metadata,
+    JOB_AI_TAGS: _run_ai_tags,
+    JOB_AI_RETAG: _run_ai_tags,
+}
+
+# 后台 worker 领取的任务类型；JOB_AI_RETAG 需要限速，由 ai_retag_service 的 RetagRunner 执行
+WORKER_KINDS = (JOB_METADATA, JOB_AI_TAGS)
+
+
+def run_job(job: ClaimedJob) -> None:
+    handler = _HANDLERS.get(job.kind)
+    if handler is None:
+        fail_job(job, f"unknown job kind: {job.kind}", retryable=False)
+        return
+    try:
+        with session_scope() as session:
+            image = session.get(ImageModel, job.image_id)
+            if image is not None:
+                handler(session, image)
+    except ApiError as exc:
+        logging.warning("ingest job failed: id=%s kind=%s error=%s", job.id, job.kind, exc.message)
+        fail_job(job, exc.message, retryable=exc.status_code >= 500)
+        return
+    except Exception as exc:
+        logging.exception("ingest job crashed: id=%s kind=%s", job.id, job.kind)
+        fail_job(job, str(exc) or exc.__class__.__name__)
+        return
+    complete_job(job.id)
+
+
+def run_pending_jobs(limit: int = None) -> int:
+    # 任务：供脚本/测试在当前线程内同步清空队列
+    # 方案：循环领取直到没有到期任务或达到 limit
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job(WORKER_KINDS)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+class IngestWorkerPool:
+    def __init__(self):
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self, workers: int, poll_seconds: float) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._loop, args=(poll_seconds,), name=f"ingest-worker-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        job_available.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self, poll_seconds: float) -> None:
+        while not self._stop.is_set():
+            try:
+                job = claim_next_job(WORKER_KINDS)
+            except Exception:
+                logging.exception("ingest worker failed to claim job")
+                job = None
+            if job is None:
+                job_available.wait(poll_seconds)
+                job_available.clear()
+                continue
+            run_job(job)
+
+
+worker_pool = IngestWorkerPool()
+
+
+def start_ingest_workers() -> None:
+    cfg = ingest_cfg()
+    if not cfg.get("background", True):
+        return
+    workers = int(cfg.get("workers", 2))
+    if workers <= 0:
+        return
+    worker_pool.start(workers, float(cfg.get("poll_seconds", 1)))
+
+
+def stop_ingest_workers() -> None:
+    worker_pool.stop()
@@ -0,0 +1,128 @@
+# 任务：Qwen 未开启、未配置 key、被限流或熔断时 /api/mcp/search 直接报错，检索完全不可用
+# 方案：本地选标签：查询及其同义词扩展分别与标签库做字符 n-gram 相似度（同义词打折，取最大值），
+#       相似度不低于 search.local_min_similarity 的标签按 相似度 × IDF 加权取前几个；
+#       图片再按命中标签的权重之和排序，全程只读本地数据、不联网
+
+import heapq
+import math
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.core.config_loader import get_config
+from src.services.tag_index_service import ensure_tag_index, tag_index
+from src.services.tag_pool import get_tag_pool
+from src.utils.ngram import ngrams, normalize_text
+
+# 同义词扩展出的查询相似度打折，字面命中的标签排在同义标签之前
+_SYNONYM_DISCOUNT = 0.9
+
+
+class _LocalGramIndex:
+    # 与 tag_prefilter 不同，两侧都带中日韩单字，单字查询（如“猫”）也能命中“猫咪”；
+    # 相似度取标签侧与查询侧覆盖率的均值，短查询匹配长标签、长查询匹配短标签都能得到较高分
+    def __init__(self, version: int, tag_pool: List[str]):
+        self.version = version
+        self.gram_counts: Dict[str, int] = {}
+        self.postings: Dict[str, List[str]] = {}
+        for name in tag_pool:
+            grams = ngrams(name, for_index=True)
+            self.gram_counts[name] = len(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(name)
+
+    def similarities(self, query: str) -> Dict[str, float]:
+        query_grams = ngrams(query, for_index=True)
+        if not query_grams:
+            return {}
+        overlaps: Dict[str, int] = {}
+        for gram in query_grams:
+            for name in self.postings.get(gram, ()):
+                overlaps[name] = overlaps.get(name, 0) + 1
+        return {
+            name: (overlap / self.gram_counts[name] + overlap / len(query_grams)) / 2
+            for name, overlap in overlaps.items()
+        }
+
+
+_index_lock = threading.Lock()
+_gram_index: Optional[_LocalGramIndex] = None
+_synonyms: Tuple[str, Dict[str, Set[str]]] = ("", {})
+
+
+def _local_cfg() -> Dict:
+    cfg = get_config().get("search", {}) or {}
+    return {
+        "min_similarity": float(cfg.get("local_min_similarity", 0.4)),
+        "max_tags": int(cfg.get("local_max_tags", 5)),
+        "synonyms": str(cfg.get("synonyms") or ""),
+    }
+
+
+def _synonym_table(raw: str) -> Dict[str, Set[str]]:
+    # 配置格式：逗号分隔多组，每组内用“|”分隔同义词，如 “海边|海滩|沙滩,猫|猫咪”；按原文缓存解析结果
+    global _synonyms
+    if _synonyms[0] == raw:
+        return _synonyms[1]
+    table: Dict[str, Set[str]] = {}
+    for group in raw.split(","):
+        terms = {normalize_text(term).strip() for term in group.split("|")}
+        terms.discard("")
+        if len(terms) < 2:
+            continue
+        for term in terms:
+            table.setdefault(term, set()).update(terms - {term})
+    _synonyms = (raw, table)
+    return table
+
+
+def expand_query(query: str, synonyms: str) -> List[Tuple[str, float]]:
+    # 返回 (查询文本, 相似度系数)：原查询系数 1；查询中出现的同义词组其余成员作为额外查询，按 _SYNONYM_DISCOUNT 打折
+    normalized = normalize_text(query)
+    variants = [(normalized, 1.0)]
+    seen = {normalized}
+    for term, others in _synonym_table(synonyms).items():
+        if term not in normalized:
+            continue
+        for other in sorted(others):
+            if other not in seen:
+                seen.add(other)
+                variants.append((other, _SYNONYM_DISCOUNT))
+    return variants
+
+
+def _get_gram_index(session) -> _LocalGramIndex:
+    global _gram_index
+    version, names = get_tag_pool(session)
+    with _index_lock:
+        if _gram_index is None or _gram_index.version != version:
+            _gram_index = _LocalGramIndex(version, names)
+        return _gram_index
+
+
+def local_search_tags(session, query: str) -> Tuple[str, Dict[str, float]]:
+    # 任务：不调用模型，为查询挑选标签及其权重
+    # 方案：权重 = 相似度 × log(1 + 带标签图片数 / 标签图片数)，常见标签（如“照片”）权重低；
+    #       没有图片的标签不参与；返回与 AI 输出同格式的说明文本（含 ###### answer 行）
+    cfg = _local_cfg()
+    gram_index = _get_gram_index(session)
+    best: Dict[str, float] = {}
+    for variant, factor in expand_query(query, cfg["synonyms"]):
+        for name, similarity in gram_index.similarities(variant).items():
+            score = similarity * factor
+            if score >= cfg["min_similarity"] and score > best.get(name, 0.0):
+                best[name] = score
+
+    ensure_tag_index(session)
+    frequencies = tag_index.frequencies(best)
+    total = tag_index.image_count()
+    weights = {
+        name: similarity * math.log1p(total / frequencies[name])
+        for name, similarity in best.items()
+        if frequencies.get(name)
+    }
+    top = heapq.nsmallest(cfg["max_tags"], weights, key=lambda name: (-weights[name], name))
+    selected = {name: weights[name] for name in top}
+
+    summary = "、".join(f"{name}（{best[name]:.2f}）" for name in top) or "无"
+    ai_output = f"本地检索（未调用模型），匹配标签：{summary}\n###### answer: {'。'.join(top)}"
+    return ai_output, selected
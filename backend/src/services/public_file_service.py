@@ -0,0 +1,93 @@
+# 任务：为公开外链 /images/{year}/{month}/{day}/{filename} 提供免查库的文件定位
+# 方案：storage_relpath -> (image_id, is_deleted, 绝对路径, 校验信息) 的 LRU+TTL 缓存，未命中时按唯一索引查库回填
+
+import calendar
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from src.core.config_loader import get_config
+from src.core.db import session_scope
+from src.models.image import Image as ImageModel
+from src.utils.path_utils import resolve_path
+from src.utils.ttl_cache import TTLCache
+
+
+class PublicFileEntry(NamedTuple):
+    image_id: int
+    is_deleted: bool
+    abs_path: Path
+    sha256: Optional[str]
+    updated_at: Optional[datetime]
+
+
+_cache: Optional[TTLCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> TTLCache:
+    # 任务：按 config.yaml 的 cache.public_file 配置懒加载缓存实例
+    # 方案：首次访问时创建，双重检查避免并发重复初始化
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache_cfg = (get_config().get("cache", {}) or {}).get("public_file", {}) or {}
+                _cache = TTLCache(
+                    max_entries=cache_cfg.get("max_entries", 10000),
+                    ttl_seconds=cache_cfg.get("ttl_seconds", 300),
+                )
+    return _cache
+
+
+def _load_entry(storage_relpath: str) -> Optional[PublicFileEntry]:
+    with session_scope() as session:
+        row = (
+            session.query(
+                ImageModel.id,
+                ImageModel.is_deleted,
+                ImageModel.sha256,
+                ImageModel.updated_at,
+            )
+            .filter(ImageModel.storage_relpath == storage_relpath)
+            .first()
+        )
+    if not row:
+        return None
+    root_dir = resolve_path(get_config()["storage"]["root_dir"])
+    return PublicFileEntry(
+        image_id=row[0],
+        is_deleted=bool(row[1]),
+        abs_path=root_dir / storage_relpath,
+        sha256=row[2],
+        updated_at=row[3],
+    )
+
+
+def lookup_public_file(storage_relpath: str) -> Optional[PublicFileEntry]:
+    # 任务：热点外链命中缓存时不触达数据库
+    # 方案：只缓存存在的记录，不存在的路径每次回源，避免新上传被负缓存挡住
+    cache = _get_cache()
+    entry = cache.get(storage_relpath)
+    if entry is not None:
+        return entry
+    entry = _load_entry(storage_relpath)
+    if entry is not None:
+        cache.set(storage_relpath, entry)
+    return entry
+
+
+def invalidate_public_file(storage_relpath: str) -> None:
+    # 任务：删除/恢复/编辑后立即让外链读到最新状态
+    # 方案：直接剔除对应缓存项，下次访问回源重建
+    _get_cache().pop(storage_relpath)
+
+
+def content_version(image) -> str:
+    # 任务：为公开外链生成内容版本号，编辑后版本变化即可放心长期缓存
+    # 方案：优先取 sha256 前 12 位；历史数据无 sha256 时用 updated_at 秒级时间戳兜底
+    if image.sha256:
+        return image.sha256[:12]
+    updated_at = image.updated_at or datetime(1970, 1, 1)
+    return f"t{calendar.timegm(updated_at.utctimetuple()):x}"
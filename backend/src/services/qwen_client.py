@@ -0,0 +1,219 @@
+# 任务：Qwen 调用每次新建连接、429/5xx 立即重试，服务故障时每个请求要占住工作线程 timeout × max_retries 秒
+# 方案：进程内共享一个 requests.Session（keep-alive 连接池）；全局信号量限制并发；
+#       429/5xx/网络错误按指数退避 + 全抖动重试，优先遵循 Retry-After，单次调用的等待总时长受重试预算约束；
+#       熔断器连续失败达到阈值后直接快速失败，冷却期后放行一个试探请求，成功即恢复；
+#       流式请求只在收到响应头之前重试，输出开始后中断直接报错
+
+import email.utils
+import math
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.core.config_loader import get_config
+from src.core.errors import ApiError, ERROR_UNSUPPORTED
+
+
+def _client_cfg() -> Dict:
+    cfg = get_config().get("qwen", {}) or {}
+    return {
+        "pool_maxsize": int(cfg.get("pool_maxsize", 10)),
+        "max_concurrency": int(cfg.get("max_concurrency", 4)),
+        "acquire_timeout": float(cfg.get("acquire_timeout", 10)),
+        "connect_timeout": float(cfg.get("connect_timeout", 5)),
+        "backoff_base_seconds": float(cfg.get("backoff_base_seconds", 0.5)),
+        "backoff_max_seconds": float(cfg.get("backoff_max_seconds", 8)),
+        "retry_budget_seconds": float(cfg.get("retry_budget_seconds", 30)),
+        "breaker_failures": int(cfg.get("breaker_failures", 5)),
+        "breaker_reset_seconds": float(cfg.get("breaker_reset_seconds", 30)),
+    }
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self._lock = threading.Lock()
+        self._threshold = max(1, failure_threshold)
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        # 关闭状态放行；打开状态在冷却期内拒绝，冷却期后只放行一个试探请求（半开）
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self._reset_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self) -> None:
+        # 试探请求以非服务故障的结果结束（如 401），不改变熔断状态，但允许下一个试探
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class QwenClient:
+    def __init__(self, cfg: Dict):
+        self._cfg = cfg
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cfg["pool_maxsize"])
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._semaphore = threading.BoundedSemaphore(max(1, cfg["max_concurrency"]))
+        self.breaker = CircuitBreaker(cfg["breaker_failures"], cfg["breaker_reset_seconds"])
+
+    def _backoff(self, attempt: int) -> float:
+        cap = self._cfg["backoff_max_seconds"]
+        return random.uniform(0, min(cap, self._cfg["backoff_base_seconds"] * (2 ** attempt)))
+
+    def _send(self, url: str, data: Dict, headers: Dict, timeout: float, stream: bool = False):
+        # 信号量只包住单次请求，退避等待期间不占用并发名额；
+        # 流式请求成功时保持占用直到响应体读完，由 stream_lines 释放
+        if not self._semaphore.acquire(timeout=self._cfg["acquire_timeout"]):
+            raise ApiError(503, ERROR_UNSUPPORTED, "Qwen 请求排队超时，请稍后重试")
+        try:
+            response = self._session.post(
+                url, json=data, headers=headers, timeout=(self._cfg["connect_timeout"], timeout), stream=stream
+            )
+        except BaseException:
+            self._semaphore.release()
+            raise
+        if not stream or response.status_code != 200:
+            self._semaphore.release()
+        return response
+
+    def _post(self, url: str, data: Dict, headers: Dict, timeout: float, max_retries: int, stream: bool = False):
+        # 任务：发送请求直到得到 200 响应，错误统一转换为 ApiError
+        # 方案：熔断打开时直接 503；401/403 与其他 4xx 不重试也不计入熔断；5xx/网络错误计入熔断；
+        #       Retry-After 按服务端要求完整等待，超出剩余重试预算（或已无重试次数）时直接 503 并带上该时长，
+        #       由调用方决定何时再试，不截短后提前重试
+        attempts = max(1, max_retries)
+        budget = self._cfg["retry_budget_seconds"]
+        waited = 0.0
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise ApiError(503, ERROR_UNSUPPORTED, "Qwen 服务暂时不可用，请稍后重试")
+            last = attempt == attempts - 1
+            try:
+                response = self._send(url, data, headers, timeout, stream)
+            except requests.RequestException as exc:
+                self.breaker.record_failure()
+                if last:
+                    raise ApiError(502, ERROR_UNSUPPORTED, f"Qwen API 请求失败: {exc}") from exc
+                delay = min(self._backoff(attempt), max(0.0, budget - waited))
+                time.sleep(delay)
+                waited += delay
+                continue
+            except ApiError:
+                self.breaker.release_probe()
+                raise
+
+            if response.status_code == 200:
+                self.breaker.record_success()
+                return response
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                # 429 说明服务在线只是限流，不计入熔断
+                self.breaker.release_probe()
+            if response.status_code in (401, 403):
+                response.close()
+                raise ApiError(502, ERROR_UNSUPPORTED, "Qwen API key 无效或无权限")
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = _retry_after_seconds(response)
+                if retry_after is not None and (last or retry_after > budget - waited):
+                    response.close()
+                    raise ApiError(
+                        503,
+                        ERROR_UNSUPPORTED,
+                        f"Qwen 服务繁忙，请 {math.ceil(retry_after)} 秒后重试",
+                        {"retry_after": retry_after},
+                    )
+                if not last:
+                    # 重试前归还连接，流式请求的响应体不会被读取
+                    response.close()
+                    delay = retry_after if retry_after is not None else min(
+                        self._backoff(attempt), max(0.0, budget - waited)
+                    )
+                    time.sleep(delay)
+                    waited += delay
+                    continue
+            message = response.text or "Qwen API 调用失败"
+            response.close()
+            raise ApiError(502, ERROR_UNSUPPORTED, message)
+        raise ApiError(502, ERROR_UNSUPPORTED, "Qwen API 多次调用失败")
+
+    def post_json(self, url: str, data: Dict, headers: Dict, timeout: float, max_retries: int) -> Dict:
+        response = self._post(url, data, headers, timeout, max_retries)
+        try:
+            return response.json()
+        except ValueError as exc:
+            raise ApiError(502, ERROR_UNSUPPORTED, "Qwen 响应解析失败") from exc
+
+    def stream_lines(self, url: str, data: Dict, headers: Dict, timeout: float, max_retries: int) -> Iterator[str]:
+        # 任务：逐行返回服务端推送的 SSE 响应，调用方提前关闭生成器时也要归还连接与并发名额
+        # 方案：请求在首次迭代时才发出；timeout 作用于相邻两块数据之间的等待
+        response = self._post(url, data, headers, timeout, max_retries, stream=True)
+        try:
+            # text/event-stream 通常不带 charset，requests 会按 ISO-8859-1 解码，中文需显式指定
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield line
+        except requests.RequestException as exc:
+            self.breaker.record_failure()
+            raise ApiError(502, ERROR_UNSUPPORTED, f"Qwen 流式响应中断: {exc}") from exc
+        finally:
+            response.close()
+            self._semaphore.release()
+
+
+_client: Optional[QwenClient] = None
+_client_lock = threading.Lock()
+
+
+def get_qwen_client() -> QwenClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = QwenClient(_client_cfg())
+        return _client
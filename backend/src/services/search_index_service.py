@@ -0,0 +1,232 @@
+# 任务：按文件名、标签（全部来源）与部分 EXIF 文本做关键词检索，容忍拼写错误，不调用大模型
+# 方案：SQLite FTS5 虚拟表 image_fts，rowid 即图片 id，各列存 ngram.ngrams 生成的 n-gram；
+#       会话提交前对本次改动涉及的图片重建索引行，与业务数据同一事务提交；
+#       查询把关键词切成同样的 n-gram 做 OR 匹配，bm25 排序后按 n-gram 重合比例过滤掉只碰巧命中的结果
+
+import logging
+from typing import Dict, Iterable, List, Set
+from weakref import WeakSet
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from src.core.config_loader import get_config
+from src.models.image import Image as ImageModel
+from src.models.image_exif import ImageExifData, ImageExifEntry
+from src.models.image_exif_facets import ImageExifFacets
+from src.models.tag import Tag, ImageTag
+from src.utils.ngram import ngrams
+
+_PENDING_KEY = "search_index_pending"
+_EXIF_MODELS = (ImageExifData, ImageExifEntry, ImageExifFacets)
+# 列权重依次对应 filename / tags / exif
+_COLUMN_WEIGHTS = (4.0, 2.0, 1.0)
+_BM25_ORDER = f"ORDER BY bm25(image_fts, {', '.join(str(weight) for weight in _COLUMN_WEIGHTS)})"
+
+# 已安装 image_fts 的引擎；单测里的临时内存库没有这张表，提交钩子据此跳过
+_ready_engines = WeakSet()
+
+
+def _search_cfg() -> dict:
+    return get_config().get("search", {}) or {}
+
+
+def ensure_search_index(engine) -> None:
+    # 任务：启动时创建 FTS5 表；新建时已有图片则全量建索引一次
+    if engine.dialect.name != "sqlite":
+        logging.warning("full-text search requires sqlite fts5, q= filter disabled")
+        return
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS image_fts USING fts5("
+                "filename, tags, exif, tokenize = \"unicode61 remove_diacritics 0 tokenchars '_'\")"
+            )
+        )
+        empty = conn.execute(text("SELECT 1 FROM image_fts LIMIT 1")).first() is None
+        has_images = conn.execute(text("SELECT 1 FROM images LIMIT 1")).first() is not None
+    _ready_engines.add(engine)
+    if empty and has_images:
+        with Session(bind=engine) as session:
+            count = rebuild_search_index(session)
+            session.commit()
+        logging.info("search index built: images=%s", count)
+
+
+def _gram_text(values: Iterable[str]) -> str:
+    grams = []
+    seen = set()
+    for value in values:
+        for gram in ngrams(value or "", for_index=True):
+            if gram not in seen:
+                seen.add(gram)
+                grams.append(gram)
+    return " ".join(grams)
+
+
+def reindex_images(session, image_ids: Iterable[int]) -> int:
+    # 任务：按当前数据库内容重写一批图片的索引行
+    # 方案：文件名、标签、EXIF 各一次批量查询，先删后插；已不存在的图片只删除
+    ids = sorted(set(image_ids))
+    if not ids:
+        return 0
+    exif_keys = {key.strip() for key in str(_search_cfg().get("exif_keys", "") or "").split(",") if key.strip()}
+    filenames = dict(
+        session.query(ImageModel.id, ImageModel.original_filename).filter(ImageModel.id.in_(ids)).all()
+    )
+    tags: Dict[int, List[str]] = {}
+    for image_id, name in (
+        session.query(ImageTag.image_id, Tag.name)
+        .join(Tag, Tag.id == ImageTag.tag_id)
+        .filter(ImageTag.image_id.in_(ids))
+        .all()
+    ):
+        tags.setdefault(image_id, []).append(name)
+    exif: Dict[int, List[str]] = {}
+    for image_id, camera, lens in (
+        session.query(ImageExifFacets.image_id, ImageExifFacets.camera, ImageExifFacets.lens)
+        .filter(ImageExifFacets.image_id.in_(ids))
+        .all()
+    ):
+        exif.setdefault(image_id, []).extend(value for value in (camera, lens) if value)
+    if exif_keys:
+        for image_id, data in (
+            session.query(ImageExifData.image_id, ImageExifData.data).filter(ImageExifData.image_id.in_(ids)).all()
+        ):
+            exif.setdefault(image_id, []).extend(value for key, value in data or [] if key in exif_keys and value)
+        for image_id, value in (
+            session.query(ImageExifEntry.image_id, ImageExifEntry.exif_value)
+            .filter(ImageExifEntry.image_id.in_(ids), ImageExifEntry.exif_key.in_(exif_keys))
+            .all()
+        ):
+            if value:
+                exif.setdefault(image_id, []).append(value)
+
+    placeholders = ", ".join(str(int(image_id)) for image_id in ids)
+    session.execute(text(f"DELETE FROM image_fts WHERE rowid IN ({placeholders})"))
+    rows = [
+        {
+            "rowid": image_id,
+            "filename": _gram_text([filename]),
+            "tags": _gram_text(tags.get(image_id, [])),
+            "exif": _gram_text(exif.get(image_id, [])),
+        }
+        for image_id, filename in filenames.items()
+    ]
+    if rows:
+        session.execute(
+            text("INSERT INTO image_fts (rowid, filename, tags, exif) VALUES (:rowid, :filename, :tags, :exif)"),
+            rows,
+        )
+    return len(rows)
+
+
+def rebuild_search_index(session, batch_size: int = 500) -> int:
+    session.execute(text("DELETE FROM image_fts"))
+    indexed = 0
+    last_id = 0
+    while True:
+        ids = [
+            row[0]
+            for row in session.query(ImageModel.id)
+            .filter(ImageModel.id > last_id)
+            .order_by(ImageModel.id)
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            return indexed
+        indexed += reindex_images(session, ids)
+        last_id = ids[-1]
+
+
+def _match_rows(session, expression: str, order_by: str, limit: int):
+    return session.execute(
+        text(f"SELECT rowid, filename, tags, exif FROM image_fts WHERE image_fts MATCH :expression {order_by} LIMIT :limit"),
+        {"expression": expression, "limit": limit},
+    ).all()
+
+
+def search_image_ids(session, q: str) -> List[int]:
+    # 任务：返回按相关度排序的图片 id（含已删除图片，由调用方的主查询过滤）
+    # 方案：两级检索。先要求全部 n-gram 命中（即包含关键词），按 rowid 倒序直接走倒排表，
+    #       再在候选内按命中列加权排序——常见词命中上万行时对每行算 bm25 要几十毫秒，这一级只要 1~2 毫秒；
+    #       完整命中超过 max_candidates 条时按 rowid 截断只会留下最新的一批，此时改由 FTS 内 bm25 取前
+    #       max_candidates 条再同样排序，只有常见词才付出 bm25 的开销；
+    #       没有完整命中（多为拼写错误）时才用 OR + bm25 取前 max_candidates 条，并要求至少 min_match 比例的 n-gram 重合
+    query_grams = ngrams(q)
+    if not query_grams:
+        return []
+    cfg = _search_cfg()
+    limit = int(cfg.get("max_candidates", 500))
+    quoted = [f'"{gram}"' for gram in query_grams]
+    wanted = set(query_grams)
+
+    expression = " AND ".join(quoted)
+    rows = _match_rows(session, expression, "ORDER BY rowid DESC", limit)
+    if rows:
+        if len(rows) >= limit:
+            rows = _match_rows(session, expression, _BM25_ORDER, limit)
+
+        def score(row) -> float:
+            return sum(
+                weight * len(wanted & set(column.split())) for weight, column in zip(_COLUMN_WEIGHTS, row[1:])
+            )
+
+        return [row[0] for row in sorted(rows, key=score, reverse=True)]
+
+    min_match = float(cfg.get("min_match", 0.4))
+    rows = _match_rows(session, " OR ".join(quoted), _BM25_ORDER, limit)
+    image_ids = []
+    for image_id, filename, tags, exif in rows:
+        present: Set[str] = set(f"{filename} {tags} {exif}".split())
+        if len(wanted & present) >= min_match * len(wanted):
+            image_ids.append(image_id)
+    return image_ids
+
+
+def _touched_image_id(obj):
+    if isinstance(obj, ImageModel):
+        return obj.id
+    if isinstance(obj, _EXIF_MODELS):
+        return obj.image_id
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_search_changes(session, flush_context):
+    # 任务：新图片、标签集合或文件名变化、EXIF 行增删改时记录需要重建索引的图片
+    pending = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        image_id = _touched_image_id(obj)
+        if image_id is None:
+            continue
+        if isinstance(obj, ImageModel) and obj in session.dirty:
+            state = inspect(obj)
+            changed = state.attrs.original_filename.history.has_changes()
+            if "tags" in state.dict and state.attrs.tags.history.has_changes():
+                changed = True
+            if not changed:
+                continue
+        if pending is None:
+            pending = session.info.setdefault(_PENDING_KEY, set())
+        pending.add(image_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _sync_search_index(session):
+    # 任务：索引行与业务数据同一事务提交，不存在“已提交但搜不到”的窗口
+    # 方案：先 flush 让本次所有改动进入 pending，再按数据库当前内容重写这些图片的索引行
+    if session.get_bind() not in _ready_engines:
+        session.info.pop(_PENDING_KEY, None)
+        return
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        reindex_images(session, pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_search_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -2,8 +2,14 @@
 # 方案：针对列表与详情提供独立的序列化函数
 import logging
 
+from sqlalchemy.orm import selectinload
+
 from src.core.config_loader import get_config
-from src.services.thumbnail_service import upsert_thumbnail
+from src.models.image import Image as ImageModel
+from src.models.thumbnail import ImageThumbnail
+from src.services.public_file_service import content_version
+from src.services.thumbnail_service import upsert_thumbnail, encode_thumbnail_base64
+from src.services.image_service import load_exif_items
 from src.utils.path_utils import resolve_path
 
 
@@ -16,33 +22,88 @@ def serialize_user(user):
     }
 
 
-def serialize_image_summary(session, image):
-    cfg = get_config()
-    image_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
-    if not image_path.exists():
-        logging.warning(
-            "skip image without file: id=%s path=%s", image.id, image_path
+def build_thumbnail_url(image) -> str:
+    # 任务：列表可返回缩略图地址而非内联数据，由浏览器按 ETag 缓存
+    # 方案：携带内容版本号，编辑后地址变化；鉴权沿用 /file 接口的 token 查询参数
+    return f"/api/images/{image.id}/thumbnail/file?v={content_version(image)}"
+
+
+def summary_query_options(thumbnail_mode: str = "inline") -> list:
+    # 任务：列表序列化需要 tags 与缩略图，逐行懒加载会产生 N+1 查询
+    # 方案：selectinload 批量预取 tags；内联模式再预取缩略图并延迟加载历史 base64 大字段，URL 模式完全不读缩略图
+    options = [selectinload(ImageModel.tags)]
+    if thumbnail_mode != "url":
+        options.append(
+            selectinload(ImageModel.thumbnail).defer(ImageThumbnail.data_base64)
         )
-        return None
+    return options
+
 
-    thumb_data = upsert_thumbnail(session, image)
+def serialize_image_summary(session, image, thumbnail_mode: str = "inline"):
+    # 任务：列表序列化不做逐行磁盘 I/O
+    # 方案：已有缩略图直接使用，仅在需要现场生成缩略图时才检查原图是否存在
+    if thumbnail_mode == "url":
+        thumbnail_fields = {
+            "size_bytes": image.size_bytes,
+            "thumbnail_url": build_thumbnail_url(image),
+        }
+    else:
+        if image.thumbnail is None:
+            cfg = get_config()
+            image_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
+            if not image_path.exists():
+                logging.warning(
+                    "skip image without file: id=%s path=%s", image.id, image_path
+                )
+                return None
+        thumb_data = upsert_thumbnail(session, image)
+        thumbnail_fields = {
+            "size_bytes": thumb_data.get("size_bytes") or image.size_bytes,
+            "thumbnail": {
+                "format": thumb_data["format"],
+                "data_base64": encode_thumbnail_base64(thumb_data["data"]),
+            },
+        }
     return {
         "id": image.id,
         "created_at": image.created_at.isoformat() + "Z",
         "original_filename": image.original_filename,
-        "size_bytes": thumb_data.get("size_bytes") or image.size_bytes,
-        "thumbnail": {
-            "format": thumb_data["format"],
-            "data_base64": thumb_data["data_base64"],
-        },
+        **thumbnail_fields,
         "tags": [tag.name for tag in image.tags],
         "is_deleted": image.is_deleted,
         # 任务：列表接口补充收藏状态，用于前端渲染收藏按钮与轮播列表
         # 方案：序列化 images.is_favorite，保持字段命名与数据库一致
         "is_favorite": image.is_favorite,
+        # 任务：暴露内容版本号，前端可据此判断图片是否被编辑过
+        # 方案：与公开外链 ?v= 参数取值一致
+        "version": content_version(image),
     }
 
 
+_PROCESSING_PRIORITY = ["failed", "running", "pending", "done"]
+
+
+def serialize_processing(image):
+    # 任务：详情返回后台处理进度，前端可据此提示 EXIF/缩略图/AI 标签尚未完成
+    # 方案：汇总该图片的 ingest_jobs，整体状态取最“靠前”的一个；没有任务视为 done
+    jobs = [
+        {
+            "kind": job.kind,
+            "status": job.status,
+            "attempts": job.attempts,
+            "last_error": job.last_error,
+            "next_run_at": job.next_run_at.isoformat() + "Z" if job.status == "pending" else None,
+        }
+        for job in sorted(image.ingest_jobs, key=lambda item: item.id)
+    ]
+    status = "done"
+    for candidate in _PROCESSING_PRIORITY:
+        if any(job["status"] == candidate for job in jobs):
+            status = candidate
+            break
+    return {"status": status, "jobs": jobs}
+
+
 def serialize_image_detail(image):
     dimensions = None
     if image.dimensions:
@@ -65,10 +126,7 @@ def serialize_image_detail(image):
             "longitude": float(image.location.longitude) if image.location.longitude is not None else None,
             "altitude": float(image.location.altitude) if image.location.altitude is not None else None,
         }
-    exif_entries = [
-        {"key": entry.exif_key, "value": entry.exif_value}
-        for entry in image.exif_entries
-    ]
+    exif_entries = [{"key": key, "value": value} for key, value in load_exif_items(image)]
 
     return {
         "id": image.id,
@@ -91,4 +149,6 @@ def serialize_image_detail(image):
         # 任务：详情接口补充收藏状态，便于详情页切换收藏/取消收藏
         # 方案：直接返回 is_favorite 布尔字段
         "is_favorite": image.is_favorite,
+        "version": content_version(image),
+        "processing": serialize_processing(image),
     }
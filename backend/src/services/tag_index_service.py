@@ -0,0 +1,236 @@
+# 任务：用进程内倒排索引替代 tag_mode=all/any 的 JOIN + GROUP BY/HAVING 过滤
+# 方案：启动时从 image_tags 构建 标签名 -> 图片 id 集合，提交后按会话内的标签变更增量同步，
+#       其他进程的写入经 image_tags 的变更标记发现后全量重建；查询时集合求交/并得到候选 id，再交给主查询按主键过滤
+
+import heapq
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, distinct, false, inspect, select, text
+from sqlalchemy.orm import Session
+
+from src.core.config_loader import get_config
+from src.models.image import Image as ImageModel
+from src.models.tag import Tag, ImageTag
+
+
+class TagIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Set[int]] = {}
+        self._image_tags: Dict[int, Set[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._marker: Optional[Tuple] = None
+        self._local_write = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def age_seconds(self) -> float:
+        if self._loaded_at is None:
+            return float("inf")
+        return time.monotonic() - self._loaded_at
+
+    def load(self, session) -> None:
+        # 任务：全量重建索引
+        # 方案：一次查询 image_tags JOIN tags，先在局部变量构建再整体替换，避免读到半成品；
+        #       变更标记先于数据读取，期间的并发写入至多导致下次多重建一次
+        marker = _change_marker(session)
+        postings: Dict[str, Set[int]] = {}
+        image_tags: Dict[int, Set[str]] = {}
+        rows = session.query(ImageTag.image_id, Tag.name).join(Tag, Tag.id == ImageTag.tag_id).all()
+        for image_id, name in rows:
+            postings.setdefault(name, set()).add(image_id)
+            image_tags.setdefault(image_id, set()).add(name)
+        with self._lock:
+            self._postings = postings
+            self._image_tags = image_tags
+            self._loaded_at = time.monotonic()
+            self._marker = marker
+            self._local_write = False
+
+    def note_local_write(self) -> None:
+        # 本进程的提交已增量同步，随之变化的标记在下次检查时直接采纳
+        with self._lock:
+            self._local_write = True
+
+    def is_current(self, marker: Tuple) -> bool:
+        # 任务：判断数据库中的标签关系是否仍是索引加载时（加本进程增量）的状态
+        # 方案：标记一致即为最新；本进程提交后首次检查采纳新标记，不为自己的写入重建
+        with self._lock:
+            if marker == self._marker:
+                return True
+            if self._local_write:
+                self._marker = marker
+                self._local_write = False
+                return True
+            return False
+
+    def set_image_tags(self, image_id: int, names: Iterable[str]) -> None:
+        new_names = set(names)
+        with self._lock:
+            old_names = self._image_tags.get(image_id, set())
+            for name in old_names - new_names:
+                ids = self._postings.get(name)
+                if ids is not None:
+                    ids.discard(image_id)
+                    if not ids:
+                        del self._postings[name]
+            for name in new_names - old_names:
+                self._postings.setdefault(name, set()).add(image_id)
+            if new_names:
+                self._image_tags[image_id] = new_names
+            else:
+                self._image_tags.pop(image_id, None)
+
+    def match(self, names: List[str], mode: str) -> Set[int]:
+        # 任务：all 取交集、any 取并集
+        # 方案：交集从最小的倒排表开始，尽早收缩候选集
+        with self._lock:
+            postings = [self._postings.get(name, set()) for name in set(names)]
+            if not postings:
+                return set()
+            if mode == "all":
+                postings.sort(key=len)
+                result = set(postings[0])
+                for ids in postings[1:]:
+                    result &= ids
+                    if not result:
+                        break
+                return result
+            result: Set[int] = set()
+            for ids in postings:
+                result |= ids
+            return result
+
+    def frequencies(self, names: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {name: len(self._postings.get(name, ())) for name in names}
+
+    def image_count(self) -> int:
+        # 至少有一个标签的图片数，作为 IDF 的文档总数
+        with self._lock:
+            return len(self._image_tags)
+
+    def most_common(self, limit: int) -> List[tuple]:
+        with self._lock:
+            top = heapq.nlargest(limit, self._postings.items(), key=lambda item: len(item[1]))
+            return [(name, len(ids)) for name, ids in top]
+
+    def cooccurrence(self, names: Iterable[str], max_images: int) -> Dict[str, int]:
+        # 任务：统计与给定标签出现在同一张图片上的其他标签次数
+        # 方案：遍历给定标签的图片（最多 max_images 张，避免热门标签拖慢），累加这些图片上的其余标签
+        seeds = set(names)
+        counts: Dict[str, int] = {}
+        seen: Set[int] = set()
+        with self._lock:
+            for name in seeds:
+                for image_id in self._postings.get(name, ()):
+                    if image_id in seen:
+                        continue
+                    if len(seen) >= max_images:
+                        break
+                    seen.add(image_id)
+                    for other in self._image_tags.get(image_id, ()):
+                        if other not in seeds:
+                            counts[other] = counts.get(other, 0) + 1
+        return counts
+
+
+tag_index = TagIndex()
+
+_PENDING_KEY = "tag_index_pending"
+
+
+def _index_cfg() -> dict:
+    return get_config().get("tag_index", {}) or {}
+
+
+def _change_marker(session) -> Tuple:
+    # 任务：廉价地发现其他进程（迁移脚本、另一 worker 等）对 image_tags 的写入
+    # 方案：max(rowid) 走主键 B 树末端，count(*) 扫最小的索引；插入必然改变前者，删除改变后者
+    return tuple(session.execute(text("SELECT max(rowid), count(*) FROM image_tags")).one())
+
+
+def ensure_tag_index(session) -> None:
+    # 任务：索引未加载（如脚本/测试进程）、其他进程改过标签或超过刷新周期时重建
+    # 方案：每次使用前比对变更标记；refresh_seconds 兜底标记察觉不到的变更（如标签改名）
+    refresh_seconds = float(_index_cfg().get("refresh_seconds", 600))
+    if not tag_index.loaded or tag_index.age_seconds() > refresh_seconds:
+        tag_index.load(session)
+    elif not tag_index.is_current(_change_marker(session)):
+        tag_index.load(session)
+
+
+def apply_sql_tag_filter(query, tag_list: List[str], tag_mode: str):
+    # 任务：保留原有 SQL 过滤路径，作为索引关闭或非 SQLite 方言下候选集过大时的回退与基准对照
+    # 方案：JOIN image_tags，all 模式 GROUP BY + HAVING 计数，any 模式 DISTINCT
+    query = query.join(ImageModel.tags).filter(Tag.name.in_(tag_list))
+    if tag_mode == "all":
+        return query.group_by(ImageModel.id).having(func.count(distinct(Tag.id)) == len(tag_list))
+    return query.distinct()
+
+
+def _filter_by_id_json(query, image_ids: Set[int]):
+    # 任务：候选 id 很多时仍走索引结果，又不生成超长 IN 列表、不触及 SQLite 绑定变量上限
+    # 方案：id 序列化为一个 JSON 数组参数，主查询以 id IN (SELECT value FROM json_each(?)) 过滤
+    id_rows = func.json_each(json.dumps(sorted(image_ids))).table_valued("value")
+    return query.filter(ImageModel.id.in_(select(id_rows.c.value)))
+
+
+def apply_tag_filter(session, query, tag_list: List[str], tag_mode: str):
+    # 任务：列表标签过滤优先走倒排索引
+    # 方案：候选 id 数不超过 tag_index.max_ids 时用主键 IN 过滤；超出时 SQLite 经 json_each 绑定整个 id 集合，
+    #       其他方言回退 SQL
+    if not tag_list:
+        return query
+    cfg = _index_cfg()
+    if not cfg.get("enabled", True):
+        return apply_sql_tag_filter(query, tag_list, tag_mode)
+    ensure_tag_index(session)
+    image_ids = tag_index.match(tag_list, tag_mode)
+    if not image_ids:
+        return query.filter(false())
+    if len(image_ids) <= int(cfg.get("max_ids", 10000)):
+        return query.filter(ImageModel.id.in_(image_ids))
+    if session.get_bind().dialect.name == "sqlite":
+        return _filter_by_id_json(query, image_ids)
+    return apply_sql_tag_filter(query, tag_list, tag_mode)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_tag_changes(session, flush_context):
+    # 任务：find_or_create_tags/update_tags/generate_ai_tags 等修改 image.tags 后同步索引
+    # 方案：flush 后仍可读到 flush 前的变更历史，记录标签集合有变化的图片的最新标签名快照
+    pending = None
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, ImageModel):
+            continue
+        state = inspect(obj)
+        if "tags" not in state.dict:
+            continue
+        if obj not in session.new and not state.attrs.tags.history.has_changes():
+            continue
+        if pending is None:
+            pending = session.info.setdefault(_PENDING_KEY, {})
+        pending[obj.id] = {tag.name for tag in obj.tags}
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_tag_changes(session):
+    # 任务：只有提交成功的变更才进入索引
+    # 方案：提交后应用快照；回滚时直接丢弃
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not tag_index.loaded:
+        return
+    for image_id, names in pending.items():
+        tag_index.set_image_tags(image_id, names)
+    tag_index.note_local_write()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tag_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,73 @@
+# 任务：AI 检索每次都全量读取标签名，且无法判断两次检索之间标签库是否变化
+# 方案：进程内保存标签库副本与版本号；本进程创建标签的事务提交后版本号加一并让副本失效，
+#       副本超过 refresh_seconds 时重新读取，内容与旧副本不同也会加版本号（兜底迁移脚本等其他进程的写入）
+
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.core.config_loader import get_config
+from src.services.tag_service import list_all_tag_names
+
+_DIRTY_KEY = "tag_pool_dirty"
+
+
+class TagPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._names: Optional[List[str]] = None
+        self._loaded_at = 0.0
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def bump(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._names = None
+
+    def get(self, session, refresh_seconds: float) -> Tuple[int, List[str]]:
+        with self._lock:
+            if self._names is not None and time.monotonic() - self._loaded_at <= refresh_seconds:
+                return self._version, self._names
+            version = self._version
+        names = list_all_tag_names(session)
+        with self._lock:
+            # 读取期间有新标签提交时版本已变化，本次结果可能缺少新标签，不写回副本
+            if self._version != version:
+                return version, names
+            if self._names is not None and self._names != names:
+                self._version += 1
+            self._names = names
+            self._loaded_at = time.monotonic()
+            return self._version, self._names
+
+
+tag_pool = TagPool()
+
+
+def get_tag_pool(session) -> Tuple[int, List[str]]:
+    cfg = (get_config().get("cache", {}) or {}).get("tag_pool", {}) or {}
+    return tag_pool.get(session, float(cfg.get("refresh_seconds", 300)))
+
+
+def mark_tag_pool_dirty(session) -> None:
+    # 由 tag_resolver 在插入新标签后调用，提交成功才生效
+    session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_tag_pool(session):
+    if session.info.pop(_DIRTY_KEY, None):
+        tag_pool.bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tag_pool_change(session):
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,112 @@
+# 任务：AI 检索 prompt 里放入整个标签库，prompt 长度与延迟随标签数线性增长，大图库会超出模型上下文
+# 方案：调用模型前先在本地挑选候选标签：字符 n-gram 相似度 + 与命中标签的共现次数 + 标签使用频次加权打分，
+#       取前 search.tag_pool_size 个交给模型；n-gram 倒排按标签库内容缓存，标签库不变时不重复构建
+
+import heapq
+import math
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.core.config_loader import get_config
+from src.services.tag_index_service import ensure_tag_index, tag_index
+from src.utils.ngram import ngrams
+
+# 打分权重：相似度为主，共现补充语义相关但字面不同的标签（如“海边”与“沙滩”），频次让热门标签兜底
+_WEIGHT_SIMILARITY = 1.0
+_WEIGHT_COOCCURRENCE = 0.5
+_WEIGHT_FREQUENCY = 0.2
+# 相似度不低于该值的标签作为共现统计的种子
+_SEED_SIMILARITY = 0.5
+
+
+class _GramIndex:
+    def __init__(self, tag_pool: List[str]):
+        self.key = tuple(tag_pool)
+        self.names: Set[str] = set(tag_pool)
+        self.gram_counts: Dict[str, int] = {}
+        self.postings: Dict[str, List[str]] = {}
+        for name in tag_pool:
+            grams = ngrams(name)
+            self.gram_counts[name] = len(grams)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(name)
+
+    def similarities(self, query: str) -> Dict[str, float]:
+        # 相似度 = 标签 n-gram 被查询包含的比例与 Dice 系数的均值，长查询里出现的短标签也能得到高分
+        query_grams = ngrams(query)
+        if not query_grams:
+            return {}
+        overlaps: Dict[str, int] = {}
+        for gram in query_grams:
+            for name in self.postings.get(gram, ()):
+                overlaps[name] = overlaps.get(name, 0) + 1
+        scores = {}
+        for name, overlap in overlaps.items():
+            tag_count = self.gram_counts[name]
+            containment = overlap / tag_count
+            dice = 2 * overlap / (tag_count + len(query_grams))
+            scores[name] = (containment + dice) / 2
+        return scores
+
+
+_index_lock = threading.Lock()
+_gram_index: Optional[_GramIndex] = None
+
+
+def _get_gram_index(tag_pool: List[str]) -> _GramIndex:
+    global _gram_index
+    key = tuple(tag_pool)
+    with _index_lock:
+        if _gram_index is None or _gram_index.key != key:
+            _gram_index = _GramIndex(tag_pool)
+        return _gram_index
+
+
+def _prefilter_cfg() -> Tuple[int, int]:
+    cfg = get_config().get("search", {}) or {}
+    return int(cfg.get("tag_pool_size", 200)), int(cfg.get("cooccurrence_images", 2000))
+
+
+def score_tags(session, tag_pool: List[str], query: str, pool_size: int) -> Dict[str, float]:
+    # 任务：为可能进入前 pool_size 的标签打分
+    # 方案：与查询无关的标签得分只有频次项，因此只需对“相似/共现标签 ∪ 频次前 pool_size 的标签”打分，
+    #       结果与全量打分后取前 pool_size 一致，避免每次遍历整个标签库
+    _, max_images = _prefilter_cfg()
+    gram_index = _get_gram_index(tag_pool)
+    similarities = gram_index.similarities(query)
+
+    ensure_tag_index(session)
+    seeds: Set[str] = {name for name, value in similarities.items() if value >= _SEED_SIMILARITY}
+    cooccurrence = tag_index.cooccurrence(seeds, max_images) if seeds else {}
+
+    popular = tag_index.most_common(pool_size)
+    candidates = (set(similarities) | set(cooccurrence) | {name for name, _ in popular}) & gram_index.names
+    frequencies = tag_index.frequencies(candidates)
+    max_frequency = popular[0][1] if popular else 0
+    max_cooccurrence = max(cooccurrence.values(), default=0)
+    scores = {}
+    for name in candidates:
+        score = _WEIGHT_SIMILARITY * similarities.get(name, 0.0)
+        if max_cooccurrence:
+            score += _WEIGHT_COOCCURRENCE * cooccurrence.get(name, 0) / max_cooccurrence
+        if max_frequency:
+            score += _WEIGHT_FREQUENCY * math.log1p(frequencies.get(name, 0)) / math.log1p(max_frequency)
+        scores[name] = score
+    return scores
+
+
+def select_candidate_tags(session, tag_pool: List[str], query: str, pool_size: int = None) -> List[str]:
+    # 任务：返回送入 prompt 的候选标签，数量不超过 pool_size（缺省 search.tag_pool_size）
+    # 方案：标签库本身不超过上限时原样返回；否则按得分取前 pool_size 个，同分按名称保证结果稳定，
+    #       有得分的标签不足时按标签库原顺序补齐
+    if pool_size is None:
+        pool_size, _ = _prefilter_cfg()
+    if len(tag_pool) <= pool_size:
+        return list(tag_pool)
+    scores = score_tags(session, tag_pool, query, pool_size)
+    ranked = heapq.nsmallest(pool_size, scores, key=lambda name: (-scores[name], name))
+    if len(ranked) < pool_size:
+        chosen = set(ranked)
+        ranked.extend(name for name in tag_pool if name not in chosen)
+        ranked = ranked[:pool_size]
+    return ranked
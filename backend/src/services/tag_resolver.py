@@ -0,0 +1,138 @@
+# 任务：批量把标签名解析为 Tag 对象，替代逐个 SELECT 的 find_or_create_tags
+# 方案：进程级 (name, source) -> id 缓存；未命中的名字一次 IN 查询，仍缺失的批量 INSERT ... ON CONFLICT DO NOTHING
+#       再回查一次，并发创建同名标签时由唯一约束 uq_tag_name_source 兜底；新 id 只在事务提交后写入缓存
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.config_loader import get_config
+from src.models.tag import Tag
+from src.services.tag_pool import mark_tag_pool_dirty
+from src.utils.ttl_cache import TTLCache
+
+_PENDING_KEY = "tag_ids_pending"
+
+_cache: Optional[TTLCache] = None
+
+
+def _get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        cfg = (get_config().get("cache", {}) or {}).get("tag_ids", {}) or {}
+        _cache = TTLCache(
+            max_entries=int(cfg.get("max_entries", 50000)),
+            ttl_seconds=float(cfg.get("ttl_seconds", 3600)),
+        )
+    return _cache
+
+
+def clear_tag_cache() -> None:
+    if _cache is not None:
+        _cache.clear()
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    seen = set()
+    result = []
+    for name in names:
+        if name and name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+
+def _load_by_ids(session, ids: List[int]) -> Dict[int, Tag]:
+    # 已在会话 identity map 中的对象不再查询，其余一次 IN 取回
+    loaded: Dict[int, Tag] = {}
+    missing = []
+    for tag_id in ids:
+        tag = session.identity_map.get(session.identity_key(Tag, tag_id))
+        if tag is not None:
+            loaded[tag_id] = tag
+        else:
+            missing.append(tag_id)
+    if missing:
+        for tag in session.query(Tag).filter(Tag.id.in_(missing)).all():
+            loaded[tag.id] = tag
+    return loaded
+
+
+def _load_by_names(session, names: List[str], source: str) -> Dict[str, Tag]:
+    if not names:
+        return {}
+    rows = session.query(Tag).filter(Tag.source == source, Tag.name.in_(names)).all()
+    return {tag.name: tag for tag in rows}
+
+
+def _insert_missing(session, names: List[str], source: str) -> None:
+    # 任务：批量创建缺失标签，另一请求同时创建同名标签时不报错
+    # 方案：SQLite 使用 ON CONFLICT DO NOTHING；其他方言逐条在 SAVEPOINT 中插入并忽略唯一约束冲突
+    rows = [{"name": name, "source": source} for name in names]
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(sqlite_insert(Tag).values(rows).on_conflict_do_nothing(index_elements=["name", "source"]))
+        return
+    for row in rows:
+        try:
+            with session.begin_nested():
+                session.execute(insert(Tag).values(**row))
+        except IntegrityError:
+            continue
+
+
+def resolve_tags(session, names: List[str], source: str) -> List[Tag]:
+    # 任务：标签数量再多也只产生常数次查询
+    # 方案：缓存命中 -> 按 id 取对象（identity map 命中则零查询）；
+    #       未命中 -> 按名字 IN 查询 -> 仍缺失则批量插入后再按名字回查
+    unique = _unique_names(names)
+    if not unique:
+        return []
+    cache = _get_cache()
+    resolved: Dict[str, Tag] = {}
+
+    cached_ids: Dict[str, int] = {}
+    for name in unique:
+        tag_id = cache.get((name, source))
+        if tag_id is not None:
+            cached_ids[name] = tag_id
+    if cached_ids:
+        by_id = _load_by_ids(session, list(cached_ids.values()))
+        for name, tag_id in cached_ids.items():
+            tag = by_id.get(tag_id)
+            if tag is not None and tag.name == name and tag.source == source:
+                resolved[name] = tag
+
+    missing = [name for name in unique if name not in resolved]
+    if missing:
+        found = _load_by_names(session, missing, source)
+        absent = [name for name in missing if name not in found]
+        if absent:
+            _insert_missing(session, absent, source)
+            mark_tag_pool_dirty(session)
+            found.update(_load_by_names(session, absent, source))
+        resolved.update(found)
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        for name, tag in found.items():
+            pending[(name, source)] = tag.id
+
+    return [resolved[name] for name in unique if name in resolved]
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_tag_ids(session):
+    # 任务：只有提交成功的 id 才能进入进程缓存，回滚后新建的标签不存在
+    # 方案：提交后把本事务解析到的 id 写入缓存；回滚时丢弃
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    cache = _get_cache()
+    for key, tag_id in pending.items():
+        cache.set(key, tag_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tag_ids(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,60 +1,147 @@
 # 任务：生成并维护缩略图记录，控制大小到 100KB 以内
-# 方案：缩放到最大边 100px 后按质量压缩，写入数据库
+# 方案：缩放到最大边 100px 后按质量压缩，以二进制写入数据库，需要时再编码 base64
+import base64
+from functools import lru_cache
+import hashlib
 import logging
 
+from PIL import Image
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
 from src.core.config_loader import get_config
 from src.core.errors import ApiError, ERROR_NOT_FOUND
 from src.models.thumbnail import ImageThumbnail
-from src.utils.image_ops import generate_thumbnail
+from src.services.ingest_queue import metadata_pending
+from src.utils.image_ops import generate_thumbnail, render_thumbnail
 from src.utils.path_utils import resolve_path
 
 
-def upsert_thumbnail(session, image):
-    cfg = get_config()
-    thumb_cfg = cfg.get("thumbnail", {})
-    max_edge = thumb_cfg.get("max_edge", 100)
-    max_bytes = thumb_cfg.get("max_bytes", 102400)
-    output_format = thumb_cfg.get("format", "jpeg")
-    quality = thumb_cfg.get("quality", 80)
-
-    image_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
-    if not image_path.exists():
-        logging.warning(
-            "image file missing, skip thumbnail generation: id=%s path=%s",
-            image.id,
-            image_path,
+def _thumbnail_bytes(thumb) -> bytes:
+    # 任务：兼容尚未迁移的 base64 历史记录
+    # 方案：读到旧格式时就地解码回写 data 并清空 data_base64，随请求提交完成懒迁移
+    if thumb.data is None and thumb.data_base64:
+        thumb.data = base64.b64decode(thumb.data_base64)
+        thumb.data_base64 = ""
+    return thumb.data or b""
+
+
+def encode_thumbnail_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode("utf-8")
+
+
+def thumbnail_etag(data: bytes) -> str:
+    # 任务：缩略图响应的强 ETag
+    # 方案：缩略图体积很小，直接取内容摘要前缀
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def thumbnail_mimetype(output_format: str) -> str:
+    fmt = (output_format or "jpeg").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    return f"image/{fmt}"
+
+
+def _thumbnail_settings():
+    thumb_cfg = get_config().get("thumbnail", {})
+    return (
+        thumb_cfg.get("max_edge", 100),
+        thumb_cfg.get("max_bytes", 102400),
+        thumb_cfg.get("format", "jpeg"),
+        thumb_cfg.get("quality", 80),
+    )
+
+
+def build_thumbnail_from_image(img) -> dict:
+    # 任务：上传时复用已打开的图片生成缩略图，避免再次读盘解码
+    # 方案：读取缩略图配置后交给 render_thumbnail
+    return render_thumbnail(img, *_thumbnail_settings())
+
+
+@lru_cache(maxsize=4)
+def _render_placeholder(max_edge: int, max_bytes: int, output_format: str, quality: int) -> dict:
+    img = Image.new("RGB", (max_edge, max_edge), (224, 224, 224))
+    return render_thumbnail(img, max_edge, max_bytes, output_format, quality)
+
+
+def placeholder_thumbnail() -> dict:
+    # 任务：后台元数据任务完成前，列表与缩略图接口需要一张可展示的图
+    # 方案：按缩略图配置渲染纯灰占位图，进程内缓存
+    return _render_placeholder(*_thumbnail_settings())
+
+
+def _insert_thumbnail(session, image, values: dict) -> None:
+    # 任务：请求线程现场补生成与后台任务写入可能同时落到同一 image_id，普通 INSERT 会主键冲突
+    # 方案：SQLite 用 INSERT ... ON CONFLICT(image_id) DO UPDATE，后写者覆盖；
+    #       其他方言在 SAVEPOINT 中插入，冲突时改为 UPDATE；先 flush 让会话内待删的旧缩略图先于本次写入生效，
+    #       写入后让关系属性重新读取
+    session.flush()
+    if session.get_bind().dialect.name == "sqlite":
+        stmt = sqlite_insert(ImageThumbnail).values(image_id=image.id, **values)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["image_id"], set_={key: stmt.excluded[key] for key in values}
+            )
         )
-        raise ApiError(404, ERROR_NOT_FOUND, "image file not found")
+    else:
+        try:
+            with session.begin_nested():
+                session.execute(insert(ImageThumbnail).values(image_id=image.id, **values))
+        except IntegrityError:
+            session.query(ImageThumbnail).filter(ImageThumbnail.image_id == image.id).update(
+                values, synchronize_session=False
+            )
+    session.expire(image, ["thumbnail"])
 
+
+def upsert_thumbnail(session, image, prebuilt: dict = None):
+    # 任务：已有缩略图时不再触碰磁盘，列表与缩略图接口零 stat
+    # 方案：先返回库内记录，只有需要生成时才读取配置并检查原图
     if image.thumbnail:
         return {
             "format": image.thumbnail.format,
             "width": image.thumbnail.width,
             "height": image.thumbnail.height,
             "size_bytes": image.thumbnail.size_bytes,
-            "data_base64": image.thumbnail.data_base64,
+            "data": _thumbnail_bytes(image.thumbnail),
         }
 
-    data = generate_thumbnail(image_path, max_edge, max_bytes, output_format, quality)
-    size_bytes = image_path.stat().st_size
-
-    if image.thumbnail:
-        image.thumbnail.format = data["format"]
-        image.thumbnail.width = data["width"]
-        image.thumbnail.height = data["height"]
-        image.thumbnail.size_bytes = size_bytes
-        image.thumbnail.data_base64 = data["data_base64"]
+    if prebuilt is not None:
+        # 上传流程已在同一次解码中生成缩略图，原图大小取自入库记录
+        data = prebuilt
+        size_bytes = image.size_bytes
+    elif metadata_pending(session, image.id):
+        # 任务：后台元数据任务尚未完成时不在请求线程解码原图，也不与 worker 争写同一行
+        # 方案：返回占位图且不落库，pending 标记供调用方跳过长期缓存
+        return {**placeholder_thumbnail(), "size_bytes": image.size_bytes, "pending": True}
     else:
-        thumb = ImageThumbnail(
-            image_id=image.id,
-            format=data["format"],
-            width=data["width"],
-            height=data["height"],
-            size_bytes=size_bytes,
-            data_base64=data["data_base64"],
-        )
-        session.add(thumb)
+        cfg = get_config()
+        image_path = resolve_path(cfg["storage"]["root_dir"]) / image.storage_relpath
+        if not image_path.exists():
+            logging.warning(
+                "image file missing, skip thumbnail generation: id=%s path=%s",
+                image.id,
+                image_path,
+            )
+            raise ApiError(404, ERROR_NOT_FOUND, "image file not found")
+
+        data = generate_thumbnail(image_path, *_thumbnail_settings())
+        size_bytes = image_path.stat().st_size
 
+    _insert_thumbnail(
+        session,
+        image,
+        {
+            "format": data["format"],
+            "width": data["width"],
+            "height": data["height"],
+            "size_bytes": size_bytes,
+            "data": data["data"],
+            "data_base64": "",
+        },
+    )
     return {**data, "size_bytes": size_bytes}
 
 
@@ -0,0 +1,137 @@
+# 任务：时间轴按天/月/年返回未删除图片的数量，支持上传时间与拍摄时间两种口径
+# 方案：timeline_counts 保存每日计数，SQLite 触发器挂在 images（插入、软删除/恢复、改上传时间）与
+#       image_capture_time 上增量维护；查询只读日计数表再按月/年合并，行数与天数成正比而非图片数
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func, text
+
+from src.core.errors import ApiError, ERROR_VALIDATION
+from src.models.timeline_count import TimelineCount
+
+KIND_CREATED = "created"
+KIND_TAKEN = "taken"
+
+_TRIGGER_PREFIX = "trg_timeline_"
+_PERIOD_LENGTH = {"day": 10, "month": 7, "year": 4}
+_TAKEN_OF_IMAGE = "(SELECT taken_at FROM image_capture_time WHERE image_id = {}.id)"
+
+
+def _bump_sql(kind: str, moment: str, delta: int, condition: str = "1") -> str:
+    # 日期取 ISO 字符串前 10 位；计数减到 0 的行直接删除，表里只保留有图片的日期
+    day = f"substr({moment}, 1, 10)"
+    return (
+        "INSERT INTO timeline_counts (kind, day, count) "
+        f"SELECT '{kind}', {day}, {delta} WHERE {moment} IS NOT NULL AND {condition} "
+        "ON CONFLICT (kind, day) DO UPDATE SET count = count + excluded.count;"
+        f"DELETE FROM timeline_counts WHERE kind = '{kind}' AND day = {day} AND count <= 0;"
+    )
+
+
+def _trigger_ddl() -> dict:
+    alive = "(SELECT is_deleted FROM images WHERE id = {}.image_id) = 0"
+    deleted = "NEW.is_deleted = 1 AND OLD.is_deleted = 0"
+    restored = "NEW.is_deleted = 0 AND OLD.is_deleted = 1"
+    return {
+        "image_insert": (
+            "AFTER INSERT ON images WHEN NEW.is_deleted = 0 "
+            f"BEGIN {_bump_sql(KIND_CREATED, 'NEW.created_at', 1)} END"
+        ),
+        "image_delete": (
+            "AFTER DELETE ON images WHEN OLD.is_deleted = 0 "
+            f"BEGIN {_bump_sql(KIND_CREATED, 'OLD.created_at', -1)} "
+            f"{_bump_sql(KIND_TAKEN, _TAKEN_OF_IMAGE.format('OLD'), -1)} END"
+        ),
+        "image_update": (
+            "AFTER UPDATE OF is_deleted, created_at ON images "
+            "BEGIN "
+            f"{_bump_sql(KIND_CREATED, 'OLD.created_at', -1, 'OLD.is_deleted = 0')} "
+            f"{_bump_sql(KIND_CREATED, 'NEW.created_at', 1, 'NEW.is_deleted = 0')} "
+            f"{_bump_sql(KIND_TAKEN, _TAKEN_OF_IMAGE.format('NEW'), -1, deleted)} "
+            f"{_bump_sql(KIND_TAKEN, _TAKEN_OF_IMAGE.format('NEW'), 1, restored)} "
+            "END"
+        ),
+        "capture_insert": (
+            f"AFTER INSERT ON image_capture_time WHEN {alive.format('NEW')} "
+            f"BEGIN {_bump_sql(KIND_TAKEN, 'NEW.taken_at', 1)} END"
+        ),
+        "capture_delete": (
+            f"AFTER DELETE ON image_capture_time WHEN {alive.format('OLD')} "
+            f"BEGIN {_bump_sql(KIND_TAKEN, 'OLD.taken_at', -1)} END"
+        ),
+        "capture_update": (
+            f"AFTER UPDATE OF taken_at ON image_capture_time WHEN {alive.format('NEW')} "
+            f"BEGIN {_bump_sql(KIND_TAKEN, 'OLD.taken_at', -1)} {_bump_sql(KIND_TAKEN, 'NEW.taken_at', 1)} END"
+        ),
+    }
+
+
+def rebuild_timeline(conn) -> int:
+    # 任务：首次启用或数据被脚本绕过触发器修改后，从 images / image_capture_time 重新汇总
+    # 方案：清空后两条 INSERT ... SELECT GROUP BY，与触发器使用同样的日期截取规则
+    conn.execute(text("DELETE FROM timeline_counts"))
+    conn.execute(
+        text(
+            "INSERT INTO timeline_counts (kind, day, count) "
+            f"SELECT '{KIND_CREATED}', substr(created_at, 1, 10), count(*) FROM images "
+            "WHERE is_deleted = 0 AND created_at IS NOT NULL GROUP BY substr(created_at, 1, 10)"
+        )
+    )
+    conn.execute(
+        text(
+            "INSERT INTO timeline_counts (kind, day, count) "
+            f"SELECT '{KIND_TAKEN}', substr(c.taken_at, 1, 10), count(*) "
+            "FROM image_capture_time c JOIN images i ON i.id = c.image_id "
+            "WHERE i.is_deleted = 0 AND c.taken_at IS NOT NULL GROUP BY substr(c.taken_at, 1, 10)"
+        )
+    )
+    return conn.execute(text("SELECT count(*) FROM timeline_counts")).scalar_one()
+
+
+def ensure_timeline_triggers(engine) -> None:
+    # 任务：启动时安装触发器；计数表为空而已有图片（新建表的旧库）时全量汇总一次
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for name, ddl in _trigger_ddl().items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_TRIGGER_PREFIX}{name}"))
+            conn.execute(text(f"CREATE TRIGGER {_TRIGGER_PREFIX}{name} {ddl}"))
+        empty = conn.execute(text("SELECT 1 FROM timeline_counts LIMIT 1")).first() is None
+        if empty and conn.execute(text("SELECT 1 FROM images WHERE is_deleted = 0 LIMIT 1")).first():
+            rebuild_timeline(conn)
+
+
+def _parse_day(value: Optional[str], name: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10]).isoformat()
+    except ValueError as exc:
+        raise ApiError(400, ERROR_VALIDATION, f"invalid {name}") from exc
+
+
+def timeline_buckets(
+    session, field: str = KIND_CREATED, granularity: str = "month", date_from: str = None, date_to: str = None
+) -> dict:
+    if field not in (KIND_CREATED, KIND_TAKEN):
+        raise ApiError(400, ERROR_VALIDATION, "field must be created or taken")
+    if granularity not in _PERIOD_LENGTH:
+        raise ApiError(400, ERROR_VALIDATION, "granularity must be day, month or year")
+
+    period = func.substr(TimelineCount.day, 1, _PERIOD_LENGTH[granularity])
+    query = session.query(period, func.sum(TimelineCount.count)).filter(TimelineCount.kind == field)
+    day_from = _parse_day(date_from, "from")
+    day_to = _parse_day(date_to, "to")
+    if day_from:
+        query = query.filter(TimelineCount.day >= day_from)
+    if day_to:
+        query = query.filter(TimelineCount.day <= day_to)
+
+    buckets = [{"period": value, "count": int(count)} for value, count in query.group_by(period).order_by(period)]
+    return {
+        "field": field,
+        "granularity": granularity,
+        "buckets": buckets,
+        "total": sum(bucket["count"] for bucket in buckets),
+    }
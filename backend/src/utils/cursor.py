@@ -0,0 +1,23 @@
+# 任务：为图片列表提供不透明的 keyset 分页游标
+# 方案：把排序键 (created_at, id) 编码为 base64url 字符串，解码失败统一按参数错误处理
+
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from src.core.errors import ApiError, ERROR_VALIDATION
+
+
+def encode_cursor(created_at: datetime, image_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{image_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_raw, id_raw = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_raw), int(id_raw)
+    except (ValueError, UnicodeError) as exc:
+        raise ApiError(400, ERROR_VALIDATION, "invalid cursor") from exc
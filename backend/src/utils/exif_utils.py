@@ -2,6 +2,8 @@
 # 方案：使用 Pillow ExifTags 映射，GPS 转换为十进制度
 
 from datetime import datetime
+import math
+
 from PIL import ExifTags
 
 
@@ -9,6 +11,10 @@ _TAGS = ExifTags.TAGS
 _GPS_TAGS = ExifTags.GPSTAGS
 
 
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+
+
 def extract_exif_dict(image) -> dict:
     exif_raw = image.getexif()
     if not exif_raw:
@@ -17,9 +23,94 @@ def extract_exif_dict(image) -> dict:
     for key, value in exif_raw.items():
         tag_name = _TAGS.get(key, str(key))
         data[tag_name] = value
+    # 任务：ISO、镜头、焦距、DateTimeOriginal 等位于 Exif 子 IFD，getexif() 顶层只给出偏移量
+    # 方案：读取子 IFD 合并进结果，顶层同名字段优先
+    try:
+        exif_ifd = exif_raw.get_ifd(_EXIF_IFD)
+    except (KeyError, OSError, ValueError):
+        exif_ifd = {}
+    for key, value in exif_ifd.items():
+        data.setdefault(_TAGS.get(key, str(key)), value)
+    # 任务：顶层 GPSInfo 同样只是偏移量（int），parse_location 对其调用 .items() 会直接抛错
+    # 方案：读取 GPS 子 IFD，以 dict 形式覆盖 GPSInfo
+    try:
+        gps_ifd = exif_raw.get_ifd(_GPS_IFD)
+    except (KeyError, OSError, ValueError):
+        gps_ifd = {}
+    if gps_ifd:
+        data["GPSInfo"] = dict(gps_ifd)
+    else:
+        data.pop("GPSInfo", None)
     return data
 
 
+def _clean_text(value, max_length: int = 128):
+    if value is None or isinstance(value, (bytes, bytearray)):
+        return None
+    text = str(value).replace("\x00", "").strip()
+    return text[:max_length] or None
+
+
+def _to_float(value):
+    if isinstance(value, (tuple, list)):
+        if len(value) == 2 and not isinstance(value[0], (tuple, list)):
+            try:
+                return float(value[0]) / float(value[1])
+            except (TypeError, ValueError, ZeroDivisionError):
+                return None
+        value = value[0] if value else None
+    try:
+        result = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    if math.isnan(result) or math.isinf(result):
+        return None
+    return result
+
+
+def parse_facets(exif_dict: dict) -> dict:
+    # 任务：从 EXIF 中提取可按类型检索的字段：相机、镜头、焦距、光圈、快门、ISO
+    # 方案：相机名在型号不含厂商时拼接厂商；数值统一转 float/int，无法解析置空
+    make = _clean_text(exif_dict.get("Make"))
+    model = _clean_text(exif_dict.get("Model"))
+    camera = model
+    if make and model and not model.lower().startswith(make.lower()):
+        camera = f"{make} {model}"[:128]
+    elif make and not model:
+        camera = make
+    iso = _to_float(exif_dict.get("ISOSpeedRatings"))
+    return {
+        "camera": camera,
+        "camera_make": make,
+        "camera_model": model,
+        "lens": _clean_text(exif_dict.get("LensModel")),
+        "focal_length": _to_float(exif_dict.get("FocalLength")),
+        "f_number": _to_float(exif_dict.get("FNumber")),
+        "exposure_time": _to_float(exif_dict.get("ExposureTime")),
+        "iso": int(iso) if iso is not None else None,
+    }
+
+
+def compact_exif_items(items, max_value_chars: int = 256) -> list:
+    # 任务：EXIF 入库前去掉无法展示的二进制值（MakerNote 等），并限制单值长度
+    # 方案：跳过 bytes 以及历史数据中 str(bytes) 形式的值，去掉 NUL 后超长部分截断；保持原有键顺序
+    compacted = []
+    for key, value in items:
+        if isinstance(value, (bytes, bytearray)):
+            continue
+        if value is None:
+            compacted.append([str(key), None])
+            continue
+        text = str(value)
+        if text.startswith(("b'", 'b"')):
+            continue
+        text = text.replace("\x00", "")
+        if len(text) > max_value_chars:
+            text = text[:max_value_chars] + "…"
+        compacted.append([str(key), text])
+    return compacted
+
+
 def _rational_to_float(rational):
     try:
         return rational.numerator / rational.denominator
@@ -50,7 +141,7 @@ def parse_capture_time(exif_dict: dict):
 
 def parse_location(exif_dict: dict):
     gps_info = exif_dict.get("GPSInfo")
-    if not gps_info:
+    if not gps_info or not isinstance(gps_info, dict):
         return None, None, None, None
     gps_data = {}
     for key, value in gps_info.items():
@@ -58,12 +149,22 @@ def parse_location(exif_dict: dict):
     latitude = None
     longitude = None
     altitude = None
-    if "GPSLatitude" in gps_data and "GPSLatitudeRef" in gps_data:
-        latitude = _gps_to_decimal(gps_data["GPSLatitude"], gps_data["GPSLatitudeRef"])
-    if "GPSLongitude" in gps_data and "GPSLongitudeRef" in gps_data:
-        longitude = _gps_to_decimal(gps_data["GPSLongitude"], gps_data["GPSLongitudeRef"])
-    if "GPSAltitude" in gps_data:
-        altitude = _rational_to_float(gps_data["GPSAltitude"])
+    # 任务：损坏的 GPS 字段（分母为 0、分量缺失）不能让整次上传失败
+    # 方案：逐项转换失败即置空，超出合法范围的坐标整体丢弃
+    try:
+        if "GPSLatitude" in gps_data and "GPSLatitudeRef" in gps_data:
+            latitude = _gps_to_decimal(gps_data["GPSLatitude"], gps_data["GPSLatitudeRef"])
+        if "GPSLongitude" in gps_data and "GPSLongitudeRef" in gps_data:
+            longitude = _gps_to_decimal(gps_data["GPSLongitude"], gps_data["GPSLongitudeRef"])
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        latitude, longitude = None, None
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        latitude, longitude = None, None
+    try:
+        if "GPSAltitude" in gps_data:
+            altitude = _rational_to_float(gps_data["GPSAltitude"])
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        altitude = None
     return latitude, longitude, altitude, gps_data
 
 
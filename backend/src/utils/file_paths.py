@@ -2,9 +2,11 @@
 # 方案：按日期分目录 + 8 位随机哈希文件名
 
 from datetime import datetime
+import hashlib
 from pathlib import Path
 import secrets
 import string
+from typing import Optional
 
 
 ALPHABET = string.ascii_letters + string.digits
@@ -14,9 +16,14 @@ def random_hash(length: int = 8) -> str:
     return "".join(secrets.choice(ALPHABET) for _ in range(length))
 
 
+def build_date_dir(now: Optional[datetime] = None) -> str:
+    # 按 UTC 日期分目录：YYYY/MM/DD
+    now = now or datetime.utcnow()
+    return f"{now.year:04d}/{now.month:02d}/{now.day:02d}"
+
+
 def build_storage_relpath(ext: str) -> tuple[str, str]:
-    now = datetime.utcnow()
-    date_path = f"{now.year:04d}/{now.month:02d}/{now.day:02d}"
+    date_path = build_date_dir()
     hash_value = random_hash(8)
     filename = f"{hash_value}.{ext}"
     return f"{date_path}/{filename}", hash_value
@@ -25,10 +32,20 @@ def build_storage_relpath(ext: str) -> tuple[str, str]:
 def build_backup_relpath(hash_value: str, ext: str) -> str:
     now = datetime.utcnow()
     timestamp = now.strftime("%Y%m%d%H%M%S")
-    date_path = f"{now.year:04d}/{now.month:02d}/{now.day:02d}"
+    date_path = build_date_dir(now)
     filename = f"{hash_value}_{timestamp}.{ext}"
     return f"{date_path}/{filename}"
 
 
 def ensure_parent(path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
+
+
+def file_sha256(path: Path) -> str:
+    # 任务：计算文件内容摘要，作为强 ETag 与内容版本依据
+    # 方案：分块读取避免大文件一次性载入内存
+    sha = hashlib.sha256()
+    with Path(path).open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
@@ -0,0 +1,51 @@
+# 任务：为图片文件响应补齐 HTTP 缓存校验与断点续传
+# 方案：基于 Flask send_file 的 conditional 能力输出强 ETag/Last-Modified，统一处理 304 与 Range/206
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from flask import send_file
+
+
+def build_file_etag(file_path: Path, sha256: Optional[str]) -> str:
+    # 任务：生成强 ETag，内容不变时跨进程、跨重启保持一致
+    # 方案：优先使用内容 sha256，缺失时退化为 文件大小+mtime 纳秒
+    if sha256:
+        return sha256
+    stat = Path(file_path).stat()
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def send_cached_file(
+    file_path,
+    etag: str,
+    last_modified: Optional[datetime],
+    max_age: int = 0,
+    public: bool = False,
+    immutable: bool = False,
+    mimetype: Optional[str] = None,
+):
+    # 任务：让重复请求只需一次头部校验，大图支持 Range 续传
+    # 方案：send_file(conditional=True) 负责 If-None-Match/If-Modified-Since/Range，
+    #       再按公开/私有场景覆盖 Cache-Control
+    response = send_file(
+        file_path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=etag,
+        last_modified=last_modified,
+        max_age=max_age if public or immutable else None,
+    )
+    if immutable and max_age > 0:
+        # 任务：带内容版本号的地址内容永不变化，允许浏览器/CDN 跳过再验证
+        # 方案：追加 immutable 指令
+        response.cache_control.immutable = True
+    if not public:
+        # 任务：鉴权文件不允许共享缓存存储，但浏览器仍可凭 ETag 复用
+        # 方案：private；未带版本号时再加 no-cache，强制每次携带校验头回源
+        response.cache_control.public = False
+        response.cache_control.private = True
+        if not (immutable and max_age > 0):
+            response.cache_control.no_cache = True
+    return response
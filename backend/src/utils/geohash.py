@@ -0,0 +1,107 @@
+# 任务：为经纬度提供可用 B-Tree 索引做范围检索的编码
+# 方案：标准 geohash（base32，经度/纬度位交错），矩形区域用若干同精度网格前缀覆盖，每个前缀对应一段索引范围
+
+import math
+from typing import List, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(latitude: float, longitude: float, precision: int = 9) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    # 返回网格范围 (min_lat, min_lon, max_lat, max_lon)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            target[1 - bit] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    # 返回 (纬度跨度, 经度跨度)，单位度
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def cover_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = 32) -> List[str]:
+    # 任务：把矩形（不跨日期变更线）转换成少量 geohash 前缀
+    # 方案：从细到粗找到网格数不超过 max_cells 的最高精度，枚举覆盖到的网格中心点编码
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    for precision in range(9, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        lat_start = math.floor((min_lat + 90.0) / lat_step)
+        lat_end = min(math.floor((max_lat + 90.0) / lat_step), int(round(180.0 / lat_step)) - 1)
+        lon_start = math.floor((min_lon + 180.0) / lon_step)
+        lon_end = min(math.floor((max_lon + 180.0) / lon_step), int(round(360.0 / lon_step)) - 1)
+        count = (lat_end - lat_start + 1) * (lon_end - lon_start + 1)
+        if count > max_cells and precision > 1:
+            continue
+        prefixes = set()
+        for lat_index in range(lat_start, lat_end + 1):
+            for lon_index in range(lon_start, lon_end + 1):
+                center_lat = -90.0 + (lat_index + 0.5) * lat_step
+                center_lon = -180.0 + (lon_index + 0.5) * lon_step
+                prefixes.add(encode(center_lat, center_lon, precision))
+        return sorted(prefixes)
+    return []
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    # 返回 (min_lat, min_lon, max_lat, max_lon)；靠近极点时经度放开到全范围
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6 or abs(latitude) + lat_delta >= 90.0:
+        return max(latitude - lat_delta, -90.0), -180.0, min(latitude + lat_delta, 90.0), 180.0
+    lon_delta = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    return latitude - lat_delta, longitude - lon_delta, latitude + lat_delta, longitude + lon_delta
@@ -2,29 +2,51 @@
 # 方案：Pillow 处理并控制缩略图最大边与最大字节数
 
 from io import BytesIO
+import os
+from pathlib import Path
 from PIL import Image
-import base64
 
 
 def generate_thumbnail(image_path, max_edge: int, max_bytes: int, output_format: str, base_quality: int):
     with Image.open(image_path) as img:
-        img = img.convert("RGB")
-        img.thumbnail((max_edge, max_edge))
-        width, height = img.size
+        return render_thumbnail(img, max_edge, max_bytes, output_format, base_quality)
 
-        quality = base_quality
+
+def render_thumbnail(img, max_edge: int, max_bytes: int, output_format: str, base_quality: int):
+    # 任务：从已打开（尚未解码）的图片直接生成缩略图，上传流程不必再次打开文件
+    # 方案：JPEG 先用 draft 让解码器按 1/2~1/8 缩放解码，其余格式 draft 无效果；调用方需在此之前读取原始尺寸
+    img.draft("RGB", (max_edge * 2, max_edge * 2))
+    img = img.convert("RGB")
+    img.thumbnail((max_edge, max_edge))
+    width, height = img.size
+
+    quality = base_quality
+    data = _save_with_quality(img, output_format, quality)
+    while len(data) > max_bytes and quality > 40:
+        quality -= 10
         data = _save_with_quality(img, output_format, quality)
-        while len(data) > max_bytes and quality > 40:
-            quality -= 10
-            data = _save_with_quality(img, output_format, quality)
 
-        data_base64 = base64.b64encode(data).decode("utf-8")
-        return {
-            "format": output_format,
-            "width": width,
-            "height": height,
-            "data_base64": data_base64,
-        }
+    return {
+        "format": output_format,
+        "width": width,
+        "height": height,
+        "data": data,
+    }
+
+
+def render_analysis_image(img, max_edge: int):
+    # 任务：为 AI 分析生成最大边 max_edge 的 RGB 图，调用方可编码落盘后再继续缩成缩略图
+    # 方案：draft 让 JPEG 解码器在 DCT 域直接输出不小于 max_edge 的最大 1/2^n 缩放，再 LANCZOS 缩到目标尺寸
+    img.draft("RGB", (max_edge, max_edge))
+    img = img.convert("RGB")
+    img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    return img
+
+
+def encode_jpeg(img, quality: int) -> bytes:
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
 
 
 def _save_with_quality(img, output_format: str, quality: int) -> bytes:
@@ -36,13 +58,25 @@ def _save_with_quality(img, output_format: str, quality: int) -> bytes:
 def crop_image(image_path, ratios: dict):
     with Image.open(image_path) as img:
         cropped = _apply_crop(img, ratios)
-        cropped.save(image_path)
+        _replace_file(cropped, image_path, img.format)
 
 
 def adjust_hue(image_path, delta: float):
     with Image.open(image_path) as img:
         merged = _apply_hue(img, delta)
-        merged.save(image_path)
+        _replace_file(merged, image_path, img.format)
+
+
+def _replace_file(img, image_path, image_format: str):
+    # 任务：相同内容的上传以硬链接共享同一份文件，原地写入会把编辑结果带到其他图片
+    # 方案：写入同目录临时文件后 os.replace，只替换当前路径的目录项，其余硬链接保持原内容
+    image_path = Path(image_path)
+    temp_path = image_path.with_name(f".{image_path.name}.edit")
+    try:
+        img.save(temp_path, format=image_format)
+        os.replace(temp_path, image_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
 
 
 def build_edit_preview(image_path, mode: str, ratios: dict = None, delta: float = None):
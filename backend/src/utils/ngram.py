@@ -0,0 +1,67 @@
+# 任务：为全文检索提供容错的分词，中文没有空格分词、英文需要容忍拼写错误
+# 方案：统一 NFKC、去变音符号并小写；中日韩连续字符切成二元组，其余字母数字词两侧补“_”后切成三元组，
+#       拼错一个字母的词仍与原词共享多数三元组，按重合比例即可模糊匹配
+
+import unicodedata
+from typing import List
+
+_CJK_RANGES = (
+    (0x3040, 0x30FF),  # 平假名、片假名
+    (0x3400, 0x4DBF),  # CJK 扩展 A
+    (0x4E00, 0x9FFF),  # CJK 统一表意文字
+    (0xAC00, 0xD7AF),  # 韩文音节
+    (0xF900, 0xFAFF),  # CJK 兼容表意文字
+)
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return any(start <= code <= end for start, end in _CJK_RANGES)
+
+
+def normalize_text(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if unicodedata.category(char) != "Mn")
+    return unicodedata.normalize("NFC", stripped).lower()
+
+
+def _runs(text: str) -> List[tuple]:
+    # 按字符类型切段：(is_cjk, 连续片段)；非字母数字字符作为分隔
+    runs = []
+    current = []
+    current_cjk = None
+    for char in text:
+        if not char.isalnum():
+            if current:
+                runs.append((current_cjk, "".join(current)))
+            current, current_cjk = [], None
+            continue
+        cjk = _is_cjk(char)
+        if current and cjk != current_cjk:
+            runs.append((current_cjk, "".join(current)))
+            current = []
+        current.append(char)
+        current_cjk = cjk
+    if current:
+        runs.append((current_cjk, "".join(current)))
+    return runs
+
+
+def ngrams(text: str, for_index: bool = False) -> List[str]:
+    # 返回去重后保持出现顺序的 n-gram 列表，可直接用空格拼接写入 FTS5（tokenchars 需包含“_”）；
+    # 建索引时中日韩片段额外写入单字，使单字查询（如“猫”）也能命中“猫咪”
+    grams = []
+    seen = set()
+    for cjk, run in _runs(normalize_text(text)):
+        if cjk:
+            parts = [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+            if for_index and len(run) > 1:
+                parts.extend(run)
+        else:
+            padded = f"_{run}_"
+            parts = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for part in parts:
+            if part not in seen:
+                seen.add(part)
+                grams.append(part)
+    return grams
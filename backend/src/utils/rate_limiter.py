@@ -0,0 +1,42 @@
+# 任务：批量调用外部接口时限制每秒请求数，避免触发服务商限流
+# 方案：令牌桶，按单调时钟匀速补充令牌，容量 burst 允许短时突发；多线程共享同一实例
+
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self._rate = float(rate_per_second)
+        self._capacity = float(max(1, burst))
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # 取到令牌返回 0，否则返回还需等待的秒数
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        # rate <= 0 表示不限速；超时仍未取到令牌返回 False，调用方可借此检查停止信号
+        if self._rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
@@ -0,0 +1,46 @@
+# 任务：提供进程内有界缓存，减少热点路径的重复数据库查询
+# 方案：OrderedDict 实现 LRU 淘汰，配合单调时钟做 TTL 过期，线程锁保证并发安全
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self._max_entries = max(1, int(max_entries))
+        self._ttl = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if self._ttl > 0 and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self._ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,82 @@
+# 任务：集中测试共用的模块搜索路径、内存数据库与造数辅助，避免每个测试文件重复一份
+# 方案：conftest 先把 backend 加入 sys.path；engine 为 StaticPool 内存 SQLite（所有会话共享同一连接）并建表，
+#       session_factory/session 建在 engine 之上，global_session 替换全局会话工厂供 session_scope 使用；
+#       需要其他库的测试文件覆盖 engine fixture 即可复用其余部分；flask_app 供接口测试使用测试客户端；
+#       make_user/make_image 构造最小合法记录
+
+import itertools
+import sys
+from pathlib import Path
+
+import pytest
+
+# 任务：测试中补齐模块搜索路径，确保能导入 backend/src
+# 方案：把 backend 目录加入 sys.path，复用现有 package 结构
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from src import models  # noqa: E402,F401
+from src.core import db  # noqa: E402
+from src.core.db import Base  # noqa: E402
+from src.models.image import Image  # noqa: E402
+from src.models.user import User  # noqa: E402
+
+_image_seq = itertools.count(1)
+
+
+@pytest.fixture()
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def session_factory(engine):
+    return sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+@pytest.fixture()
+def session(session_factory):
+    with session_factory() as db_session:
+        yield db_session
+
+
+@pytest.fixture()
+def global_session(monkeypatch, session_factory):
+    monkeypatch.setattr(db, "_SessionLocal", session_factory)
+    return session_factory
+
+
+@pytest.fixture()
+def flask_app():
+    # 导入即完成应用初始化（含全局会话工厂），放在用例内避免影响其他测试的收集；依赖它的 fixture 须把它排在 global_session 之前
+    from app import app
+
+    return app
+
+
+def make_user(session, username: str = "u", role: str = "user") -> User:
+    user = User(username=username, email=f"{username}@example.com", password_hash="x", role=role)
+    session.add(user)
+    session.flush()
+    return user
+
+
+def make_image(session, uploader_id: int = 1, **fields) -> Image:
+    """构造一张最小合法的图片记录并 flush 取得 id；hash 与存储路径缺省时自动生成不重复的值。"""
+    if "hash" not in fields:
+        fields["hash"] = f"h{next(_image_seq):08d}"
+    fields.setdefault("storage_relpath", f"{fields['hash']}.jpg")
+    fields.setdefault("ext", "jpg")
+    fields.setdefault("size_bytes", 1)
+    image = Image(uploader_id=uploader_id, **fields)
+    session.add(image)
+    session.flush()
+    return image
@@ -0,0 +1,117 @@
+# 任务：验证批量补 AI 标签的入队断点、并发执行、失败状态与限速，以及启动接口的鉴权顺序与重复启动
+# 方案：临时文件 SQLite（多线程各用独立连接）替换全局会话工厂，替换 ai_retag 任务处理函数，不请求模型
+
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from conftest import make_image, make_user
+from src.core.db import Base, session_scope
+from src.api import admin
+from src.core.errors import ApiError, ERROR_VALIDATION
+from src.models.image import Image as ImageModel
+from src.models.tag import Tag
+from src.services import ingest_worker
+from src.services.auth_service import create_access_token
+from src.services.ai_retag_service import (
+    RetagRunner,
+    enqueue_untagged,
+    image_ai_status,
+    retag_status,
+)
+from src.services.ingest_queue import JOB_AI_RETAG
+from src.utils.rate_limiter import RateLimiter
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    # 工作线程各自建会话，用文件库让每个会话拿到独立连接，替代共享单连接的内存库
+    engine = create_engine(f"sqlite:///{tmp_path / 'retag.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def image_ids(global_session):
+    with session_scope() as session:
+        user = make_user(session)
+        images = [make_image(session, uploader_id=user.id) for _ in range(5)]
+        images[3].tags = [Tag(name="已有", source="ai")]
+        images[4].is_deleted = True
+        session.flush()
+        return [image.id for image in images]
+
+
+def test_retag_checkpoint_and_job_states(image_ids, monkeypatch):
+    calls = []
+
+    def fake_tags(session, image):
+        calls.append(image.id)
+        if image.id == image_ids[2]:
+            raise ApiError(400, ERROR_VALIDATION, "bad image")
+        image.tags = [Tag(name=f"标签{image.id}", source="ai")]
+
+    monkeypatch.setitem(ingest_worker._HANDLERS, JOB_AI_RETAG, fake_tags)
+
+    with session_scope() as session:
+        assert enqueue_untagged(session) == 3
+    with session_scope() as session:
+        assert enqueue_untagged(session) == 0
+
+    runner = RetagRunner()
+    assert runner.start(2, 100)
+    assert runner.wait(10)
+    assert sorted(calls) == image_ids[:3]
+    assert runner.processed == 3
+
+    with session_scope() as session:
+        assert retag_status(session)["jobs"] == {"pending": 0, "running": 0, "done": 2, "failed": 1}
+        done = image_ai_status(session, session.get(ImageModel, image_ids[0]))
+        failed = image_ai_status(session, session.get(ImageModel, image_ids[2]))
+        untouched = image_ai_status(session, session.get(ImageModel, image_ids[3]))
+    assert done["status"] == "done" and done["tags"] == [f"标签{image_ids[0]}"]
+    assert failed["status"] == "failed" and failed["error"] == "bad image"
+    assert untouched == {"tags": ["已有"], "source": "ai", "status": "done"}
+
+    # 断点：已完成的图片不再入队，只有 retry_failed 会重新执行失败任务
+    with session_scope() as session:
+        assert enqueue_untagged(session, retry_failed=True) == 1
+        assert image_ai_status(session, session.get(ImageModel, image_ids[2]))["status"] == "pending"
+
+
+def test_start_api_checks_role_first_and_reports_running(flask_app, image_ids, monkeypatch):
+    with session_scope() as session:
+        tokens = {
+            role: create_access_token(make_user(session, role, role=role).id, role)[0] for role in ("user", "admin")
+        }
+    test_client = flask_app.test_client()
+
+    def start(role, body):
+        headers = {"Authorization": f"Bearer {tokens[role]}"}
+        return test_client.post("/api/admin/ai-retag", json=body, headers=headers)
+
+    # 非管理员即使参数非法也先得到 403
+    assert start("user", {"requests_per_second": -1}).status_code == 403
+    assert start("admin", {"requests_per_second": -1}).status_code == 400
+
+    monkeypatch.setattr(admin, "ensure_retag_available", lambda: None)
+    monkeypatch.setattr(admin.retag_runner, "start", lambda concurrency, requests_per_second: False)
+    response = start("admin", {"concurrency": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["started"] is False
+    assert data["enqueued"] == 3
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        assert limiter.acquire()
+    assert time.monotonic() - started >= 0.18
+
+    slow = RateLimiter(1, burst=1)
+    assert slow.acquire()
+    assert not slow.acquire(timeout=0.05)
@@ -0,0 +1,45 @@
+# 任务：验证 AI 检索结果按 (规范化查询, 标签库版本) 缓存，新标签提交后版本变化、旧结果失效
+# 方案：替换 generate_search_tags 记录调用次数，内存 SQLite 上经 resolve_tags 创建标签
+
+import pytest
+
+from src.services import ai_search_service, tag_pool, tag_resolver
+from src.services.ai_search_service import search_tags_cached
+from src.services.tag_resolver import resolve_tags
+from src.utils.ttl_cache import TTLCache
+
+
+@pytest.fixture()
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(tag_resolver, "_cache", TTLCache(1000, 3600))
+    monkeypatch.setattr(tag_pool, "tag_pool", tag_pool.TagPool())
+    monkeypatch.setattr(ai_search_service, "_result_cache", TTLCache(100, 600))
+
+
+def test_search_results_cached_until_tag_pool_changes(fresh_caches, session_factory, monkeypatch):
+    calls = []
+
+    def fake_generate(pool, query):
+        calls.append(list(pool))
+        return "###### answer: 风景", ["风景"]
+
+    monkeypatch.setattr(ai_search_service, "generate_search_tags", fake_generate)
+
+    with session_factory() as session:
+        resolve_tags(session, ["风景", "城市"], "custom")
+        session.commit()
+
+        assert search_tags_cached(session, "风景照") == ("###### answer: 风景", ["风景"])
+        assert search_tags_cached(session, "  风景照 ") == ("###### answer: 风景", ["风景"])
+        assert len(calls) == 1
+
+        resolve_tags(session, ["城市"], "custom")
+        session.commit()
+        search_tags_cached(session, "风景照")
+        assert len(calls) == 1
+
+        resolve_tags(session, ["海边"], "ai")
+        session.commit()
+        search_tags_cached(session, "风景照")
+        assert len(calls) == 2
+        assert "海边" in calls[-1]
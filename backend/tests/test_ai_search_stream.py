@@ -0,0 +1,189 @@
+# 任务：验证 AI 检索的流式模式逐段转发模型输出，并在结束时解析答案行、写入结果缓存；
+#       经 Connexion 测试客户端验证 /api/mcp/search 的 JSON、SSE 与 auto 模式退回本地检索
+# 方案：本地 http.server 以兼容模式 SSE 分段推送，首段之后等待测试确认收到首个片段再发后续片段；
+#       接口测试把全局会话工厂换成内存库，直接调用应用的 test_client
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import make_image, make_user
+from src.models.thumbnail import ImageThumbnail
+from src.services import (
+    ai_search_service,
+    local_search_service,
+    qwen_client,
+    tag_index_service,
+    tag_pool,
+    tag_resolver,
+)
+from src.services.ai_search_service import search_tags_cached, stream_search_tags
+from src.services.auth_service import create_access_token
+from src.services.tag_resolver import resolve_tags
+from src.utils.ttl_cache import TTLCache
+
+_CHUNKS = ["用户想找", "海边的照片。\n", "###### answer: 海边。风景"]
+# 服务端等待测试确认收到首个片段的上限；正常情况下确认立即到达
+_GATE_TIMEOUT = 5
+
+
+@pytest.fixture()
+def gate():
+    # first_received：测试已收到首个片段；second_sent：服务端开始发送第二段
+    return SimpleNamespace(first_received=threading.Event(), second_sent=threading.Event())
+
+
+@pytest.fixture()
+def sse_server(gate):
+    class Handler(BaseHTTPRequestHandler):
+        # 与服务商一致使用分块传输，客户端收到一块即可解析一块
+        protocol_version = "HTTP/1.1"
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not body.get("stream"):
+                content = json.dumps({"choices": [{"message": {"content": "".join(_CHUNKS)}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index, text in enumerate(_CHUNKS):
+                if index == 1:
+                    gate.first_received.wait(_GATE_TIMEOUT)
+                    gate.second_sent.set()
+                chunk = {"choices": [{"delta": {"content": text}}]}
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/compatible-mode/v1"
+    server.shutdown()
+
+
+@pytest.fixture()
+def qwen_cfg(sse_server):
+    return {"enabled": True, "api_key": "test", "base_url": sse_server, "model": "qwen-test", "max_retries": 1,
+            "timeout": 5, "max_tags": 5}
+
+
+@pytest.fixture()
+def session(session, monkeypatch, qwen_cfg):
+    monkeypatch.setattr(ai_search_service, "_load_qwen_config", lambda: qwen_cfg)
+    monkeypatch.setattr(qwen_client, "_client", None)
+    monkeypatch.setattr(tag_resolver, "_cache", TTLCache(1000, 3600))
+    monkeypatch.setattr(tag_pool, "tag_pool", tag_pool.TagPool())
+    monkeypatch.setattr(ai_search_service, "_result_cache", TTLCache(100, 600))
+    resolve_tags(session, ["海边", "风景", "城市"], "custom")
+    session.commit()
+    return session
+
+
+def test_stream_forwards_deltas_before_model_finishes(session, gate, monkeypatch):
+    events = stream_search_tags(session, "海边")
+    kind, first = next(events)
+    # 首个片段必须在服务端发出第二段之前到达，否则说明响应被整体缓冲
+    assert not gate.second_sent.is_set()
+    gate.first_received.set()
+    rest = list(events)
+
+    assert (kind, first) == ("delta", _CHUNKS[0])
+    assert [value for kind, value in rest if kind == "delta"] == _CHUNKS[1:]
+    assert rest[-1] == ("done", ("".join(_CHUNKS), ["海边", "风景"]))
+
+    # 流式结果写入同一缓存，之后的普通与流式请求都不再访问模型
+    monkeypatch.setattr(ai_search_service, "_stream_ai_text", None)
+    monkeypatch.setattr(ai_search_service, "generate_search_tags", None)
+    assert search_tags_cached(session, "海边") == ("".join(_CHUNKS), ["海边", "风景"])
+    assert list(stream_search_tags(session, "海边"))[-1] == ("done", ("".join(_CHUNKS), ["海边", "风景"]))
+
+
+def _sse_events(text: str) -> list:
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture()
+def client(flask_app, session, global_session, monkeypatch):
+
+    index = tag_index_service.TagIndex()
+    monkeypatch.setattr(tag_index_service, "tag_index", index)
+    monkeypatch.setattr(local_search_service, "tag_index", index)
+    monkeypatch.setattr(local_search_service, "_gram_index", None)
+    monkeypatch.setattr(local_search_service, "_local_cfg", lambda: {"min_similarity": 0.4, "max_tags": 5, "synonyms": ""})
+
+    user = make_user(session)
+    for names in [["海边", "风景"], ["城市"]]:
+        make_image(
+            session,
+            uploader_id=user.id,
+            tags=resolve_tags(session, names, "custom"),
+            thumbnail=ImageThumbnail(format="jpeg", width=1, height=1, size_bytes=1, data=b"x", data_base64=""),
+        )
+    session.commit()
+    token, _ = create_access_token(user.id, user.role)
+    return flask_app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+def test_search_api_json_stream_and_auto_fallback(client, gate, qwen_cfg):
+    test_client, headers = client
+    gate.first_received.set()
+
+    response = test_client.post("/api/mcp/search", json={"query": "海边", "mode": "ai"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/json")
+    data = response.json()
+    assert (data["mode"], data["tags"]) == ("ai", ["海边", "风景"])
+    assert [item["id"] for item in data["items"]] == [1]
+
+    response = test_client.post(
+        "/api/mcp/search", json={"query": "海边风景", "mode": "ai", "stream": True}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+    assert [name for name, _ in events] == ["start", "delta", "delta", "delta", "result"]
+    assert "".join(payload["text"] for name, payload in events if name == "delta") == "".join(_CHUNKS)
+    assert events[-1][1]["mode"] == "ai" and events[-1][1]["tags"] == ["海边", "风景"]
+
+    # AI 不可用时 auto 模式退回本地检索，JSON 与流式两种响应都给出本地结果
+    qwen_cfg["enabled"] = False
+    response = test_client.post("/api/mcp/search", json={"query": "城市", "mode": "auto"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["mode"], data["tags"]) == ("local", ["城市"])
+    assert [item["id"] for item in data["items"]] == [2]
+
+    response = test_client.post(
+        "/api/mcp/search", json={"query": "城市", "mode": "auto", "stream": True}, headers=headers
+    )
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+    assert [name for name, _ in events] == ["start", "delta", "result"]
+    assert events[-1][1]["mode"] == "local" and events[-1][1]["tags"] == ["城市"]
+
+    # mode=ai 不做退回，按普通错误响应返回
+    response = test_client.post("/api/mcp/search", json={"query": "城市", "mode": "ai"}, headers=headers)
+    assert response.status_code == 400
+
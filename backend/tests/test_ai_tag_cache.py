@@ -0,0 +1,57 @@
+# 任务：验证 AI 标签按内容摘要持久化缓存，相同内容的图片只调用一次模型，换 prompt 版本后重新调用
+# 方案：替换 _request_tags 计数，内存 SQLite + 临时目录中的两张同内容图片
+
+import io
+
+import pytest
+from PIL import Image as PILImage
+
+from conftest import make_image
+from src.services import ai_tag_service, analysis_image_service, tag_resolver
+from src.services.ai_tag_service import generate_ai_tags
+from src.utils.ttl_cache import TTLCache
+
+
+@pytest.fixture()
+def storage(monkeypatch, tmp_path):
+    cfg = {
+        "storage": {"root_dir": str(tmp_path)},
+        "qwen": {"enabled": True, "api_key": "test", "model": "qwen-test", "max_tags": 5},
+    }
+    cfg["analysis"] = {"root_dir": str(tmp_path / "analysis"), "max_edge": 64}
+    monkeypatch.setattr(ai_tag_service, "get_config", lambda: cfg)
+    monkeypatch.setattr(analysis_image_service, "get_config", lambda: cfg)
+    monkeypatch.setattr(tag_resolver, "_cache", TTLCache(1000, 3600))
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (400, 300), (30, 120, 200)).save(buffer, format="JPEG")
+    for name in ("a.jpg", "b.jpg"):
+        (tmp_path / name).write_bytes(buffer.getvalue())
+    return tmp_path
+
+
+def test_identical_content_calls_model_once(storage, session, monkeypatch):
+    calls = []
+
+    def fake_request(image_path, cfg):
+        calls.append(image_path)
+        return ["海滩", "蓝天"]
+
+    monkeypatch.setattr(ai_tag_service, "_request_tags", fake_request)
+    first = make_image(session, hash="a", size_bytes=10)
+    second = make_image(session, hash="b", size_bytes=10)
+    session.commit()
+
+    assert generate_ai_tags(session, first) == ["海滩", "蓝天"]
+    session.commit()
+    assert generate_ai_tags(session, first) == ["海滩", "蓝天"]
+    assert generate_ai_tags(session, second) == ["海滩", "蓝天"]
+    session.commit()
+    assert len(calls) == 1
+    # 模型输入是按内容摘要保存的分析用衍生图，而不是原图
+    with PILImage.open(calls[0]) as derived:
+        assert max(derived.size) == 64
+    assert {tag.source for tag in second.tags} == {"ai"}
+
+    monkeypatch.setattr(ai_tag_service, "PROMPT_VERSION", "tags-test")
+    generate_ai_tags(session, second)
+    assert len(calls) == 2
@@ -0,0 +1,81 @@
+# 任务：验证 EXIF 子 IFD 字段被合并，并能解析为类型化分面；拍摄时间过滤按 UTC 比较
+# 方案：内存中生成带 Exif IFD 的 JPEG，走 extract_exif_dict + parse_facets；内存库上直接调用 apply_facet_filters
+
+import io
+from datetime import datetime
+
+import pytest
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+from conftest import make_image
+from src.core.errors import ApiError
+from src.models.image import Image as ImageModel
+from src.models.image_capture_time import ImageCaptureTime
+from src.services.facet_service import apply_facet_filters
+from src.utils.exif_utils import extract_exif_dict, parse_capture_time, parse_facets
+
+
+def _jpeg_with_exif() -> io.BytesIO:
+    exif = Image.Exif()
+    exif[0x010F] = "SONY"
+    exif[0x0110] = "ILCE-7M3"
+    ifd = exif.get_ifd(0x8769)
+    ifd[0x8827] = 3200
+    ifd[0xA434] = "FE 24-70mm F2.8 GM"
+    ifd[0x9003] = "2024:03:01 08:30:00"
+    ifd[0x920A] = IFDRational(70, 1)
+    ifd[0x829D] = IFDRational(28, 10)
+    ifd[0x829A] = IFDRational(1, 250)
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="JPEG", exif=exif)
+    buffer.seek(0)
+    return buffer
+
+
+def test_parse_facets_from_exif_ifd():
+    with Image.open(_jpeg_with_exif()) as img:
+        exif_dict = extract_exif_dict(img)
+
+    taken_at, _ = parse_capture_time(exif_dict)
+    assert taken_at.isoformat() == "2024-03-01T08:30:00"
+
+    facets = parse_facets(exif_dict)
+    assert facets["camera"] == "SONY ILCE-7M3"
+    assert facets["lens"] == "FE 24-70mm F2.8 GM"
+    assert facets["iso"] == 3200
+    assert facets["focal_length"] == 70.0
+    assert facets["f_number"] == 2.8
+    assert facets["exposure_time"] == 0.004
+
+
+def test_parse_facets_handles_missing_and_invalid_values():
+    facets = parse_facets({"Make": "Canon", "Model": "Canon EOS R5", "FNumber": (1, 0), "ISOSpeedRatings": (400,)})
+    assert facets["camera"] == "Canon EOS R5"
+    assert facets["f_number"] is None
+    assert facets["iso"] == 400
+    assert facets["lens"] is None
+
+
+def test_taken_range_converts_offsets_to_utc(session):
+    ids = []
+    for taken_at in [datetime(2024, 3, 1, 0, 30), datetime(2024, 3, 1, 23, 30), datetime(2024, 3, 2, 0, 30)]:
+        image = make_image(session)
+        session.add(ImageCaptureTime(image_id=image.id, taken_at=taken_at))
+        ids.append(image.id)
+    session.commit()
+
+    def taken_ids(**params):
+        query = apply_facet_filters(session.query(ImageModel), **params)
+        return sorted(image.id for image in query)
+
+    # 只给日期时 taken_to 包含当天
+    assert taken_ids(taken_to="2024-03-01") == ids[:2]
+    assert taken_ids(taken_from="2024-03-02", taken_to="2024-03-02") == ids[2:]
+    # +08:00 的 3 月 2 日 08:00 即 UTC 3 月 2 日 00:00；完整时间按闭区间
+    assert taken_ids(taken_from="2024-03-02T08:00:00+08:00") == ids[2:]
+    assert taken_ids(taken_to="2024-03-02T08:30:00+08:00") == ids
+    assert taken_ids(taken_from="2024-03-01T00:30:00Z", taken_to="2024-03-01T23:30:00") == ids[:2]
+    with pytest.raises(ApiError) as excinfo:
+        taken_ids(taken_from="yesterday")
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,63 @@
+# 任务：验证地图聚合表由触发器增量维护，结果与全量重建一致
+# 方案：内存 SQLite 安装触发器后依次写坐标、改坐标、软删除/恢复、删坐标，每步与 rebuild_geo_cells 对比
+
+import random
+from sqlalchemy import text
+
+from conftest import make_image
+from src.models.image import Image
+from src.models.image_location import ImageLocation
+from src.services.geo_cluster_service import ensure_geo_cell_triggers, rebuild_geo_cells
+from src.services.geo_service import geohash_for
+
+_CELLS_SQL = text("SELECT precision, cell, count, round(lat_sum, 6), sample_image_id IS NOT NULL FROM geo_cells")
+
+
+def _snapshot(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(_CELLS_SQL).all())
+
+
+def _assert_matches_rebuild(engine):
+    incremental = _snapshot(engine)
+    with engine.begin() as conn:
+        rebuild_geo_cells(conn)
+    assert incremental == _snapshot(engine)
+
+
+def test_geo_cells_follow_location_and_soft_delete(engine, session_factory):
+    ensure_geo_cell_triggers(engine)
+    rng = random.Random(15)
+
+    with session_factory() as session:
+        for _ in range(40):
+            image = make_image(session)
+            latitude, longitude = 31.2 + rng.uniform(0, 0.1), 121.4 + rng.uniform(0, 0.1)
+            session.add(
+                ImageLocation(
+                    image_id=image.id,
+                    latitude=latitude,
+                    longitude=longitude,
+                    geohash=geohash_for(latitude, longitude),
+                )
+            )
+        session.commit()
+        _assert_matches_rebuild(engine)
+
+        images = session.query(Image).order_by(Image.id).all()
+        for image in images[:10]:
+            image.is_deleted = True
+        moved = session.get(ImageLocation, images[20].id)
+        moved.latitude, moved.longitude = 39.9, 116.4
+        moved.geohash = geohash_for(39.9, 116.4)
+        session.query(ImageLocation).filter(ImageLocation.image_id == images[30].id).delete()
+        session.commit()
+        _assert_matches_rebuild(engine)
+
+        for image in images[:5]:
+            image.is_deleted = False
+        session.commit()
+        _assert_matches_rebuild(engine)
+
+        total = session.execute(text("SELECT sum(count) FROM geo_cells WHERE precision = 1")).scalar_one()
+        assert total == 40 - 5 - 1
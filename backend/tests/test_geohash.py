@@ -0,0 +1,65 @@
+# 任务：验证 geohash 编码、区域覆盖与距离计算，以及圆形范围过滤与逐点距离计算一致
+# 方案：对照公开的标准编码样例，并检查覆盖前缀包含区域内随机点；内存 SQLite 上对比 near 过滤与 haversine 暴力结果
+
+import random
+
+from conftest import make_image
+from src.models.image import Image
+from src.models.image_location import ImageLocation
+from src.services.geo_service import apply_geo_filters, geohash_for
+from src.utils.geohash import cover_bbox, encode, haversine_km, radius_bbox
+
+
+def test_encode_known_value():
+    assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode(-25.382708, -49.265506, 8) == "6gkzwgjz"
+
+
+def test_cover_bbox_contains_points_inside():
+    rng = random.Random(7)
+    for min_lat, min_lon, max_lat, max_lon in [(31.0, 121.0, 31.5, 122.0), (-1.0, -1.0, 1.0, 1.0), (10, 20, 10.001, 20.001)]:
+        prefixes = cover_bbox(min_lat, min_lon, max_lat, max_lon, max_cells=32)
+        assert 0 < len(prefixes) <= 32
+        for _ in range(200):
+            point = encode(rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon), 9)
+            assert any(point.startswith(prefix) for prefix in prefixes)
+
+
+def test_radius_bbox_and_haversine():
+    # 上海外滩到陆家嘴约 0.93 km
+    assert 0.8 < haversine_km(31.2400, 121.4900, 31.2397, 121.4998) < 1.0
+    min_lat, min_lon, max_lat, max_lon = radius_bbox(31.24, 121.49, 10)
+    assert haversine_km(31.24, 121.49, max_lat, 121.49) >= 9.99
+    assert haversine_km(31.24, 121.49, 31.24, max_lon) >= 9.99
+
+
+def test_near_filter_matches_haversine(session_factory):
+    rng = random.Random(14)
+    # 上海附近与跨 180° 经线附近各撒一批点
+    centers = [(31.24, 121.49), (-16.5, 179.95)]
+    points = {}
+    with session_factory() as session:
+        for index in range(400):
+            center_lat, center_lon = centers[index % 2]
+            latitude = center_lat + rng.uniform(-0.3, 0.3)
+            longitude = center_lon + rng.uniform(-0.3, 0.3)
+            longitude = longitude - 360.0 if longitude > 180.0 else longitude
+            image = make_image(session)
+            session.add(
+                ImageLocation(
+                    image_id=image.id, latitude=latitude, longitude=longitude, geohash=geohash_for(latitude, longitude)
+                )
+            )
+            points[image.id] = (latitude, longitude)
+        session.commit()
+
+        for (center_lat, center_lon), radius in [(centers[0], 10), (centers[0], 25), (centers[1], 15)]:
+            query = apply_geo_filters(session, session.query(Image.id), near=f"{center_lat},{center_lon}", radius_km=radius)
+            expected = {
+                image_id
+                for image_id, (lat, lon) in points.items()
+                if haversine_km(center_lat, center_lon, lat, lon) <= radius
+            }
+            assert expected
+            assert {row.id for row in query.all()} == expected
+
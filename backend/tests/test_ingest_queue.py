@@ -0,0 +1,89 @@
+# 任务：验证后台处理队列的领取、退避重试与失败终态，以及元数据任务完成前后的缩略图读写
+# 方案：内存 SQLite 替换全局会话工厂，直接调用队列函数并检查 ingest_jobs 行状态
+
+from datetime import datetime
+
+import pytest
+
+from conftest import make_image, make_user
+from src.core.db import session_scope
+from src.models.image import Image as ImageModel
+from src.models.ingest_job import IngestJob
+from src.models.thumbnail import ImageThumbnail
+from src.services import ingest_queue
+from src.services.thumbnail_service import placeholder_thumbnail, upsert_thumbnail
+
+
+@pytest.fixture()
+def image_id(monkeypatch, global_session):
+    monkeypatch.setattr(
+        ingest_queue,
+        "ingest_cfg",
+        lambda: {"max_attempts": 2, "backoff_base_seconds": 30, "backoff_max_seconds": 60},
+    )
+
+    with session_scope() as session:
+        user = make_user(session)
+        image = make_image(session, uploader_id=user.id, hash="h", storage_relpath="2024/01/01/h.jpg")
+        ingest_queue.enqueue_job(session, image.id, ingest_queue.JOB_METADATA)
+        new_id = image.id
+    assert ingest_queue.job_available.is_set()
+    return new_id
+
+
+def _job(image_id):
+    with session_scope() as session:
+        return session.query(IngestJob).filter(IngestJob.image_id == image_id).one()
+
+
+def test_claim_retry_and_fail(image_id):
+    job = ingest_queue.claim_next_job()
+    assert job is not None and job.attempts == 1
+    # 已被领取的任务不会被重复领取
+    assert ingest_queue.claim_next_job() is None
+
+    ingest_queue.fail_job(job, "boom")
+    row = _job(image_id)
+    assert row.status == "pending" and row.last_error == "boom"
+    assert row.next_run_at > datetime.utcnow()
+    # 退避期内不可领取
+    assert ingest_queue.claim_next_job() is None
+
+    with session_scope() as session:
+        session.query(IngestJob).update({IngestJob.next_run_at: datetime.utcnow()})
+    job = ingest_queue.claim_next_job()
+    assert job.attempts == 2
+    ingest_queue.fail_job(job, "boom again")
+    assert _job(image_id).status == "failed"
+
+    # 重新入队会重置状态与尝试次数
+    with session_scope() as session:
+        ingest_queue.enqueue_job(session, image_id, ingest_queue.JOB_METADATA)
+    job = ingest_queue.claim_next_job()
+    assert job.attempts == 1
+    ingest_queue.complete_job(job.id)
+    assert _job(image_id).status == "done"
+
+
+def test_thumbnail_placeholder_and_concurrent_insert(image_id):
+    # 元数据任务未完成：返回占位图，不读原图（测试中原图文件不存在）也不落库
+    with session_scope() as session:
+        data = upsert_thumbnail(session, session.get(ImageModel, image_id))
+        assert data["pending"] is True
+        assert data["data"] == placeholder_thumbnail()["data"]
+    with session_scope() as session:
+        assert session.get(ImageThumbnail, image_id) is None
+
+    job = ingest_queue.claim_next_job()
+    ingest_queue.complete_job(job.id)
+    prebuilt = {"format": "jpeg", "width": 1, "height": 1, "data": b"worker"}
+    with session_scope() as session:
+        stale = session.get(ImageModel, image_id)
+        assert stale.thumbnail is None
+        # 另一会话（后台任务）先写入缩略图，本会话仍持有“无缩略图”的旧视图
+        with session_scope() as other:
+            upsert_thumbnail(other, other.get(ImageModel, image_id), prebuilt=prebuilt)
+        upsert_thumbnail(session, stale, prebuilt={**prebuilt, "data": b"request"})
+        assert stale.thumbnail.data == b"request"
+    with session_scope() as session:
+        assert session.query(ImageThumbnail).filter(ImageThumbnail.image_id == image_id).count() == 1
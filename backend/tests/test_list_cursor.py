@@ -0,0 +1,118 @@
+# 任务：验证图片列表的 keyset 游标分页：翻到末页不重不漏、created_at 相同时按 id 断开、
+#       include_total 在游标/页码模式下的默认值、非法游标与 q + cursor 组合返回 400
+# 方案：内存库造一批大量共用 created_at 的图片，经 Connexion 测试客户端调用 GET /api/images
+
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_image, make_user
+from src.models.image import Image as ImageModel
+from src.models.thumbnail import ImageThumbnail
+from src.services.auth_service import create_access_token
+from src.utils.cursor import encode_cursor
+
+IMAGE_COUNT = 25
+PAGE_SIZE = 4
+
+
+@pytest.fixture()
+def client(flask_app, session, global_session):
+    user = make_user(session)
+    base_time = datetime(2024, 1, 1)
+    for index in range(IMAGE_COUNT + 1):
+        make_image(
+            session,
+            uploader_id=user.id,
+            # 只有 3 个不同时间点，且 id 顺序与时间顺序交错，检验 id 兜底排序
+            created_at=base_time + timedelta(minutes=(index * 7) % 9 // 3),
+            # 最后一张为软删除，不应出现在任何一页
+            is_deleted=index == IMAGE_COUNT,
+            thumbnail=ImageThumbnail(format="jpeg", width=1, height=1, size_bytes=1, data=b"x", data_base64=""),
+        )
+    session.commit()
+    token, _ = create_access_token(user.id, user.role)
+    return flask_app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+def _list(client, **params):
+    test_client, headers = client
+    params.setdefault("page_size", PAGE_SIZE)
+    params.setdefault("thumbnail_mode", "url")
+    return test_client.get("/api/images", params=params, headers=headers)
+
+
+def test_cursor_pages_to_end_without_duplicates_or_gaps(client, session):
+    expected = [
+        image.id
+        for image in session.query(ImageModel)
+        .filter(ImageModel.is_deleted.is_(False))
+        .order_by(ImageModel.created_at.desc(), ImageModel.id.desc())
+    ]
+    assert len(expected) == IMAGE_COUNT
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"cursor": cursor} if cursor else {}
+        response = _list(client, **params)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= PAGE_SIZE
+        seen.extend(item["id"] for item in data["items"])
+        pages += 1
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+        # 游标指向本页最后一行
+        last = session.get(ImageModel, data["items"][-1]["id"])
+        assert cursor == encode_cursor(last.created_at, last.id)
+
+    assert seen == expected
+    assert pages == -(-IMAGE_COUNT // PAGE_SIZE)
+
+
+def test_ties_on_created_at_are_broken_by_id(client, session):
+    first = _list(client).json()
+    assert len(first["items"]) == PAGE_SIZE
+    boundary = session.get(ImageModel, first["items"][-1]["id"])
+    tied = {
+        image.id
+        for image in session.query(ImageModel).filter(
+            ImageModel.created_at == boundary.created_at, ImageModel.is_deleted.is_(False)
+        )
+    }
+    # 第一页恰好停在一组相同时间的中间，余下同组的行必须出现在下一页开头
+    remaining = sorted((image_id for image_id in tied if image_id < boundary.id), reverse=True)
+    assert remaining
+
+    second = _list(client, cursor=first["next_cursor"]).json()
+    assert [item["id"] for item in second["items"]][: len(remaining)] == remaining[:PAGE_SIZE]
+
+
+def test_include_total_defaults_by_mode(client):
+    offset_page = _list(client, page=2).json()
+    assert offset_page["total"] == IMAGE_COUNT
+    assert offset_page["next_cursor"] is not None
+
+    cursor = _list(client).json()["next_cursor"]
+    assert _list(client, cursor=cursor).json()["total"] is None
+    assert _list(client, cursor=cursor, include_total="true").json()["total"] == IMAGE_COUNT
+    assert _list(client, include_total="false").json()["total"] is None
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [b"\xff\xfe", b"2024-01-01T00:00:00", b"2024-01-01T00:00:00|abc", b"yesterday|3"],
+)
+def test_malformed_cursor_returns_400(client, raw):
+    cursor = base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    assert _list(client, cursor=cursor).status_code == 400
+
+
+def test_cursor_with_q_is_rejected(client):
+    cursor = _list(client).json()["next_cursor"]
+    response = _list(client, cursor=cursor, q="sunset")
+    assert response.status_code == 400
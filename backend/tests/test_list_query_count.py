@@ -0,0 +1,91 @@
+# 任务：锁定列表序列化的 SQL 次数与磁盘访问，防止 N+1 查询回归
+# 方案：内存 SQLite 造数，监听 before_cursor_execute 计数，比较 5 行与 20 行的语句数并禁止原图 stat
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+from conftest import make_image, make_user
+from src.models.image import Image as ImageModel
+from src.models.tag import Tag
+from src.models.thumbnail import ImageThumbnail
+from src.services.serializers import serialize_image_summary, summary_query_options
+
+
+@pytest.fixture()
+def seeded(engine, session_factory):
+    with session_factory() as session:
+        user = make_user(session)
+        tags = [Tag(name=f"tag{i}", source="custom") for i in range(3)]
+        session.add_all(tags)
+        base_time = datetime(2024, 1, 1)
+        for i in range(30):
+            image = make_image(
+                session,
+                uploader_id=user.id,
+                hash=f"h{i:07d}",
+                storage_relpath=f"2024/01/01/h{i:07d}.jpg",
+                size_bytes=1000 + i,
+                created_at=base_time + timedelta(minutes=i),
+                updated_at=base_time + timedelta(minutes=i),
+                tags=tags[: i % 3 + 1],
+            )
+            session.add(
+                ImageThumbnail(
+                    image_id=image.id, format="jpeg", width=10, height=10, size_bytes=1000 + i, data=b"\xff\xd8"
+                )
+            )
+        session.commit()
+    return engine, session_factory
+
+
+def _count_list_queries(engine, factory, size: int, thumbnail_mode: str) -> int:
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with factory() as session:
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            items = (
+                session.query(ImageModel)
+                .options(*summary_query_options(thumbnail_mode))
+                .order_by(ImageModel.created_at.desc(), ImageModel.id.desc())
+                .limit(size)
+                .all()
+            )
+            summaries = [serialize_image_summary(session, item, thumbnail_mode) for item in items]
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+
+    assert len(summaries) == size
+    assert all(summary and summary["tags"] for summary in summaries)
+    return len(statements)
+
+
+@pytest.mark.parametrize("thumbnail_mode, expected", [("inline", 3), ("url", 2)])
+def test_list_serialization_query_count_is_constant(seeded, monkeypatch, thumbnail_mode, expected):
+    engine, factory = seeded
+
+    # 任务：已有缩略图的行不允许访问原图文件
+    # 方案：替换 Path.exists/stat，命中图片存储路径即失败
+    original_exists = Path.exists
+    original_stat = Path.stat
+
+    def _guard(original):
+        def _wrapped(self, *args, **kwargs):
+            if self.suffix == ".jpg" and "2024/01/01" in self.as_posix():
+                raise AssertionError(f"unexpected filesystem access: {self}")
+            return original(self, *args, **kwargs)
+
+        return _wrapped
+
+    monkeypatch.setattr(Path, "exists", _guard(original_exists))
+    monkeypatch.setattr(Path, "stat", _guard(original_stat))
+
+    small = _count_list_queries(engine, factory, 5, thumbnail_mode)
+    large = _count_list_queries(engine, factory, 20, thumbnail_mode)
+    assert small == large == expected
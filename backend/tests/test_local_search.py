@@ -0,0 +1,65 @@
+# 任务：验证不调用模型的本地检索：n-gram 与同义词匹配标签、IDF 降低常见标签权重、图片按权重和排序
+# 方案：内存 SQLite 建几张带标签的图片，替换全局会话工厂与标签库/倒排索引单例后直接调用
+
+import pytest
+
+from conftest import make_image, make_user
+from src.api import mcp
+from src.models.thumbnail import ImageThumbnail
+from src.services import local_search_service, tag_index_service, tag_pool, tag_resolver
+from src.services.local_search_service import local_search_tags
+from src.services.tag_resolver import resolve_tags
+from src.utils.ttl_cache import TTLCache
+
+_IMAGE_TAGS = [
+    ["海边", "照片"],
+    ["海边", "日落", "照片"],
+    ["猫咪", "照片"],
+    ["城市", "照片"],
+]
+
+
+@pytest.fixture()
+def session(session, monkeypatch):
+    index = tag_index_service.TagIndex()
+    monkeypatch.setattr(tag_index_service, "tag_index", index)
+    monkeypatch.setattr(local_search_service, "tag_index", index)
+    monkeypatch.setattr(tag_resolver, "_cache", TTLCache(1000, 3600))
+    monkeypatch.setattr(tag_pool, "tag_pool", tag_pool.TagPool())
+    monkeypatch.setattr(local_search_service, "_gram_index", None)
+    monkeypatch.setattr(
+        local_search_service,
+        "_local_cfg",
+        lambda: {"min_similarity": 0.4, "max_tags": 5, "synonyms": "海边|沙滩|beach,猫|猫咪"},
+    )
+    user = make_user(session)
+    for names in _IMAGE_TAGS:
+        make_image(
+            session,
+            uploader_id=user.id,
+            tags=resolve_tags(session, names, "custom"),
+            thumbnail=ImageThumbnail(format="jpeg", width=1, height=1, size_bytes=1, data=b"x", data_base64=""),
+        )
+    session.commit()
+    return session
+
+
+def test_local_tags_use_synonyms_ngrams_and_idf(session):
+    _, weights = local_search_tags(session, "沙滩")
+    assert list(weights) == ["海边"]
+
+    _, weights = local_search_tags(session, "猫")
+    assert list(weights) == ["猫咪"]
+
+    # “照片”出现在每张图上，IDF 最低，排在更有区分度的标签之后
+    ai_output, weights = local_search_tags(session, "海边日落照片")
+    assert list(weights) == ["日落", "海边", "照片"]
+    assert ai_output.endswith("###### answer: 日落。海边。照片")
+
+
+def test_local_result_ranks_images_by_weighted_overlap(session):
+    result = mcp._local_result(session, "海边日落照片", prefix="http://example.test")
+    assert result["mode"] == "local"
+    ids = [item["id"] for item in result["items"]]
+    assert ids[:2] == [2, 1]
+    assert set(ids[2:]) == {3, 4}
@@ -0,0 +1,114 @@
+# 任务：验证 Qwen 客户端的退避重试、Retry-After 与熔断行为
+# 方案：本地 http.server 按脚本依次返回状态码，统计服务端收到的请求数
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.core.errors import ApiError
+from src.services.qwen_client import QwenClient
+
+_CFG = {
+    "pool_maxsize": 2,
+    "max_concurrency": 2,
+    "acquire_timeout": 1,
+    "connect_timeout": 1,
+    "backoff_base_seconds": 0.01,
+    "backoff_max_seconds": 0.05,
+    "retry_budget_seconds": 1,
+    "breaker_failures": 2,
+    "breaker_reset_seconds": 0.3,
+}
+
+
+@pytest.fixture()
+def scripted_server():
+    script = []
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            received.append(time.monotonic())
+            status, headers = script.pop(0) if script else (200, {})
+            body = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/chat/completions", script, received
+    server.shutdown()
+
+
+def test_retries_honour_retry_after(scripted_server):
+    url, script, received = scripted_server
+    script.extend([(429, {"Retry-After": "0.2"}), (503, {})])
+    client = QwenClient(_CFG)
+    result = client.post_json(url, {}, {}, timeout=2, max_retries=3)
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert len(received) == 3
+    # Retry-After 不受 backoff_max_seconds 截短，按服务端要求完整等待
+    assert received[1] - received[0] >= 0.2
+
+
+def test_retry_after_beyond_budget_fails_fast(scripted_server):
+    url, script, received = scripted_server
+    script.extend([(429, {"Retry-After": "5"})])
+    client = QwenClient(_CFG)
+    start = time.monotonic()
+    with pytest.raises(ApiError) as excinfo:
+        client.post_json(url, {}, {}, timeout=2, max_retries=3)
+    assert time.monotonic() - start < 1
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.details == {"retry_after": 5.0}
+    assert len(received) == 1
+    assert not client.breaker.is_open
+
+
+def test_retried_stream_responses_are_closed(scripted_server, monkeypatch):
+    url, script, received = scripted_server
+    script.extend([(429, {"Retry-After": "0"}), (503, {})])
+    closed = []
+    original_close = requests.Response.close
+
+    def counting_close(self):
+        closed.append(self.status_code)
+        original_close(self)
+
+    monkeypatch.setattr(requests.Response, "close", counting_close)
+    client = QwenClient(_CFG)
+    lines = list(client.stream_lines(url, {}, {}, timeout=2, max_retries=3))
+    assert json.loads(lines[0])["choices"][0]["message"]["content"] == "ok"
+    assert closed == [429, 503, 200]
+
+
+def test_breaker_fails_fast_then_recovers(scripted_server):
+    url, script, received = scripted_server
+    script.extend([(500, {}), (500, {})])
+    client = QwenClient(_CFG)
+    with pytest.raises(ApiError):
+        client.post_json(url, {}, {}, timeout=2, max_retries=2)
+    assert client.breaker.is_open
+
+    with pytest.raises(ApiError) as excinfo:
+        client.post_json(url, {}, {}, timeout=2, max_retries=2)
+    assert excinfo.value.status_code == 503
+    assert len(received) == 2
+
+    time.sleep(0.35)
+    client.post_json(url, {}, {}, timeout=2, max_retries=2)
+    assert not client.breaker.is_open
+    assert len(received) == 3
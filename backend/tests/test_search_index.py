@@ -0,0 +1,57 @@
+# 任务：验证全文索引随会话提交同步，并能容忍拼写错误、支持中文片段
+# 方案：内存 SQLite 安装 image_fts 后经 ORM 写图片与标签，提交/回滚后直接调用 search_image_ids
+
+from conftest import make_image
+from src.models.tag import Tag
+from src.services import search_index_service
+from src.services.search_index_service import ensure_search_index, search_image_ids
+from src.utils.ngram import ngrams
+
+
+def test_ngrams_mix_latin_trigrams_and_cjk_bigrams():
+    assert ngrams("Café 海边日落") == ["_ca", "caf", "afe", "fe_", "海边", "边日", "日落"]
+    assert "猫" in ngrams("猫咪", for_index=True)
+
+
+def test_search_index_follows_commits(engine, session_factory):
+    ensure_search_index(engine)
+
+    with session_factory() as session:
+        beach = make_image(
+            session,
+            original_filename="beach_trip.jpg",
+            tags=[Tag(name="sunset", source="custom"), Tag(name="海边日落", source="ai")],
+        )
+        other = make_image(session, original_filename="kitty.png", ext="png", hash="b", storage_relpath="b.png")
+        session.commit()
+
+        assert search_image_ids(session, "sunset") == [beach.id]
+        assert search_image_ids(session, "sunsett") == [beach.id]
+        assert search_image_ids(session, "日落") == [beach.id]
+        assert search_image_ids(session, "kity") == [other.id]
+
+        other.tags = [Tag(name="harbour", source="custom")]
+        session.flush()
+        session.rollback()
+        assert search_image_ids(session, "harbour") == []
+
+        other.tags = [Tag(name="harbour", source="custom")]
+        session.commit()
+        assert search_image_ids(session, "harbor") == [other.id]
+
+
+def test_search_ranks_full_matches_beyond_max_candidates(engine, session_factory, monkeypatch):
+    # 完整命中多于 max_candidates 时，较早上传但文件名命中的图片不能因按 rowid 截断而丢失
+    monkeypatch.setattr(search_index_service, "_search_cfg", lambda: {"max_candidates": 3})
+    ensure_search_index(engine)
+
+    with session_factory() as session:
+        best = make_image(session, original_filename="sunset.jpg")
+        for index in range(6):
+            make_image(session, original_filename=f"img_{index}.jpg", tags=[Tag(name=f"sunset {index}", source="custom")])
+        session.commit()
+
+        image_ids = search_image_ids(session, "sunset")
+        assert len(image_ids) == 3
+        assert image_ids[0] == best.id
+
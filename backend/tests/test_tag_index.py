@@ -0,0 +1,178 @@
+# 任务：验证标签倒排索引与原 SQL 过滤结果一致（含候选集超过 max_ids 的 json_each 路径）、提交后增量同步、
+#       其他进程写入后重建
+# 方案：内存 SQLite 构造偏斜分布的标签数据，分别执行 SQL 路径与索引路径并比较 id 序列；
+#       绕过 ORM 直接写表模拟其他进程，检查变更标记触发重建；
+#       两条路径的耗时对比见 scripts/bench/bench_tag_filter.py
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from conftest import make_user
+from src.models.image import Image as ImageModel
+from src.models.tag import Tag, ImageTag
+from src.services import tag_index_service
+from src.services.tag_index_service import TagIndex, apply_sql_tag_filter, apply_tag_filter, ensure_tag_index
+
+IMAGE_COUNT = 5000
+# 标签名 -> 命中概率，模拟 EXIF 相机标签这类高频标签与少量稀有标签
+TAG_WEIGHTS = {"Canon": 0.7, "Nikon": 0.25, "风景": 0.3, "猫": 0.1, "狗": 0.05, "夜景": 0.02}
+QUERIES = [
+    (["Canon"], "all"),
+    (["Canon", "风景"], "all"),
+    (["Canon", "风景", "猫"], "all"),
+    (["猫", "狗"], "any"),
+    (["夜景", "Nikon"], "any"),
+    (["不存在"], "all"),
+]
+
+
+@pytest.fixture()
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(tag_index_service, "tag_index", TagIndex())
+
+    rng = random.Random(42)
+    with session_factory() as session:
+        user = make_user(session)
+        tags = {name: Tag(name=name, source="custom") for name in TAG_WEIGHTS}
+        session.add_all(tags.values())
+        session.flush()
+        base_time = datetime(2024, 1, 1)
+        session.bulk_insert_mappings(
+            ImageModel,
+            [
+                {
+                    "id": i + 1,
+                    "uploader_id": user.id,
+                    "ext": "jpg",
+                    "hash": f"h{i:07d}",
+                    "storage_relpath": f"2024/01/01/h{i:07d}.jpg",
+                    "size_bytes": 1,
+                    "created_at": base_time + timedelta(seconds=i),
+                    "updated_at": base_time,
+                    "is_deleted": False,
+                    "is_favorite": False,
+                }
+                for i in range(IMAGE_COUNT)
+            ],
+        )
+        links = []
+        for image_id in range(1, IMAGE_COUNT + 1):
+            for name, weight in TAG_WEIGHTS.items():
+                if rng.random() < weight:
+                    links.append({"image_id": image_id, "tag_id": tags[name].id, "created_at": base_time})
+        session.bulk_insert_mappings(ImageTag, links)
+        session.commit()
+    return session_factory
+
+
+def _ordered_ids(query):
+    return [
+        image.id
+        for image in query.order_by(ImageModel.created_at.desc(), ImageModel.id.desc()).all()
+    ]
+
+
+def _page_with_total(query):
+    # 与 list_images 一致：count 一次 + 取一页（page_size + 1 行）
+    total = query.order_by(None).count()
+    ids = [
+        image.id
+        for image in query.order_by(ImageModel.created_at.desc(), ImageModel.id.desc()).limit(21).all()
+    ]
+    return total, ids
+
+
+def test_tag_index_matches_sql_path(session_factory):
+    with session_factory() as session:
+        tag_index_service.tag_index.load(session)
+        for tag_list, mode in QUERIES:
+            base = session.query(ImageModel)
+            sql_ids = _ordered_ids(apply_sql_tag_filter(base, tag_list, mode))
+            index_ids = _ordered_ids(apply_tag_filter(session, base, tag_list, mode))
+            assert index_ids == sql_ids
+
+            assert _page_with_total(apply_tag_filter(session, base, tag_list, mode)) == _page_with_total(
+                apply_sql_tag_filter(base, tag_list, mode)
+            )
+
+
+def test_tag_index_large_candidate_set_uses_json_each(session_factory, monkeypatch):
+    # 候选集超过 max_ids 时不回退 GROUP BY，而是把 id 集合作为一个 JSON 参数绑定
+    monkeypatch.setattr(tag_index_service, "_index_cfg", lambda: {"max_ids": 10})
+    with session_factory() as session:
+        tag_index_service.tag_index.load(session)
+        for tag_list, mode in QUERIES:
+            base = session.query(ImageModel)
+            query = apply_tag_filter(session, base, tag_list, mode)
+            if len(tag_index_service.tag_index.match(tag_list, mode)) > 10:
+                sql_text = str(query.statement)
+                assert "json_each" in sql_text
+                assert "GROUP BY" not in sql_text
+            assert _ordered_ids(query) == _ordered_ids(apply_sql_tag_filter(base, tag_list, mode))
+            assert _page_with_total(query) == _page_with_total(apply_sql_tag_filter(base, tag_list, mode))
+
+
+def test_tag_index_syncs_after_commit(session_factory):
+    with session_factory() as session:
+        tag_index_service.tag_index.load(session)
+
+    with session_factory() as session:
+        image = session.get(ImageModel, 1)
+        image.tags = [Tag(name="新标签", source="custom")]
+        session.flush()
+        session.rollback()
+    assert tag_index_service.tag_index.match(["新标签"], "all") == set()
+
+    with session_factory() as session:
+        image = session.get(ImageModel, 1)
+        image.tags = [Tag(name="新标签", source="custom")]
+        session.commit()
+    assert tag_index_service.tag_index.match(["新标签"], "all") == {1}
+    assert 1 not in tag_index_service.tag_index.match(["Canon"], "all")
+
+
+def test_tag_index_reloads_after_external_write(engine, session_factory, monkeypatch):
+    loads = []
+    original_load = TagIndex.load
+
+    def counting_load(self, session):
+        loads.append(1)
+        original_load(self, session)
+
+    monkeypatch.setattr(TagIndex, "load", counting_load)
+    index = tag_index_service.tag_index
+    with session_factory() as session:
+        ensure_tag_index(session)
+        ensure_tag_index(session)
+        assert len(loads) == 1
+
+        # 本进程经 ORM 的提交已增量同步，不触发重建
+        session.get(ImageModel, 2).tags = [Tag(name="本进程", source="custom")]
+        session.commit()
+        ensure_tag_index(session)
+        assert len(loads) == 1
+        assert index.match(["本进程"], "all") == {2}
+
+    # 绕过 ORM 直接写表，模拟迁移脚本等其他进程的写入
+    with engine.begin() as conn:
+        tag_id = conn.execute(
+            text("INSERT INTO tags (name, source, created_at) VALUES ('外部', 'custom', '2024-01-01')")
+        ).lastrowid
+        conn.execute(
+            text("INSERT INTO image_tags (image_id, tag_id, created_at) VALUES (3, :tag_id, '2024-01-01')"),
+            {"tag_id": tag_id},
+        )
+    with session_factory() as session:
+        ensure_tag_index(session)
+        assert len(loads) == 2
+        assert index.match(["外部"], "all") == {3}
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM image_tags WHERE image_id = 3 AND tag_id = :tag_id"), {"tag_id": tag_id})
+    with session_factory() as session:
+        ensure_tag_index(session)
+        assert len(loads) == 3
+        assert index.match(["外部"], "all") == set()
@@ -0,0 +1,58 @@
+# 任务：验证本地预筛能挑出字面相似与共现相关的标签，且预筛后的 prompt 明显小于全量标签池
+# 方案：合成 2 万个标签与图片-标签关系注入独立的 TagIndex；耗时对比见 scripts/bench/bench_tag_prefilter.py
+
+import random
+
+import pytest
+
+from src.services import tag_prefilter
+from src.services.ai_search_service import _build_prompt
+from src.services.tag_index_service import TagIndex
+from src.services.tag_prefilter import select_candidate_tags
+
+_WORDS = ["风景", "海边", "沙滩", "日落", "城市", "夜景", "猫咪", "小狗", "花朵", "雪山", "森林", "街道"]
+
+
+def _estimate_tokens(text: str) -> int:
+    # 粗略估算：中日韩字符约 1 token/字，其余约 4 字符/token
+    cjk = sum(1 for char in text if "㐀" <= char <= "鿿")
+    return cjk + (len(text) - cjk) // 4
+
+
+@pytest.fixture()
+def synthetic_pool(monkeypatch):
+    rng = random.Random(18)
+    pool = list(_WORDS) + ["sunset", "beach"]
+    pool += [f"{rng.choice(_WORDS)}{rng.choice(_WORDS)}{index}" for index in range(10000)]
+    pool += [f"object_{index}_{rng.randint(0, 99999)}" for index in range(10000)]
+    index = TagIndex()
+    for image_id in range(5000):
+        names = set(rng.sample(pool, 5))
+        if image_id % 10 == 0:
+            names |= {"海边", "沙滩"}
+        index.set_image_tags(image_id, names)
+    monkeypatch.setattr(tag_prefilter, "tag_index", index)
+    monkeypatch.setattr(tag_prefilter, "ensure_tag_index", lambda session: None)
+    return sorted(set(pool))
+
+
+def test_prefilter_keeps_similar_and_cooccurring_tags(synthetic_pool):
+    selected = select_candidate_tags(None, synthetic_pool, "海边的 sunset", pool_size=50)
+    assert len(selected) == 50
+    assert {"海边", "sunset", "沙滩"} <= set(selected)
+
+
+def test_prefilter_shrinks_prompt_and_keeps_relevant_tags(synthetic_pool):
+    query = "我想找一张海边日落的风景照"
+    full_tokens = _estimate_tokens(_build_prompt(synthetic_pool, query, 5))
+    previous_tokens = 0
+    for pool_size in (50, 200, 1000, 5000):
+        selected = select_candidate_tags(None, synthetic_pool, query, pool_size=pool_size)
+        assert len(selected) == pool_size
+        assert {"海边", "日落", "风景", "沙滩"} <= set(selected)
+        tokens = _estimate_tokens(_build_prompt(selected, query, 5))
+        assert previous_tokens < tokens < full_tokens
+        previous_tokens = tokens
+    # 默认 tag_pool_size=200 时 prompt 不到全量标签池的 2%
+    selected = select_candidate_tags(None, synthetic_pool, query, pool_size=200)
+    assert _estimate_tokens(_build_prompt(selected, query, 5)) * 50 < full_tokens
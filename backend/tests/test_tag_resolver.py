@@ -0,0 +1,63 @@
+# 任务：锁定批量标签解析的 SQL 次数，并验证回滚不会污染进程缓存
+# 方案：内存 SQLite 上监听 before_cursor_execute，比较 3 个与 30 个标签的语句数
+
+import pytest
+from sqlalchemy import event
+
+from src.models.tag import Tag
+from src.services import tag_resolver
+from src.services.tag_resolver import resolve_tags
+from src.utils.ttl_cache import TTLCache
+
+
+@pytest.fixture()
+def engine_factory(monkeypatch, engine, session_factory):
+    monkeypatch.setattr(tag_resolver, "_cache", TTLCache(1000, 3600))
+    return engine, session_factory
+
+
+def _resolve_counting(engine, factory, names, source="custom"):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with factory() as session:
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            tags = resolve_tags(session, names, source)
+            session.commit()
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+    return tags, len(statements)
+
+
+@pytest.mark.parametrize("count", [3, 30])
+def test_resolve_tags_constant_queries(engine_factory, count):
+    engine, factory = engine_factory
+    names = [f"tag{i}" for i in range(count)]
+    with factory() as session:
+        session.add(Tag(name="tag0", source="custom"))
+        session.commit()
+
+    # 首次：一次按名查询 + 一次批量插入 + 一次回查
+    tags, statements = _resolve_counting(engine, factory, names + ["tag1"])
+    assert [tag.name for tag in tags] == names
+    assert statements == 3
+
+    # 再次：缓存命中，只按 id 取一次
+    tags, statements = _resolve_counting(engine, factory, names)
+    assert [tag.name for tag in tags] == names
+    assert statements == 1
+
+
+def test_rolled_back_tags_not_cached(engine_factory):
+    engine, factory = engine_factory
+    with factory() as session:
+        resolve_tags(session, ["临时"], "custom")
+        session.rollback()
+    assert len(tag_resolver._get_cache()) == 0
+
+    tags, _ = _resolve_counting(engine, factory, ["临时"])
+    assert tags[0].id is not None
+    assert len(tag_resolver._get_cache()) == 1
@@ -0,0 +1,48 @@
+# 任务：验证时间轴日计数由触发器增量维护，软删除/恢复、改拍摄时间后与全量重建一致
+# 方案：内存 SQLite 安装触发器，逐步修改数据并与 rebuild_timeline 的结果对比，再按月合并检查接口口径
+
+from datetime import datetime
+
+from sqlalchemy import text
+
+from conftest import make_image
+from src.models.image_capture_time import ImageCaptureTime
+from src.services.timeline_service import ensure_timeline_triggers, rebuild_timeline, timeline_buckets
+
+
+def _assert_matches_rebuild(engine):
+    sql = text("SELECT kind, day, count FROM timeline_counts")
+    with engine.connect() as conn:
+        incremental = sorted(conn.execute(sql).all())
+    with engine.begin() as conn:
+        rebuild_timeline(conn)
+        assert incremental == sorted(conn.execute(sql).all())
+
+
+def test_timeline_counts_follow_uploads_and_soft_delete(engine, session_factory):
+    ensure_timeline_triggers(engine)
+
+    with session_factory() as session:
+        images = []
+        for index in range(12):
+            image = make_image(session, created_at=datetime(2024, 1 + index % 3, 1 + index, 12, 0, 0))
+            session.add(ImageCaptureTime(image_id=image.id, taken_at=datetime(2020 + index % 2, 6, 1)))
+            images.append(image)
+        session.commit()
+        _assert_matches_rebuild(engine)
+
+        for image in images[:4]:
+            image.is_deleted = True
+        session.get(ImageCaptureTime, images[5].id).taken_at = datetime(2019, 1, 1)
+        session.commit()
+        _assert_matches_rebuild(engine)
+
+        images[0].is_deleted = False
+        session.commit()
+        _assert_matches_rebuild(engine)
+
+        created = timeline_buckets(session, "created", "month")
+        assert created["total"] == 9
+        assert [bucket["period"] for bucket in created["buckets"]] == ["2024-01", "2024-02", "2024-03"]
+        taken = timeline_buckets(session, "taken", "year", date_from="2020-01-01")
+        assert taken["total"] == 8
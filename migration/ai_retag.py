@@ -0,0 +1,76 @@
+# 任务：为未打 AI 标签的存量图片批量生成标签，支持限速、并发与中断续跑
+# 方案：未处理图片写入 ingest_jobs（kind=ai_retag）作为断点，RetagRunner 按 --rps/--concurrency 执行；
+#       Ctrl-C 时等正在执行的任务完成后退出，再次运行只处理剩余任务
+
+from argparse import ArgumentParser
+from pathlib import Path
+import sys
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from src.core.db import init_db, session_scope  # noqa: E402
+from src.core.errors import ApiError  # noqa: E402
+from src.services.ai_retag_service import (  # noqa: E402
+    enqueue_untagged,
+    ensure_retag_available,
+    retag_cfg,
+    retag_runner,
+    retag_status,
+)
+
+
+def parse_args():
+    cfg = retag_cfg()
+    parser = ArgumentParser(description="批量为未打 AI 标签的图片生成标签")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多新入队的图片数")
+    parser.add_argument("--concurrency", type=int, default=cfg["concurrency"], help="同时进行的模型请求数")
+    parser.add_argument("--rps", type=float, default=cfg["requests_per_second"], help="每秒最多发起的请求数")
+    parser.add_argument("--retry-failed", action="store_true", help="把之前失败的任务重新入队")
+    parser.add_argument("--enqueue-only", action="store_true", help="只入队不执行（交给管理接口启动）")
+    parser.add_argument("--report-seconds", type=float, default=10, help="进度输出间隔")
+    return parser.parse_args()
+
+
+def _print_status(started_at: float) -> None:
+    with session_scope() as session:
+        status = retag_status(session)
+    jobs = status["jobs"]
+    elapsed = max(time.monotonic() - started_at, 1e-6)
+    print(
+        f"进度：done={jobs['done']} pending={jobs['pending']} running={jobs['running']} "
+        f"failed={jobs['failed']} processed={status['processed']} "
+        f"rate={status['processed'] / elapsed:.2f}/s",
+        flush=True,
+    )
+
+
+def main():
+    args = parse_args()
+    init_db()
+    try:
+        ensure_retag_available()
+    except ApiError as exc:
+        print(f"无法开始：{exc.message}")
+        sys.exit(1)
+
+    with session_scope() as session:
+        enqueued = enqueue_untagged(session, args.limit, args.retry_failed)
+    print(f"入队完成：enqueued={enqueued}")
+    if args.enqueue_only:
+        return
+
+    started_at = time.monotonic()
+    retag_runner.start(args.concurrency, args.rps)
+    try:
+        while not retag_runner.wait(args.report_seconds):
+            _print_status(started_at)
+    except KeyboardInterrupt:
+        print("收到中断，等待进行中的请求完成……", flush=True)
+        retag_runner.stop()
+    _print_status(started_at)
+
+
+if __name__ == "__main__":
+    main()
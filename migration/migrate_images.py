@@ -20,9 +20,10 @@ from src.core.db import init_db, session_scope  # noqa: E402
 from src.models.image import Image as ImageModel  # noqa: E402
 from src.models.image_capture_time import ImageCaptureTime  # noqa: E402
 from src.models.image_dimensions import ImageDimensions  # noqa: E402
-from src.models.image_exif import ImageExifEntry  # noqa: E402
 from src.models.image_location import ImageLocation  # noqa: E402
-from src.services.image_service import find_or_create_tags  # noqa: E402
+from src.services.facet_service import write_exif_facets  # noqa: E402
+from src.services.geo_service import geohash_for  # noqa: E402
+from src.services.image_service import find_or_create_tags, write_exif_data  # noqa: E402
 from src.services.thumbnail_service import upsert_thumbnail  # noqa: E402
 from src.services.user_service import ensure_admin  # noqa: E402
 from src.utils.exif_utils import (  # noqa: E402
@@ -123,7 +124,7 @@ def _build_metadata(file_path: Path, relpath: str, override: Optional[Dict]) ->
         "longitude": longitude,
         "altitude": altitude,
         "gps_raw": str(gps_raw) if gps_raw else None,
-        "exif_entries": list(exif_dict.items()),
+        "exif_dict": exif_dict,
         "exif_tags": build_exif_tags(exif_dict),
     }
 
@@ -158,6 +159,7 @@ def _upsert_related(session, image, meta: Dict):
         image.location.longitude = meta["longitude"]
         image.location.altitude = meta["altitude"]
         image.location.gps_raw = meta["gps_raw"]
+        image.location.geohash = geohash_for(meta["latitude"], meta["longitude"])
     else:
         session.add(
             ImageLocation(
@@ -166,18 +168,12 @@ def _upsert_related(session, image, meta: Dict):
                 longitude=meta["longitude"],
                 altitude=meta["altitude"],
                 gps_raw=meta["gps_raw"],
+                geohash=geohash_for(meta["latitude"], meta["longitude"]),
             )
         )
 
-    session.query(ImageExifEntry).filter(ImageExifEntry.image_id == image.id).delete()
-    for key, value in meta["exif_entries"]:
-        session.add(
-            ImageExifEntry(
-                image_id=image.id,
-                exif_key=str(key),
-                exif_value=str(value) if value is not None else None,
-            )
-        )
+    write_exif_data(session, image.id, meta["exif_dict"], replace=True)
+    write_exif_facets(session, image.id, meta["exif_dict"], replace=True)
 
     if meta["exif_tags"]:
         tag_objs = find_or_create_tags(session, meta["exif_tags"], "exif")
@@ -0,0 +1,116 @@
+# 任务：对比列表标签过滤三条路径的耗时：SQL GROUP BY/HAVING、倒排索引 + 主键 IN、倒排索引 + json_each
+# 方案：内存 SQLite 按偏斜分布构造标签数据，每个查询按 list_images 的方式 count 一次 + 取一页，打印耗时表
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from src import models  # noqa: E402,F401
+from src.core.db import Base  # noqa: E402
+from src.models.image import Image as ImageModel  # noqa: E402
+from src.models.tag import Tag, ImageTag  # noqa: E402
+from src.models.user import User  # noqa: E402
+from src.services import tag_index_service  # noqa: E402
+from src.services.tag_index_service import apply_sql_tag_filter, apply_tag_filter  # noqa: E402
+
+# 标签名 -> 命中概率，模拟 EXIF 相机标签这类高频标签与少量稀有标签
+TAG_WEIGHTS = {"Canon": 0.7, "Nikon": 0.25, "风景": 0.3, "猫": 0.1, "狗": 0.05, "夜景": 0.02}
+QUERIES = [
+    (["Canon"], "all"),
+    (["Canon", "风景"], "all"),
+    (["Canon", "风景", "猫"], "all"),
+    (["猫", "狗"], "any"),
+    (["夜景", "Nikon"], "any"),
+]
+
+
+def parse_args():
+    parser = ArgumentParser(description="标签过滤路径耗时对比")
+    parser.add_argument("--images", type=int, default=50000, help="构造的图片数")
+    parser.add_argument("--page-size", type=int, default=20, help="每页条数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    return parser.parse_args()
+
+
+def build_session(image_count: int, seed: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    rng = random.Random(seed)
+    user = User(username="u", email="u@example.com", password_hash="x", role="user")
+    session.add(user)
+    tags = {name: Tag(name=name, source="custom") for name in TAG_WEIGHTS}
+    session.add_all(tags.values())
+    session.flush()
+    base_time = datetime(2024, 1, 1)
+    session.bulk_insert_mappings(
+        ImageModel,
+        [
+            {
+                "id": i + 1,
+                "uploader_id": user.id,
+                "ext": "jpg",
+                "hash": f"h{i:08d}",
+                "storage_relpath": f"2024/01/01/h{i:08d}.jpg",
+                "size_bytes": 1,
+                "created_at": base_time + timedelta(seconds=i),
+                "updated_at": base_time,
+                "is_deleted": False,
+                "is_favorite": False,
+            }
+            for i in range(image_count)
+        ],
+    )
+    links = []
+    for image_id in range(1, image_count + 1):
+        for name, weight in TAG_WEIGHTS.items():
+            if rng.random() < weight:
+                links.append({"image_id": image_id, "tag_id": tags[name].id, "created_at": base_time})
+    session.bulk_insert_mappings(ImageTag, links)
+    session.commit()
+    return session
+
+
+def timed_page(query, page_size: int):
+    start = time.perf_counter()
+    total = query.order_by(None).count()
+    query.order_by(ImageModel.created_at.desc(), ImageModel.id.desc()).limit(page_size + 1).all()
+    return total, (time.perf_counter() - start) * 1000
+
+
+def main():
+    args = parse_args()
+    session = build_session(args.images, args.seed)
+    tag_index_service.tag_index.load(session)
+    base = session.query(ImageModel)
+    paths = {
+        "sql": lambda tags, mode: apply_sql_tag_filter(base, tags, mode),
+        "in": lambda tags, mode: base.filter(ImageModel.id.in_(tag_index_service.tag_index.match(tags, mode))),
+        "json_each": lambda tags, mode: tag_index_service._filter_by_id_json(
+            base, tag_index_service.tag_index.match(tags, mode)
+        ),
+        "auto": lambda tags, mode: apply_tag_filter(session, base, tags, mode),
+    }
+    print(f"{'mode':>4} {'tags':<16} {'rows':>7} " + " ".join(f"{name:>10}" for name in paths))
+    for tag_list, mode in QUERIES:
+        cells = []
+        rows = None
+        for build in paths.values():
+            rows, elapsed_ms = timed_page(build(tag_list, mode), args.page_size)
+            cells.append(f"{elapsed_ms:8.2f}ms")
+        print(f"{mode:>4} {','.join(tag_list):<16} {rows:>7} " + " ".join(cells))
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# 任务：给出 AI 检索 prompt 规模与本地标签预筛耗时随候选数变化的基准
+# 方案：合成标签池与图片-标签关系注入独立的 TagIndex，按不同 pool_size 预筛并估算 prompt token 数，打印对比表
+
+from argparse import ArgumentParser
+from pathlib import Path
+import random
+import sys
+import time
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from src.services import tag_prefilter  # noqa: E402
+from src.services.ai_search_service import _build_prompt  # noqa: E402
+from src.services.tag_index_service import TagIndex  # noqa: E402
+from src.services.tag_prefilter import select_candidate_tags  # noqa: E402
+
+_WORDS = ["风景", "海边", "沙滩", "日落", "城市", "夜景", "猫咪", "小狗", "花朵", "雪山", "森林", "街道"]
+
+
+def parse_args():
+    parser = ArgumentParser(description="标签预筛 prompt 规模与耗时基准")
+    parser.add_argument("--tags", type=int, default=20000, help="合成的标签数")
+    parser.add_argument("--images", type=int, default=5000, help="合成的图片数")
+    parser.add_argument("--query", default="我想找一张海边日落的风景照", help="检索语句")
+    parser.add_argument("--repeat", type=int, default=5, help="每档重复次数，取中位数")
+    parser.add_argument("--seed", type=int, default=18, help="随机种子")
+    return parser.parse_args()
+
+
+def estimate_tokens(text: str) -> int:
+    # 粗略估算：中日韩字符约 1 token/字，其余约 4 字符/token
+    cjk = sum(1 for char in text if "㐀" <= char <= "鿿")
+    return cjk + (len(text) - cjk) // 4
+
+
+def build_pool(tag_count: int, image_count: int, seed: int):
+    rng = random.Random(seed)
+    half = tag_count // 2
+    pool = list(_WORDS) + ["sunset", "beach"]
+    pool += [f"{rng.choice(_WORDS)}{rng.choice(_WORDS)}{index}" for index in range(half)]
+    pool += [f"object_{index}_{rng.randint(0, 99999)}" for index in range(tag_count - half)]
+    index = TagIndex()
+    for image_id in range(image_count):
+        names = set(rng.sample(pool, 5))
+        if image_id % 10 == 0:
+            names |= {"海边", "沙滩"}
+        index.set_image_tags(image_id, names)
+    # 预筛读取的是模块级索引，基准进程内直接替换
+    tag_prefilter.tag_index = index
+    tag_prefilter.ensure_tag_index = lambda session: None
+    return sorted(set(pool))
+
+
+def main():
+    args = parse_args()
+    pool = build_pool(args.tags, args.images, args.seed)
+    full_tokens = estimate_tokens(_build_prompt(pool, args.query, 5))
+    print(f"full pool: tags={len(pool)} prompt_tokens~{full_tokens}")
+    for pool_size in (50, 200, 1000, 5000):
+        select_candidate_tags(None, pool, args.query, pool_size=pool_size)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            selected = select_candidate_tags(None, pool, args.query, pool_size=pool_size)
+            timings.append((time.perf_counter() - started) * 1000)
+        tokens = estimate_tokens(_build_prompt(selected, args.query, 5))
+        print(
+            f"pool_size={pool_size:5d} prompt_tokens~{tokens:6d} "
+            f"ratio={tokens / full_tokens:6.1%} prefilter_ms={sorted(timings)[len(timings) // 2]:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()